@@ -1,5 +1,16 @@
 "use client";
 import React, { useState, useRef, useEffect } from "react";
+import { useAudioFrameDecoder } from "@/hooks/useAudioFrames";
+
+// Ask for small Opus payloads on slow or metered connections when the browser can play them
+const preferredAudioFormat = () => {
+  const connection = (navigator as any).connection;
+  const constrained =
+    connection?.saveData ||
+    ["slow-2g", "2g", "3g"].includes(connection?.effectiveType);
+  const playsOpus = new Audio().canPlayType('audio/ogg; codecs="opus"') !== "";
+  return constrained && playsOpus ? "low_bandwidth" : "default";
+};
 
 const VoiceChatBot = () => {
   // Connection state
@@ -100,6 +111,16 @@ const VoiceChatBot = () => {
   const audioChunksRef = useRef([]);
   const voiceDetectionActiveRef = useRef(false);
   const animationFrameRef = useRef(null);
+  const retryAfterRef = useRef(null);
+  const conversationIdRef = useRef(null);
+  const resumeTokenRef = useRef(null);
+  // Set by a draining server's reconnect hint: where and when to resume
+  const reconnectRef = useRef(null);
+  const audioMimeTypeRef = useRef("audio/mpeg");
+  // Framed audio: segments are reassembled from sequenced frames before playback
+  const { getDecoder, resetDecoder } = useAudioFrameDecoder({
+    onSegment: (_turnId, segment) => playAudioResponse(segment),
+  });
   const messagesEndRef = useRef(null);
 
   // Icons
@@ -200,7 +221,16 @@ const VoiceChatBot = () => {
     addMessage("🔄 Connecting to AI assistant...", "system");
 
     try {
-      wsRef.current = new WebSocket(serverUrl);
+      const resume = reconnectRef.current;
+      reconnectRef.current = null;
+      const url = resume
+        ? `${serverUrl}${serverUrl.includes("?") ? "&" : "?"}conversation_id=${encodeURIComponent(
+            resume.conversationId
+          )}&resume_token=${encodeURIComponent(resumeTokenRef.current ?? "")}`
+        : serverUrl;
+      wsRef.current = new WebSocket(url);
+      wsRef.current.binaryType = "arraybuffer";
+      resetDecoder();
 
       wsRef.current.onopen = async () => {
         setIsConnected(true);
@@ -215,6 +245,8 @@ const VoiceChatBot = () => {
               JSON.stringify({
                 type: "set_voice",
                 voice_id: selectedVoice,
+                audio_format: preferredAudioFormat(),
+                audio_framing: true,
               })
             );
 
@@ -236,8 +268,8 @@ const VoiceChatBot = () => {
 
       wsRef.current.onmessage = async (event) => {
         try {
-          if (event.data instanceof Blob) {
-            await playAudioResponse(event.data);
+          if (event.data instanceof ArrayBuffer) {
+            getDecoder().push(event.data);
           } else {
             const data = JSON.parse(event.data);
             handleServerMessage(data);
@@ -247,14 +279,29 @@ const VoiceChatBot = () => {
         }
       };
 
-      wsRef.current.onclose = () => {
+      wsRef.current.onclose = (event) => {
         setIsConnected(false);
         setIsConnecting(false);
         setIsLiveSession(false);
         setIsListening(false);
         setIsProcessing(false);
-        addMessage("❌ Call ended", "system");
         stopLiveSession();
+
+        // 1013: server at capacity - retry after its (jittered) hint
+        if (event.code === 1013) {
+          const retryAfterMs = retryAfterRef.current ?? 5000;
+          retryAfterRef.current = null;
+          addMessage(`⏳ Server is busy - retrying in ${Math.round(retryAfterMs / 1000)}s`, "system");
+          setTimeout(() => connectToBot(), retryAfterMs);
+          return;
+        }
+        // 1012: server restarting - resume the same conversation on another instance
+        if (event.code === 1012 && reconnectRef.current) {
+          addMessage("🔄 Server restarting - reconnecting...", "system");
+          setTimeout(() => connectToBot(), reconnectRef.current.delayMs);
+          return;
+        }
+        addMessage("❌ Call ended", "system");
       };
 
       wsRef.current.onerror = (error) => {
@@ -516,6 +563,8 @@ const VoiceChatBot = () => {
     if (wsRef.current?.readyState === WebSocket.OPEN && audioBlob.size > 0) {
       setIsProcessing(true);
       wsRef.current.send(audioBlob);
+      // The recording is complete - let the server transcribe it without waiting for a gap
+      wsRef.current.send(JSON.stringify({ type: "utterance_end" }));
       addMessage(`📤 Sent audio (${audioBlob.size} bytes)`, "system");
     } else {
       console.error("Cannot send audio - WebSocket not ready or empty blob");
@@ -527,6 +576,17 @@ const VoiceChatBot = () => {
   const handleServerMessage = (data) => {
     switch (data.type) {
       case "connection_established":
+        conversationIdRef.current = data.conversation_id;
+        // Only this client holds the token, so only it can resume the conversation
+        resumeTokenRef.current = data.resume_token;
+        break;
+
+      case "reconnect":
+        // Sent before a draining server closes with 1012; the current turn has already finished
+        reconnectRef.current = {
+          conversationId: data.conversation_id ?? conversationIdRef.current,
+          delayMs: data.retry_after_ms ?? 1000,
+        };
         break;
 
       case "transcript":
@@ -540,10 +600,19 @@ const VoiceChatBot = () => {
         break;
 
       case "audio_start":
+        if (data.mime_type) audioMimeTypeRef.current = data.mime_type;
+        getDecoder().beginTurn(data.turn_id, data.mime_type);
         setIsPlaying(true);
         break;
 
+      case "audio_format":
+        // The format the server will actually send; adjusted lists anything it could not honour
+        audioMimeTypeRef.current = data.mime_type;
+        if (data.adjusted?.length) console.warn("Audio format adjusted:", data.adjusted);
+        break;
+
       case "audio_end":
+        if (data.interrupted) getDecoder().reset();
         setIsPlaying(false);
         setIsProcessing(false);
         break;
@@ -552,6 +621,15 @@ const VoiceChatBot = () => {
         // Silent processing
         break;
 
+      case "turn_timing":
+        // Per-stage server timings (ms) for this turn, keyed by trace_id
+        console.debug("Turn timing:", data.trace_id, data.total_ms, data.stages);
+        break;
+
+      case "server_busy":
+        retryAfterRef.current = data.retry_after_ms;
+        break;
+
       case "no_speech_detected":
         setIsProcessing(false);
         addMessage("❌ No speech detected - try speaking louder", "system");
@@ -569,7 +647,9 @@ const VoiceChatBot = () => {
     try {
       stopCurrentAudio();
 
-      const audioUrl = URL.createObjectURL(audioBlob);
+      // WebSocket blobs arrive untyped; tag them so the player picks the right decoder
+      const typedBlob = new Blob([audioBlob], { type: audioMimeTypeRef.current });
+      const audioUrl = URL.createObjectURL(typedBlob);
       const audio = new Audio(audioUrl);
       currentAudioRef.current = audio;
 
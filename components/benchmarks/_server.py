@@ -0,0 +1,17 @@
+"""Load the voice server module ("import asyncio.py") for benchmarks"""
+import importlib.util
+import os
+import sys
+
+SERVER_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "import asyncio.py")
+
+
+def load_server(**env):
+    """Import the server with the given environment overrides applied first"""
+    os.environ.update({key: str(value) for key, value in env.items()})
+    os.environ.setdefault("WARMUP_ON_STARTUP", "false")
+    spec = importlib.util.spec_from_file_location("voice_server", SERVER_PATH)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["voice_server"] = module
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,143 @@
+"""
+Per-turn logging cost on the event loop thread: legacy f-string logging vs LOG_MODE=production.
+
+Replays the log calls one conversation turn makes (10 audio frames, STT, LLM, TTS,
+delivery) against a realistic Deepgram response, writing to /dev/null.
+
+Usage:
+    python components/benchmarks/bench_logging.py [--turns 2000]
+"""
+import argparse
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import time
+
+from _server import load_server
+
+FRAMES_PER_TURN = 10
+TRANSCRIPT = "Can you explain how photosynthesis works in plants and why chlorophyll is green?"
+AI_RESPONSE = ("Great question! Photosynthesis is how plants turn sunlight, water and carbon dioxide into "
+               "glucose and oxygen. Chlorophyll looks green because it reflects green light.")
+PARAMS = {"model": "nova-2", "language": "en", "smart_format": "true", "punctuate": "true",
+          "filler_words": "true", "utterances": "true", "utt_split": "0.3"}
+VOICE_CONFIG = {"name": "en-US-Standard-C", "language_code": "en-US", "ssml_gender": "FEMALE", "quality": "standard"}
+USAGE = {"prompt_tokens": 812, "completion_tokens": 46, "total_tokens": 858}
+
+
+def deepgram_result() -> dict:
+    words = [{"word": word, "start": i * 0.3, "end": i * 0.3 + 0.25, "confidence": 0.98,
+              "punctuated_word": word} for i, word in enumerate(TRANSCRIPT.split())]
+    return {"metadata": {"request_id": "0" * 36, "duration": 4.2, "channels": 1},
+            "results": {"channels": [{"alternatives": [{"transcript": TRANSCRIPT, "confidence": 0.98, "words": words}]}],
+                        "utterances": [{"start": 0.0, "end": 4.2, "transcript": TRANSCRIPT, "words": words}]}}
+
+
+def legacy_turn(logger: logging.Logger, result: dict):
+    """The log calls a turn made before the production logging mode"""
+    for _ in range(FRAMES_PER_TURN):
+        logger.info(f"🎤 Received audio: {4096} bytes")
+    logger.info(f"🎤 Starting ULTRA-SENSITIVE audio processing: {40960} bytes")
+    logger.info(f"🎤 ULTRA-SENSITIVE transcription: {40960} bytes")
+    logger.info(f"🔍 Sending to Deepgram with ultra-sensitive params: {PARAMS}")
+    logger.info(f"📊 Deepgram response: {json.dumps(result, indent=2)}")
+    logger.info(f"📝 TRANSCRIPT: '{TRANSCRIPT}' (confidence: {0.98:.3f})")
+    logger.info(f"✅ ACCEPTED transcript: '{TRANSCRIPT}' with confidence {0.98:.3f}")
+    logger.info(f"✅ TRANSCRIBED: '{TRANSCRIPT}'")
+    logger.info(f"Tokens used - Prompt: {USAGE.get('prompt_tokens', 0)}, "
+                f"Completion: {USAGE.get('completion_tokens', 0)}, "
+                f"Total: {USAGE.get('total_tokens', 0)}")
+    logger.info(f"🤖 AI RESPONSE: {AI_RESPONSE}")
+    logger.info(f"🎤 Cost-optimized synthesis: '{AI_RESPONSE}' with voice: {'female'}")
+    logger.info(f"Using cost-optimized voice: {VOICE_CONFIG}")
+    logger.info(f"Generated ultra-natural SSML with {'explanatory'} emotion")
+    logger.info(f"Using ultra-natural SSML with {'explanatory'} emotion")
+    logger.info(f"Performing {VOICE_CONFIG['quality']} synthesis")
+    logger.info(f"✅ Audio synthesized successfully: {48000} bytes")
+    logger.info(f"✅ Synthesis completed: {48000} bytes")
+    logger.info(f"🔊 Delivering audio: {48000} bytes")
+    logger.info(f"✅ Response delivered for {'conversation'}")
+
+
+def production_turn(logger: logging.Logger, result: dict, content_level: int):
+    """The same turn with the current call forms"""
+    for _ in range(FRAMES_PER_TURN):
+        logger.info("🎤 Received audio: %d bytes", 4096, extra={"sample": "audio_frame"})
+    logger.info("🎤 Starting ULTRA-SENSITIVE audio processing: %d bytes", 40960)
+    logger.info("🎤 ULTRA-SENSITIVE transcription: %d bytes", 40960)
+    logger.debug("🔍 Sending to Deepgram with ultra-sensitive params: %s", PARAMS)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("📊 Deepgram response: %s", json.dumps(result))
+    logger.log(content_level, "📝 TRANSCRIPT: '%s' (confidence: %.3f)", TRANSCRIPT, 0.98)
+    logger.info("✅ ACCEPTED transcript: %d chars with confidence %.3f", len(TRANSCRIPT), 0.98)
+    logger.log(content_level, "✅ TRANSCRIBED: '%s'", TRANSCRIPT)
+    logger.info("Tokens used - Prompt: %s, Completion: %s, Total: %s",
+                USAGE.get("prompt_tokens", 0), USAGE.get("completion_tokens", 0), USAGE.get("total_tokens", 0))
+    logger.log(content_level, "🤖 AI RESPONSE: %s", AI_RESPONSE)
+    logger.log(content_level, "🎤 Cost-optimized synthesis: '%s' with voice: %s", AI_RESPONSE, "female")
+    logger.debug("Using cost-optimized voice: %s", VOICE_CONFIG)
+    logger.debug("Generated ultra-natural SSML with %s emotion", "explanatory")
+    logger.info("Using ultra-natural SSML with %s emotion", "explanatory")
+    logger.info("Performing %s synthesis", VOICE_CONFIG["quality"])
+    logger.info("✅ Audio synthesized successfully: %d bytes", 48000)
+    logger.info("✅ Synthesis completed: %d bytes", 48000)
+    logger.info("🔊 Delivering audio: %d bytes", 48000)
+    logger.info("✅ Response delivered for %s", "conversation")
+
+
+def isolated_logger(name: str, level: int, handler: logging.Handler) -> logging.Logger:
+    logger = logging.getLogger(name)
+    logger.handlers[:] = [handler]
+    logger.setLevel(level)
+    logger.propagate = False
+    return logger
+
+
+def run(label: str, turns: int, turn, drain=None) -> dict:
+    started = time.perf_counter()
+    for _ in range(turns):
+        turn()
+    on_loop = time.perf_counter() - started
+    if drain:
+        drain()
+    total = time.perf_counter() - started
+    row = {"mode": label, "us_per_turn_on_loop": round(on_loop / turns * 1e6, 1),
+           "us_per_turn_total": round(total / turns * 1e6, 1)}
+    print(f"{label:<32} {row['us_per_turn_on_loop']:>10} us/turn on loop {row['us_per_turn_total']:>10} us/turn incl. writer")
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=2000)
+    args = parser.parse_args()
+
+    server = load_server(LOG_MODE="production")
+    result = deepgram_result()
+    devnull = open(os.devnull, "w", encoding="utf-8")
+
+    text_handler = logging.StreamHandler(devnull)
+    text_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    legacy = isolated_logger("bench.legacy", logging.INFO, text_handler)
+    rows = [run("legacy (f-strings, sync text)", args.turns, lambda: legacy_turn(legacy, result))]
+
+    for level_name in ("INFO", "WARNING"):
+        json_handler = logging.StreamHandler(devnull)
+        json_handler.setFormatter(server.JsonLogFormatter())
+        log_queue = queue.SimpleQueue()
+        queue_handler = server.DeferredQueueHandler(log_queue)
+        queue_handler.addFilter(server.TraceContextFilter())
+        queue_handler.addFilter(server.SamplingFilter(server.LOG_SAMPLE_EVERY))
+        listener = logging.handlers.QueueListener(log_queue, json_handler)
+        listener.start()
+        production = isolated_logger(f"bench.production.{level_name}", getattr(logging, level_name), queue_handler)
+        rows.append(run(f"production ({level_name}, json, queued)", args.turns,
+                        lambda: production_turn(production, result, server.CONTENT_LOG_LEVEL), listener.stop))
+
+    print(json.dumps(rows))
+
+
+if __name__ == "__main__":
+    main()
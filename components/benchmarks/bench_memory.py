@@ -0,0 +1,137 @@
+"""
+Memory held by N simultaneous conversations: per-conversation prompt copies vs the shared prompt store.
+
+Every conversation sets a context for one of a few units (as students in the
+same class do), gets its system prompt and then holds a history of turns.
+The previous layout kept its own unitContent and system prompt string per
+conversation plus a dict per message; the current one shares both through
+PromptStore and keeps ChatMessage records. Sizes are traced allocations.
+
+The same conversations are then persisted through persist_conversation to
+the in-memory state backend, which stores each prompt body once per
+PromptStore digest; that is compared with the size of states carrying their
+own unitContent and system prompt, as they were saved before.
+
+Usage:
+    python components/benchmarks/bench_memory.py [--conversations 1000] [--units 10] [--turns 10]
+"""
+import argparse
+import asyncio
+import gc
+import json
+import tracemalloc
+from collections import deque
+
+from _server import load_server
+
+PARAGRAPH = ("Cells are the basic structural and functional unit of every living organism. "
+             "The cell membrane controls what enters and leaves, while the nucleus stores genetic information. ")
+
+
+def unit_payloads(units: int, unit_chars: int) -> list:
+    """set_context messages as they arrive on the socket, one per unit"""
+    return [json.dumps({"type": "set_context", "context": {
+        "companionName": "Ada", "subject": "Biology", "unitTitle": f"Unit {unit}",
+        "unitContent": f"Unit {unit}. " + PARAGRAPH * (unit_chars // len(PARAGRAPH))
+    }}) for unit in range(units)]
+
+
+def history(conversation: int, turns: int) -> list:
+    messages = []
+    for turn in range(turns):
+        messages.append(("user", f"Student {conversation} question {turn}: why does the nucleus matter so much?"))
+        messages.append(("assistant", f"Answer {conversation}.{turn}: " + PARAGRAPH * 3))
+    return messages
+
+
+def measure(label: str, build) -> dict:
+    gc.collect()
+    tracemalloc.start()
+    retained = build()
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del retained
+    row = {"layout": label, "retained_mb": round(current / 2**20, 2), "peak_mb": round(peak / 2**20, 2)}
+    print(f"{label:<34} {row['retained_mb']:>9} MB retained {row['peak_mb']:>9} MB peak")
+    return row
+
+
+async def persisted_bytes(server, payloads: list, args) -> dict:
+    """Bytes held by the state backend, and what inline prompt copies would have held"""
+    voice_server = server.UltraSensitiveVoiceServer()
+    backend = voice_server.state_backend = server.InMemoryConversationStateBackend()
+    processor = voice_server.processor
+    for conversation in range(args.conversations):
+        conversation_id = f"conversation-{conversation}"
+        await voice_server.create_conversation(conversation_id, None)
+        context = json.loads(payloads[conversation % args.units])["context"]
+        voice_server.active_conversations[conversation_id]["context"] = processor.share_unit_content(conversation_id, context)
+        processor.get_introduction(conversation_id, context)
+        for role, content in history(conversation, args.turns):
+            processor.conversation_contexts[conversation_id].append(role, content)
+        await voice_server.persist_conversation(conversation_id)
+
+    inline = 0
+    for raw, _ in backend.states.values():
+        state = json.loads(raw)
+        state["context"]["unitContent"] = backend.prompts[state.pop("unit_content_key")][0]
+        state["llm_context"]["system"] = backend.prompts[state["llm_context"].pop("system_key")][0]
+        inline += len(json.dumps(state))
+    by_digest = sum(len(raw) for raw, _ in backend.states.values()) + sum(len(text) for text, _ in backend.prompts.values())
+    return {"inline_mb": round(inline / 2**20, 2), "by_digest_mb": round(by_digest / 2**20, 2),
+            "stored_prompts": len(backend.prompts)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--conversations", type=int, default=1000)
+    parser.add_argument("--units", type=int, default=10)
+    parser.add_argument("--unit-chars", type=int, default=8000)
+    parser.add_argument("--turns", type=int, default=10)
+    args = parser.parse_args()
+
+    server = load_server(LOG_LEVEL="WARNING", CONTEXT_HISTORY_TOKEN_BUDGET="100000")
+    payloads = unit_payloads(args.units, args.unit_chars)
+
+    def previous_layout():
+        builder = server.UltraSensitiveVoiceProcessor()
+        conversations = {}
+        for conversation in range(args.conversations):
+            context = json.loads(payloads[conversation % args.units])["context"]
+            builder.get_introduction("builder", context)
+            system_prompt = builder.prompt_store.get(builder.conversation_contexts["builder"].system_key)
+            messages = deque([{"role": "system", "content": (system_prompt + " ")[:-1]}],
+                             maxlen=server.MAX_CONTEXT_MESSAGES + 1)
+            for role, content in history(conversation, args.turns):
+                messages.append({"role": role, "content": content})
+            conversations[conversation] = (context, messages)
+        return conversations
+
+    def shared_layout():
+        processor = server.UltraSensitiveVoiceProcessor()
+        contexts = {}
+        for conversation in range(args.conversations):
+            conversation_id = f"conversation-{conversation}"
+            context = json.loads(payloads[conversation % args.units])["context"]
+            contexts[conversation_id] = processor.share_unit_content(conversation_id, context)
+            processor.get_introduction(conversation_id, context)
+            for role, content in history(conversation, args.turns):
+                processor.conversation_contexts[conversation_id].append(role, content)
+        return processor, contexts
+
+    rows = [measure("previous (copies + dicts)", previous_layout),
+            measure("shared store + slotted records", shared_layout)]
+    rows[1]["saved_pct"] = round(100 * (1 - rows[1]["retained_mb"] / rows[0]["retained_mb"]), 1)
+    print(f"{args.conversations} conversations on {args.units} units: {rows[1]['saved_pct']}% less retained memory")
+
+    persisted = asyncio.run(persisted_bytes(server, payloads, args))
+    persisted["saved_pct"] = round(100 * (1 - persisted["by_digest_mb"] / persisted["inline_mb"]), 1)
+    print(f"{'state backend, prompts inline':<34} {persisted['inline_mb']:>9} MB")
+    print(f"{'state backend, prompts by digest':<34} {persisted['by_digest_mb']:>9} MB "
+          f"({persisted['stored_prompts']} prompt bodies, {persisted['saved_pct']}% smaller)")
+    print(json.dumps({"layouts": rows, "state_backend": persisted}))
+
+
+if __name__ == "__main__":
+    main()
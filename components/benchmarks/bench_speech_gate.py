@@ -0,0 +1,128 @@
+"""
+PCM input mode speech gate: NumPy frame analysis vs a per-sample Python loop, and what it keeps from STT.
+
+Synthesizes 16 kHz utterances of the kinds a live microphone sends: speech
+padded with room tone, breathing, background hiss and plain silence. Each is
+run through SpeechGate.trim; the report shows analysis cost per second of
+audio, how many utterances never reach STT and how much of the rest is
+trimmed away.
+
+Usage:
+    python components/benchmarks/bench_speech_gate.py [--utterances 400] [--sample-rate 16000]
+"""
+import argparse
+import json
+import math
+import time
+
+import numpy as np
+
+from _server import load_server
+
+
+def speech(rng, sample_rate: int, seconds: float, level_dbfs: float = -22) -> np.ndarray:
+    """Voiced, syllable-modulated harmonics of a ~140 Hz voice"""
+    t = np.arange(int(sample_rate * seconds)) / sample_rate
+    f0 = 140 * (1 + 0.05 * np.sin(2 * np.pi * 0.7 * t))
+    phase = 2 * np.pi * np.cumsum(f0) / sample_rate
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 8))
+    envelope = 0.55 + 0.45 * np.sin(2 * np.pi * 4 * t + rng.uniform(0, np.pi))
+    signal = voiced * envelope
+    return signal / np.max(np.abs(signal)) * 32767 * 10 ** (level_dbfs / 20)
+
+
+def noise(rng, sample_rate: int, seconds: float, level_dbfs: float) -> np.ndarray:
+    return rng.normal(0, 32767 * 10 ** (level_dbfs / 20), int(sample_rate * seconds))
+
+
+def utterance(rng, kind: str, sample_rate: int) -> bytes:
+    room = lambda seconds: noise(rng, sample_rate, seconds, -62)
+    if kind == "speech":
+        parts = [room(rng.uniform(0.3, 1.2)), speech(rng, sample_rate, rng.uniform(0.8, 3.0)), room(rng.uniform(0.5, 1.0))]
+    elif kind == "breath":
+        parts = [room(0.3), noise(rng, sample_rate, rng.uniform(0.4, 0.9), -38), room(0.4)]
+    elif kind == "hiss":
+        parts = [noise(rng, sample_rate, rng.uniform(1.0, 2.0), -48)]
+    else:
+        parts = [room(rng.uniform(0.5, 1.5))]
+    pcm = np.clip(np.concatenate(parts), -32768, 32767).astype("<i2")
+    return pcm.tobytes()
+
+
+def python_speech_frames(pcm: bytes, sample_rate: int, speech_dbfs: float, max_zcr: float, loud_dbfs: float) -> int:
+    """The same per-frame rule written as a plain loop over samples"""
+    samples = memoryview(pcm).cast("h")
+    frame = sample_rate * 20 // 1000
+    voiced = 0
+    for start in range(0, len(samples) - frame + 1, frame):
+        energy = 0.0
+        crossings = 0
+        previous = samples[start] < 0
+        for value in samples[start:start + frame]:
+            energy += value * value
+            negative = value < 0
+            crossings += negative != previous
+            previous = negative
+        level = 20 * math.log10(max(math.sqrt(energy / frame), 1.0) / 32768.0)
+        zcr = crossings / frame
+        voiced += level > speech_dbfs and (zcr <= max_zcr or level > loud_dbfs)
+    return voiced
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--utterances", type=int, default=400)
+    parser.add_argument("--sample-rate", type=int, default=16000)
+    args = parser.parse_args()
+
+    server = load_server(LOG_LEVEL="WARNING")
+    gate = server.SpeechGate(args.sample_rate)
+    rng = np.random.default_rng(11)
+    kinds = ["speech", "speech", "breath", "hiss", "silence"]
+    samples = [(kinds[i % len(kinds)], utterance(rng, kinds[i % len(kinds)], args.sample_rate))
+               for i in range(args.utterances)]
+    audio_seconds = sum(len(pcm) for _, pcm in samples) / (2 * args.sample_rate)
+
+    started = time.perf_counter()
+    results = [(kind, pcm, gate.trim(pcm)) for kind, pcm in samples]
+    numpy_elapsed = time.perf_counter() - started
+
+    subset = samples[:max(len(samples) // 20, len(kinds))]
+    subset_seconds = sum(len(pcm) for _, pcm in subset) / (2 * args.sample_rate)
+    started = time.perf_counter()
+    for _, pcm in subset:
+        python_speech_frames(pcm, args.sample_rate, gate.speech_dbfs, gate.max_zcr, gate.loud_dbfs)
+    python_elapsed = time.perf_counter() - started
+
+    rows = []
+    for kind in dict.fromkeys(kinds):
+        matching = [(pcm, kept) for k, pcm, kept in results if k == kind]
+        passed = [(pcm, kept) for pcm, kept in matching if kept is not None]
+        rows.append({
+            "kind": kind,
+            "utterances": len(matching),
+            "sent_to_stt": len(passed),
+            "bytes_in": sum(len(pcm) for pcm, _ in matching),
+            "bytes_to_stt": sum(len(kept) for _, kept in passed),
+        })
+        print(f"{kind:<8} {len(matching):>5} utterances {len(passed):>5} sent to STT "
+              f"{rows[-1]['bytes_to_stt'] / max(rows[-1]['bytes_in'], 1):>7.1%} of bytes kept")
+
+    summary = {
+        "audio_seconds": round(audio_seconds, 1),
+        "numpy_us_per_audio_second": round(numpy_elapsed / audio_seconds * 1e6, 1),
+        "python_loop_us_per_audio_second": round(python_elapsed / subset_seconds * 1e6, 1),
+        "stt_calls_avoided": sum(row["utterances"] - row["sent_to_stt"] for row in rows),
+        "stt_calls_baseline": len(results),
+        "stt_bytes_saved_pct": round(100 * (1 - sum(row["bytes_to_stt"] for row in rows)
+                                            / sum(row["bytes_in"] for row in rows)), 1),
+    }
+    print(f"analysis: {summary['numpy_us_per_audio_second']} us per audio second (NumPy) vs "
+          f"{summary['python_loop_us_per_audio_second']} us (Python loop)")
+    print(f"{summary['stt_calls_avoided']}/{summary['stt_calls_baseline']} STT calls avoided, "
+          f"{summary['stt_bytes_saved_pct']}% fewer bytes uploaded")
+    print(json.dumps({"rows": rows, "summary": summary}))
+
+
+if __name__ == "__main__":
+    main()
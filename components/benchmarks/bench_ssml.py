@@ -0,0 +1,171 @@
+"""
+SSML generation micro-benchmarks: SSMLBuilder vs the previous per-call regex implementation.
+
+The previous functions are kept below verbatim (as module functions) as the
+reference. The benchmark checks the builder produces identical markup for
+text without XML special characters, then times emotion analysis, cold
+(unmemoized) SSML builds and memoized rebuilds of the same responses.
+
+Usage:
+    python components/benchmarks/bench_ssml.py [--rounds 2000]
+"""
+import argparse
+import json
+import random
+import re
+import time
+
+from _server import load_server
+
+RESPONSES = [
+    "That's an amazing question! Photosynthesis is how plants make food. Remember, chlorophyll is the key pigment.",
+    "Great job working through that. Let me explain the next step. It is crucial that you understand the formula.",
+    "Let's explore fractions together. What do you think happens when the denominator gets bigger?",
+    "Consider this: the mitochondria produces energy for the cell. Note how important that is for muscles.",
+    "Exactly right! Now think about why the moon has phases. Observe the shadow carefully next time.",
+    "Water boils at one hundred degrees Celsius at sea level. At higher altitudes it boils at a lower temperature.",
+    "Hello! I'm your tutor. What would you like to learn about today?",
+    "Wow, brilliant thinking. Essential skills like this one will help you discover much more in science.",
+]
+
+
+# --- Previous implementation (reference) ---
+
+def legacy_analyze_content_emotion(text):
+    text_lower = text.lower()
+    if any(word in text_lower for word in ['amazing', 'fantastic', 'incredible', 'wow', 'excellent', 'brilliant']):
+        return "excited"
+    elif any(word in text_lower for word in ['great job', 'well done', 'perfect', 'exactly', 'good work']):
+        return "encouraging"
+    elif any(word in text_lower for word in ['let me explain', 'consider this', 'think about', 'understand']):
+        return "thoughtful"
+    elif any(word in text_lower for word in ['let\'s explore', 'discover', 'learn about', 'dive into']):
+        return "enthusiastic"
+    else:
+        return "explanatory"
+
+
+def legacy_add_intelligent_emphasis(sentence):
+    emphasis_patterns = {
+        'strong': ['important', 'crucial', 'essential', 'key', 'vital', 'critical'],
+        'moderate': ['remember', 'note', 'notice', 'observe', 'consider', 'understand']
+    }
+    result = sentence
+    for level, words in emphasis_patterns.items():
+        for word in words:
+            pattern = rf'\b({re.escape(word)})\b'
+            replacement = f'<emphasis level="{level}">\\1</emphasis>'
+            result = re.sub(pattern, replacement, result, flags=re.IGNORECASE)
+    return result
+
+
+def legacy_add_speech_patterns(sentence, position, total):
+    if position == 0 and total > 1:
+        return f'<prosody pitch="+1st">{sentence}</prosody>'
+    elif position == total - 1 and total > 1:
+        return f'<prosody rate="0.95">{sentence}</prosody>'
+    elif total > 2 and position % 2 == 1:
+        return f'<prosody pitch="+0.5st">{sentence}</prosody>'
+    return sentence
+
+
+def legacy_validate_ssml(ssml):
+    if ssml.count('<speak>') != 1 or ssml.count('</speak>') != 1:
+        return False
+    if ssml.count('<prosody') != ssml.count('</prosody>'):
+        return False
+    return ssml.count('<emphasis') == ssml.count('</emphasis>')
+
+
+def legacy_create_ultra_natural_ssml(emotional_states, text, emotional_state="explanatory"):
+    emotion = emotional_states.get(emotional_state, emotional_states["explanatory"])
+    enhanced = text.strip()
+    if len(enhanced) < 5:
+        return enhanced
+    sentences = re.split(r'[.!?]+', enhanced)
+    sentences = [s.strip() for s in sentences if s.strip()]
+    if not sentences:
+        return enhanced
+    ssml_parts = ['<speak>']
+    ssml_parts.append(f'<prosody rate="{emotion["rate"]}" pitch="{emotion["pitch"]}" volume="{emotion["volume"]}">')
+    for i, sentence in enumerate(sentences):
+        emphasized_sentence = legacy_add_intelligent_emphasis(sentence)
+        emphasized_sentence = legacy_add_speech_patterns(emphasized_sentence, i, len(sentences))
+        ssml_parts.append(emphasized_sentence)
+        if i < len(sentences) - 1:
+            if sentence.endswith('?'):
+                ssml_parts.append('<break time="0.6s"/>')
+            elif sentence.endswith('!'):
+                ssml_parts.append('<break time="0.4s"/>')
+            else:
+                ssml_parts.append('<break time="0.3s"/>')
+    ssml_parts.append('</prosody>')
+    ssml_parts.append('</speak>')
+    ssml_result = ''.join(ssml_parts)
+    if legacy_validate_ssml(ssml_result):
+        return ssml_result
+    return enhanced
+
+
+# --- Benchmark ---
+
+def timed(label: str, calls: int, function) -> dict:
+    started = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - started
+    row = {"case": label, "us_per_call": round(elapsed / calls * 1e6, 2)}
+    print(f"{label:<40} {row['us_per_call']:>10} us/call")
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    server = load_server()
+    builder_states = {
+        "excited": {"pitch": "+4st", "rate": "1.05", "volume": "+3dB"},
+        "calm": {"pitch": "+1st", "rate": "0.90", "volume": "+2dB"},
+        "enthusiastic": {"pitch": "+3st", "rate": "1.10", "volume": "+4dB"},
+        "thoughtful": {"pitch": "0st", "rate": "0.85", "volume": "+1dB"},
+        "encouraging": {"pitch": "+2st", "rate": "0.95", "volume": "+3dB"},
+        "explanatory": {"pitch": "+1st", "rate": "0.88", "volume": "+2dB"}
+    }
+
+    for text in RESPONSES:
+        builder = server.SSMLBuilder(builder_states)
+        emotion = legacy_analyze_content_emotion(text)
+        assert builder.classify(text) == emotion, text
+        assert builder.build(text, emotion) == legacy_create_ultra_natural_ssml(builder_states, text, emotion), text
+    print(f"Output identical to the previous implementation for {len(RESPONSES)} responses")
+
+    # Unique texts defeat memoization for the cold cases
+    rng = random.Random(7)
+    cold_texts = [f"{rng.choice(RESPONSES)} Item {i}." for i in range(args.rounds)]
+    calls = len(cold_texts)
+    rows = []
+
+    rows.append(timed("emotion: previous any() scans", calls,
+                      lambda: [legacy_analyze_content_emotion(t) for t in cold_texts]))
+    builder = server.SSMLBuilder(builder_states)
+    rows.append(timed("emotion: compiled alternations, cold", calls,
+                      lambda: [builder.classify(t) for t in cold_texts]))
+    rows.append(timed("emotion: memoized repeats", calls,
+                      lambda: [builder.classify(t) for t in cold_texts]))
+
+    rows.append(timed("ssml: previous (12 re.sub + validate)", calls,
+                      lambda: [legacy_create_ultra_natural_ssml(builder_states, t, "explanatory") for t in cold_texts]))
+    builder = server.SSMLBuilder(builder_states, cache_size=0)
+    rows.append(timed("ssml: builder, cold", calls,
+                      lambda: [builder.build(t, "explanatory") for t in cold_texts]))
+
+    builder = server.SSMLBuilder(builder_states)
+    warm_texts = [RESPONSES[i % len(RESPONSES)] for i in range(args.rounds)]
+    rows.append(timed("ssml: builder, memoized repeats", len(warm_texts),
+                      lambda: [builder.build(t, "explanatory") for t in warm_texts]))
+    print(json.dumps(rows))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,395 @@
+"""
+Offline end-to-end load test for the /conversation WebSocket.
+
+Opens N concurrent conversations against a running server (or one started with
+--spawn alongside fake_upstreams.py). Each conversation sends set_context and
+start_conversation, waits for the introduction, then replays utterances as
+chunked audio frames followed by an utterance_end marker.
+
+Reported per concurrency level:
+- turn latency: from utterance_end to audio_end
+- time to first audio (TTFA): from utterance_end to the first binary frame
+- p50/p95/p99 of both, completed turns per second, and failures
+- audio KB per turn, which depends on the negotiated --audio-format
+- with --framed, frames per turn; out-of-order or foreign frames count as failures
+- with --input-audio pcm16, utterances are 16 kHz PCM (room tone, a voiced tone, room tone)
+- peak server RSS, when the server pid is known
+- with --drain-after S, the server gets SIGTERM S seconds in; conversations it closes with a
+  reconnect hint count as drained, and only turns it cut off (interrupted audio) count as failures
+
+Usage:
+    python components/benchmarks/load_test.py --spawn --concurrency 1,10,50 --turns 3
+    python components/benchmarks/load_test.py --url ws://127.0.0.1:3000/conversation --server-pid 1234
+    python components/benchmarks/load_test.py --spawn --fake-args "--chat-latency lognormal:800:0.5 --tts-error-rate 0.02"
+    python components/benchmarks/load_test.py --spawn --audio-format low_bandwidth
+    python components/benchmarks/load_test.py --spawn --concurrency 20 --turns 5 --drain-after 3
+"""
+import argparse
+import array
+import asyncio
+import json
+import math
+import os
+import shlex
+import signal
+import struct
+import subprocess
+import sys
+import time
+
+import aiohttp
+
+COMPONENTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WEBM_HEADER = b"\x1a\x45\xdf\xa3" + b"\x00" * 60
+WEBM_CLUSTER = b"\x1f\x43\xb6\x75"
+AUDIO_FRAME_HEADER = struct.Struct("!BBII")  # version, flags, turn id, sequence number
+PCM_SAMPLE_RATE = 16000
+CONTEXT = {
+    "companionName": "Load Test Tutor",
+    "subject": "science",
+    "unitTitle": "Photosynthesis",
+    "unitContent": "Plants convert light energy into chemical energy stored in glucose. " * 40,
+    "style": "conversational",
+}
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def read_rss_mb(pid: int) -> float:
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return float("nan")
+
+
+def pcm_frame(frame_index: int, frames: int, samples: int) -> bytes:
+    """Quiet room tone for the first and last frame, a modulated 140 Hz harmonic voice in between"""
+    voiced = 0 < frame_index < frames - 1
+    offset = frame_index * samples
+    values = array.array("h")
+    for n in range(offset, offset + samples):
+        t = n / PCM_SAMPLE_RATE
+        if voiced:
+            tone = sum(math.sin(2 * math.pi * 140 * k * t) / k for k in range(1, 5))
+            values.append(int(4000 * tone * (0.6 + 0.4 * math.sin(2 * math.pi * 4 * t))))
+        else:
+            values.append(int(20 * math.sin(2 * math.pi * 50 * t)))
+    return values.tobytes()
+
+
+class ConversationResult:
+    def __init__(self):
+        self.turn_latencies = []
+        self.ttfa = []
+        self.audio_bytes = []
+        self.audio_frames = []
+        self.failures = {}
+        self.intro_latency = None
+        self.drained = False
+
+    def fail(self, reason: str):
+        self.failures[reason] = self.failures.get(reason, 0) + 1
+
+
+async def receive_turn(ws, result: ConversationResult, args, started: float, label: str = None) -> str:
+    """Read messages until the turn ends: "ok", "failed", "drained" (reconnect hint) or "aborted" (timeout/closed)
+
+    Servers that send turn_timing messages end every turn (including failed ones)
+    with one, so that is waited for; otherwise audio_end, error or
+    no_speech_detected ends the turn.
+    """
+    first_audio = None
+    audio_bytes = 0
+    frames = 0
+    turn_id = None
+    audio_ended = None
+    failure = None
+    deadline = started + args.timeout
+    while True:
+        remaining = deadline - time.perf_counter()
+        try:
+            if remaining <= 0:
+                raise asyncio.TimeoutError
+            message = await ws.receive(timeout=remaining)
+        except asyncio.TimeoutError:
+            result.fail(f"{label}_timeout" if label else "timeout")
+            return "aborted"
+        if message.type == aiohttp.WSMsgType.BINARY:
+            if first_audio is None:
+                first_audio = time.perf_counter()
+            if args.framed:
+                _, _, frame_turn, seq = AUDIO_FRAME_HEADER.unpack_from(message.data)
+                if frame_turn != turn_id or seq != frames:
+                    failure = "frame_out_of_order"
+                frames += 1
+                audio_bytes += len(message.data) - AUDIO_FRAME_HEADER.size
+            else:
+                audio_bytes += len(message.data)
+        elif message.type == aiohttp.WSMsgType.TEXT:
+            data = json.loads(message.data)
+            kind = data.get("type")
+            if kind == "audio_start":
+                turn_id = data.get("turn_id")
+                continue
+            if kind == "reconnect":
+                # The server is draining: input sent after it stopped accepting never became a turn
+                result.drained = True
+                return "drained"
+            if kind == "audio_end" and data.get("interrupted") and failure is None:
+                failure = "cut_off"
+            if kind == "audio_end" and audio_ended is None:
+                # A turn whose frames arrived out of order is a failure, not a latency sample
+                if failure is None:
+                    audio_ended = time.perf_counter()
+                    if not label:
+                        result.ttfa.append((first_audio or audio_ended) - started)
+                        result.turn_latencies.append(audio_ended - started)
+                        result.audio_bytes.append(audio_bytes)
+                        result.audio_frames.append(frames)
+            elif kind in ("error", "no_speech_detected") and audio_ended is None:
+                failure = kind
+            elif kind != "turn_timing":
+                continue
+
+            if kind == "turn_timing" or not args.timing_messages:
+                if audio_ended is not None:
+                    return "ok"
+                reason = failure or "no_audio"
+                result.fail(f"{label}_{reason}" if label else reason)
+                return "failed"
+        elif message.type in (aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+            result.fail("closed")
+            return "aborted"
+
+
+async def run_conversation(session: aiohttp.ClientSession, args, result: ConversationResult):
+    try:
+        async with session.ws_connect(args.url, max_msg_size=0) as ws:
+            greeting = await ws.receive_json(timeout=args.timeout)  # connection_established or server_busy
+            if greeting.get("type") == "server_busy":
+                result.fail(f"rejected_{greeting.get('reason')}")
+                return
+            set_context = {"type": "set_context", "context": CONTEXT, "streaming": args.streaming}
+            if args.audio_format:
+                set_context["audio_format"] = args.audio_format
+            if args.framed:
+                set_context["audio_framing"] = True
+            if args.input_audio == "pcm16":
+                set_context["input_audio"] = {"encoding": "LINEAR16", "sample_rate_hertz": PCM_SAMPLE_RATE}
+            await ws.send_json(set_context)
+            await ws.send_json({"type": "start_conversation"})
+            started = time.perf_counter()
+            # A failed introduction is counted, but the student can still talk
+            if await receive_turn(ws, result, args, started, label="introduction") in ("aborted", "drained"):
+                return
+            result.intro_latency = time.perf_counter() - started
+
+            for _ in range(args.turns):
+                try:
+                    for frame_index in range(args.frames):
+                        if args.input_audio == "pcm16":
+                            await ws.send_bytes(pcm_frame(frame_index, args.frames, args.frame_bytes // 2))
+                        else:
+                            frame = WEBM_CLUSTER + os.urandom(args.frame_bytes)
+                            await ws.send_bytes(WEBM_HEADER + frame if frame_index == 0 else frame)
+                        await asyncio.sleep(args.frame_interval_ms / 1000)
+                    await ws.send_json({"type": "utterance_end"})
+                except ConnectionResetError:
+                    pass  # Closed mid-utterance; the messages already received say why (e.g. a reconnect hint)
+                if await receive_turn(ws, result, args, time.perf_counter()) in ("aborted", "drained"):
+                    return
+                await asyncio.sleep(args.think_ms / 1000)
+    except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+        if not result.drained:
+            result.fail(type(e).__name__)
+
+
+async def run_level(args, concurrency: int) -> dict:
+    results = [ConversationResult() for _ in range(concurrency)]
+    peak_rss = read_rss_mb(args.server_pid) if args.server_pid else float("nan")
+    stop = asyncio.Event()
+
+    async def sample_memory():
+        nonlocal peak_rss
+        while not stop.is_set():
+            peak_rss = max(peak_rss, read_rss_mb(args.server_pid))
+            await asyncio.sleep(0.25)
+
+    async def restart_server():
+        await asyncio.sleep(args.drain_after)
+        os.kill(args.server_pid, signal.SIGTERM)
+
+    sampler = asyncio.create_task(sample_memory()) if args.server_pid else None
+    restart = asyncio.create_task(restart_server()) if args.drain_after is not None else None
+    started = time.perf_counter()
+    async with aiohttp.ClientSession() as session:
+        await asyncio.gather(*(run_conversation(session, args, result) for result in results))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    if sampler:
+        await sampler
+    if restart and not restart.done():
+        restart.cancel()
+
+    latencies = [value for result in results for value in result.turn_latencies]
+    ttfa = [value for result in results for value in result.ttfa]
+    audio_bytes = [value for result in results for value in result.audio_bytes]
+    audio_frames = [value for result in results for value in result.audio_frames]
+    intros = [result.intro_latency for result in results if result.intro_latency is not None]
+    failures = {}
+    for result in results:
+        for reason, count in result.failures.items():
+            failures[reason] = failures.get(reason, 0) + count
+    return {
+        "concurrency": concurrency,
+        "turns_completed": len(latencies),
+        "turns_failed": sum(failures.values()),
+        "failures": failures,
+        "conversations_drained": sum(result.drained for result in results),
+        "turn_p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "turn_p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "turn_p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "ttfa_p50_ms": round(percentile(ttfa, 50) * 1000, 1),
+        "ttfa_p95_ms": round(percentile(ttfa, 95) * 1000, 1),
+        "ttfa_p99_ms": round(percentile(ttfa, 99) * 1000, 1),
+        "intro_p50_ms": round(percentile(intros, 50) * 1000, 1),
+        "audio_kb_per_turn": round(sum(audio_bytes) / max(len(audio_bytes), 1) / 1024, 1),
+        "frames_per_turn": round(sum(audio_frames) / max(len(audio_frames), 1), 1),
+        "turns_per_second": round(len(latencies) / elapsed, 2),
+        "server_rss_mb": round(peak_rss, 1),
+        "elapsed_s": round(elapsed, 1),
+    }
+
+
+async def server_sends_timings(health_url: str) -> bool:
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(health_url) as response:
+                health = await response.json()
+        return bool(health.get("tracing", {}).get("timing_messages"))
+    except (aiohttp.ClientError, ValueError):
+        return False
+
+
+async def wait_for_http(url: str, timeout: float = 30):
+    deadline = time.perf_counter() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.perf_counter() < deadline:
+            try:
+                async with session.get(url) as response:
+                    if response.status < 500:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def spawn(args) -> list:
+    """Start fake_upstreams.py and the voice server, pointing the server at the fakes"""
+    fake_url = f"http://127.0.0.1:{args.fake_port}"
+    output = None if args.verbose else subprocess.DEVNULL
+    fakes = subprocess.Popen(
+        [sys.executable, os.path.join(COMPONENTS_DIR, "fake_upstreams.py"), "--port", str(args.fake_port),
+         *shlex.split(args.fake_args)],
+        stdout=output, stderr=output
+    )
+    env = dict(
+        os.environ,
+        DEEPGRAM_URL=f"{fake_url}/v1/listen",
+        OPENAI_BASE_URL=f"{fake_url}/v1",
+        GOOGLE_TTS_ENDPOINT=fake_url,
+        OPENAI_API_KEY=os.environ.get("OPENAI_API_KEY", "fake-openai-key"),
+        DEEPGRAM_API_KEY=os.environ.get("DEEPGRAM_API_KEY", "fake-deepgram-key"),
+        WARMUP_ON_STARTUP="false",
+        LOG_MODE=os.environ.get("LOG_MODE", "production"),
+        LOG_LEVEL=os.environ.get("LOG_LEVEL", "WARNING"),
+    )
+    server_code = (
+        "import sys, uvicorn; sys.path.insert(0, sys.argv[1]); from _server import load_server; "
+        "uvicorn.run(load_server().app, host='127.0.0.1', port=int(sys.argv[2]), log_level='warning')"
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-c", server_code, os.path.dirname(os.path.abspath(__file__)), str(args.server_port)],
+        env=env, stdout=output, stderr=output
+    )
+    args.url = f"ws://127.0.0.1:{args.server_port}/conversation"
+    args.server_pid = server.pid
+    return [server, fakes]
+
+
+def print_report(rows: list):
+    columns = ("concurrency", "turns_completed", "turns_failed", "turn_p50_ms", "turn_p95_ms", "turn_p99_ms",
+               "ttfa_p50_ms", "ttfa_p95_ms", "ttfa_p99_ms", "audio_kb_per_turn", "turns_per_second", "server_rss_mb")
+    print(" ".join(f"{column:>16}" for column in columns))
+    for row in rows:
+        print(" ".join(f"{row[column]!s:>16}" for column in columns))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="ws://127.0.0.1:3000/conversation")
+    parser.add_argument("--concurrency", default="1,10,50", help="Comma-separated conversation counts")
+    parser.add_argument("--turns", type=int, default=3, help="Turns per conversation")
+    parser.add_argument("--frames", type=int, default=5, help="Audio frames per utterance")
+    parser.add_argument("--frame-bytes", type=int, default=4000)
+    parser.add_argument("--frame-interval-ms", type=float, default=100)
+    parser.add_argument("--think-ms", type=float, default=200, help="Pause between a reply and the next utterance")
+    parser.add_argument("--timeout", type=float, default=30, help="Per-turn deadline in seconds")
+    parser.add_argument("--streaming", action="store_true", help="Use streamed LLM->TTS turns")
+    parser.add_argument("--audio-format", default=None,
+                        help='Preset name ("low_bandwidth") or JSON, e.g. \'{"encoding": "OGG_OPUS", "sample_rate_hertz": 16000}\'')
+    parser.add_argument("--input-audio", choices=("webm", "pcm16"), default="webm")
+    parser.add_argument("--framed", action="store_true", help="Opt in to framed, sequenced binary audio")
+    parser.add_argument("--server-pid", type=int, default=None, help="Sample this process's RSS")
+    parser.add_argument("--drain-after", type=float, default=None,
+                        help="Send the server SIGTERM this many seconds into the (single) level")
+    parser.add_argument("--spawn", action="store_true", help="Start fake upstreams and the server locally")
+    parser.add_argument("--server-port", type=int, default=3100)
+    parser.add_argument("--fake-port", type=int, default=8765)
+    parser.add_argument("--fake-args", default="", help="Extra fake_upstreams.py arguments (latency, error rates)")
+    parser.add_argument("--json-out", default=None, help="Also write the report rows to this file")
+    parser.add_argument("--verbose", action="store_true", help="Show spawned process output")
+    args = parser.parse_args()
+    if args.audio_format and args.audio_format.lstrip().startswith("{"):
+        args.audio_format = json.loads(args.audio_format)
+
+    if args.drain_after is not None and not (args.spawn or args.server_pid):
+        parser.error("--drain-after needs --spawn or --server-pid")
+    processes = spawn(args) if args.spawn else []
+    try:
+        if processes:
+            await wait_for_http(f"http://127.0.0.1:{args.fake_port}/stats")
+            await wait_for_http(f"http://127.0.0.1:{args.server_port}/health")
+        health_url = args.url.replace("ws", "http", 1).rsplit("/", 1)[0] + "/health"
+        args.timing_messages = await server_sends_timings(health_url)
+
+        rows = []
+        for concurrency in (int(level) for level in args.concurrency.split(",")):
+            row = await run_level(args, concurrency)
+            rows.append(row)
+            print(json.dumps(row), flush=True)
+        print()
+        print_report(rows)
+        if args.json_out:
+            with open(args.json_out, "w") as out:
+                json.dump(rows, out, indent=2)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,330 @@
+"""
+Local stand-ins for the voice server's upstream APIs so it can run offline.
+
+STT: Deepgram-compatible pre-recorded transcription (POST /v1/listen) returning
+the configured transcript, and a live transcription WebSocket on the same path.
+Every live audio frame produces an interim result that reveals one more word of
+the transcript; once no audio has arrived for --silence-ms the full transcript
+is sent as a final, speech_final result followed by UtteranceEnd.
+
+Chat: OpenAI-compatible POST /v1/chat/completions, plain or streamed as
+server-sent events (one word per chunk, --chat-token-ms apart).
+
+TTS: Google Cloud Text-to-Speech REST POST /v1/text:synthesize returning
+placeholder audio sized to the input text.
+
+Latencies are drawn from distributions given as "const:MS", "uniform:LO:HI",
+"normal:MEAN:SD" or "lognormal:MEDIAN_MS:SIGMA". Each upstream fails with a 503
+at its --*-error-rate.
+
+Key-value store: a tiny in-memory Redis (RESP) stand-in supporting GET, SET
+(with EX), DEL, PING, AUTH and SELECT, for the networked conversation state backend.
+
+Usage:
+    python fake_upstreams.py --port 8765 --kv-port 6380 --chat-latency lognormal:400:0.5
+    DEEPGRAM_URL=http://127.0.0.1:8765/v1/listen OPENAI_BASE_URL=http://127.0.0.1:8765/v1 \\
+        GOOGLE_TTS_ENDPOINT=http://127.0.0.1:8765 OPENAI_API_KEY=fake DEEPGRAM_API_KEY=fake \\
+        CONVERSATION_STATE_URL=redis://127.0.0.1:6380/0 python "import asyncio.py"
+    DEEPGRAM_STREAM_URL=ws://127.0.0.1:8765/v1/listen STT_STREAMING=true ...  # live STT instead
+"""
+import argparse
+import asyncio
+import base64
+import json
+import logging
+import math
+import random
+import time
+
+from aiohttp import web, WSMsgType
+
+logger = logging.getLogger("fake_upstreams")
+
+DEFAULT_TRANSCRIPT = "Can you explain how photosynthesis works?"
+DEFAULT_REPLY = ("Great question! Photosynthesis is how plants turn sunlight, water and carbon dioxide "
+                 "into sugar and oxygen. Which part would you like to explore first?")
+AUDIO_BYTES_PER_CHAR = 60  # Roughly 24 kbps MP3 at a normal speaking rate
+SPOKEN_CHARS_PER_SECOND = 50  # Input characters (SSML markup included) per second of audio at that rate
+AUDIO_ENCODINGS = {  # audioEncoding -> (magic header, bytes per second at a given sample rate)
+    "MP3": (b"ID3", lambda rate: AUDIO_BYTES_PER_CHAR * SPOKEN_CHARS_PER_SECOND),
+    "OGG_OPUS": (b"OggS", lambda rate: 1500 if rate <= 16000 else 3000),  # ~12 / 24 kbps voice Opus
+    "LINEAR16": (b"RIFF\x00\x00\x00\x00WAVE", lambda rate: rate * 2),
+}
+
+
+class LatencyModel:
+    """Samples upstream latency from a distribution spec such as "lognormal:300:0.4" """
+
+    def __init__(self, spec: str, rng: random.Random):
+        self.spec = spec
+        self.rng = rng
+        kind, *params = spec.split(":")
+        self.kind = kind
+        self.params = [float(param) for param in params]
+        if kind not in ("const", "uniform", "normal", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {spec}")
+
+    def sample(self) -> float:
+        """Latency in seconds"""
+        if self.kind == "const":
+            ms = self.params[0]
+        elif self.kind == "uniform":
+            ms = self.rng.uniform(*self.params)
+        elif self.kind == "normal":
+            ms = self.rng.gauss(*self.params)
+        else:
+            median, sigma = self.params
+            ms = median * math.exp(self.rng.gauss(0, sigma))
+        return max(ms, 0.0) / 1000
+
+
+class Upstream:
+    """Latency and failure injection for one fake upstream, with request counters"""
+
+    def __init__(self, name: str, latency: str, error_rate: float, rng: random.Random):
+        self.name = name
+        self.latency = LatencyModel(latency, rng)
+        self.error_rate = error_rate
+        self.rng = rng
+        self.requests = 0
+        self.errors = 0
+
+    async def delay(self):
+        await asyncio.sleep(self.latency.sample())
+
+    def should_fail(self) -> bool:
+        self.requests += 1
+        if self.rng.random() < self.error_rate:
+            self.errors += 1
+            return True
+        return False
+
+    def error_response(self) -> web.Response:
+        return web.json_response({"error": {"message": f"fake {self.name} failure", "code": 503}}, status=503)
+
+
+def stt_result(transcript: str, is_final: bool, speech_final: bool = False) -> str:
+    """Build a Deepgram live 'Results' message"""
+    return json.dumps({
+        "type": "Results",
+        "is_final": is_final,
+        "speech_final": speech_final,
+        "channel": {
+            "alternatives": [{"transcript": transcript, "confidence": 0.99}]
+        }
+    })
+
+
+async def stt_listen(request: web.Request) -> web.WebSocketResponse:
+    """Fake Deepgram live transcription endpoint"""
+    config = request.app["config"]
+    words = config.transcript.split()
+    ws = web.WebSocketResponse()
+    await ws.prepare(request)
+
+    state = {"frames": 0, "endpoint_task": None}
+
+    async def finalize(delay: float):
+        await asyncio.sleep(delay)
+        if state["frames"] and not ws.closed:
+            await ws.send_str(stt_result(config.transcript, is_final=True, speech_final=True))
+            await ws.send_str(json.dumps({"type": "UtteranceEnd"}))
+        state["frames"] = 0
+
+    def schedule_endpoint(delay: float):
+        if state["endpoint_task"] and not state["endpoint_task"].done():
+            state["endpoint_task"].cancel()
+        state["endpoint_task"] = asyncio.create_task(finalize(delay))
+
+    async for message in ws:
+        if message.type == WSMsgType.BINARY:
+            state["frames"] += 1
+            partial = " ".join(words[:min(state["frames"], len(words))])
+            await ws.send_str(stt_result(partial, is_final=False))
+            schedule_endpoint(config.silence_ms / 1000)
+        elif message.type == WSMsgType.TEXT:
+            control = json.loads(message.data).get("type")
+            if control in ("Finalize", "CloseStream"):
+                schedule_endpoint(0)
+            if control == "CloseStream":
+                await state["endpoint_task"]
+                break
+
+    if state["endpoint_task"] and not state["endpoint_task"].done():
+        state["endpoint_task"].cancel()
+    await ws.close()
+    return ws
+
+
+async def stt_prerecorded(request: web.Request) -> web.Response:
+    """Fake Deepgram pre-recorded transcription"""
+    config = request.app["config"]
+    upstream = request.app["upstreams"]["stt"]
+    await request.read()
+    await upstream.delay()
+    if upstream.should_fail():
+        return upstream.error_response()
+    return web.json_response({
+        "metadata": {"request_id": "fake", "channels": 1},
+        "results": {"channels": [{"alternatives": [{"transcript": config.transcript, "confidence": 0.98}]}]}
+    })
+
+
+async def chat_completions(request: web.Request) -> web.StreamResponse:
+    """Fake OpenAI chat completions, streamed when the request asks for it"""
+    config = request.app["config"]
+    upstream = request.app["upstreams"]["chat"]
+    body = await request.json()
+    await upstream.delay()
+    if upstream.should_fail():
+        return upstream.error_response()
+
+    prompt_tokens = sum(len(str(message.get("content", ""))) for message in body.get("messages", [])) // 4
+    words = config.reply.split()
+    usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(words),
+             "total_tokens": prompt_tokens + len(words)}
+
+    if not body.get("stream"):
+        return web.json_response({
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": config.reply}, "finish_reason": "stop"}],
+            "usage": usage
+        })
+
+    response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+    await response.prepare(request)
+    for i, word in enumerate(words):
+        if i:
+            await asyncio.sleep(config.chat_token_ms / 1000)
+        delta = {"choices": [{"index": 0, "delta": {"content": word if i == 0 else " " + word}}]}
+        await response.write(f"data: {json.dumps(delta)}\n\n".encode())
+    if (body.get("stream_options") or {}).get("include_usage"):
+        await response.write(f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n".encode())
+    await response.write(b"data: [DONE]\n\n")
+    await response.write_eof()
+    return response
+
+
+async def text_synthesize(request: web.Request) -> web.Response:
+    """Fake Google Cloud TTS text:synthesize"""
+    upstream = request.app["upstreams"]["tts"]
+    body = await request.json()
+    await upstream.delay()
+    if upstream.should_fail():
+        return upstream.error_response()
+    synthesis_input = body.get("input", {})
+    characters = len(synthesis_input.get("ssml") or synthesis_input.get("text") or "")
+    audio_config = body.get("audioConfig", {})
+    magic, bytes_per_second = AUDIO_ENCODINGS.get(audio_config.get("audioEncoding", "MP3"), AUDIO_ENCODINGS["MP3"])
+    size = characters * bytes_per_second(int(audio_config.get("sampleRateHertz") or 24000)) // SPOKEN_CHARS_PER_SECOND
+    audio = magic + bytes(max(size, 2000 if magic == b"ID3" else 600))
+    return web.json_response({"audioContent": base64.b64encode(audio).decode()})
+
+
+async def upstream_stats(request: web.Request) -> web.Response:
+    return web.json_response({
+        name: {"requests": upstream.requests, "errors": upstream.errors, "latency": upstream.latency.spec}
+        for name, upstream in request.app["upstreams"].items()
+    })
+
+
+class FakeKeyValueStore:
+    """In-memory Redis protocol server for the conversation state backend"""
+
+    def __init__(self):
+        self.data = {}  # key -> (value, expires_at or None)
+
+    def execute(self, args: list) -> bytes:
+        command = args[0].upper() if args else b""
+        if command == b"PING":
+            return b"+PONG\r\n"
+        if command in (b"AUTH", b"SELECT"):
+            return b"+OK\r\n"
+        if command == b"GET":
+            entry = self.data.get(args[1])
+            if entry is None or (entry[1] is not None and entry[1] <= time.monotonic()):
+                self.data.pop(args[1], None)
+                return b"$-1\r\n"
+            return b"$%d\r\n%s\r\n" % (len(entry[0]), entry[0])
+        if command == b"SET":
+            expires_at = None
+            if len(args) >= 5 and args[3].upper() == b"EX":
+                expires_at = time.monotonic() + int(args[4])
+            self.data[args[1]] = (args[2], expires_at)
+            return b"+OK\r\n"
+        if command == b"DEL":
+            removed = sum(1 for key in args[1:] if self.data.pop(key, None) is not None)
+            return b":%d\r\n" % removed
+        return b"-ERR unknown command\r\n"
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                header = await reader.readline()
+                if not header:
+                    break
+                args = []
+                for _ in range(int(header[1:-2])):
+                    length = int((await reader.readline())[1:-2])
+                    args.append((await reader.readexactly(length + 2))[:-2])
+                writer.write(self.execute(args))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+def create_app(config: argparse.Namespace) -> web.Application:
+    app = web.Application()
+    app["config"] = config
+    rng = random.Random(config.seed)
+    app["upstreams"] = {
+        "stt": Upstream("stt", config.stt_latency, config.stt_error_rate, rng),
+        "chat": Upstream("chat", config.chat_latency, config.chat_error_rate, rng),
+        "tts": Upstream("tts", config.tts_latency, config.tts_error_rate, rng),
+    }
+    app.router.add_get("/v1/listen", stt_listen)
+    app.router.add_post("/v1/listen", stt_prerecorded)
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    app.router.add_post("/v1/text:synthesize", text_synthesize)
+    app.router.add_get("/stats", upstream_stats)
+
+    if config.kv_port:
+        async def start_kv_store(app: web.Application):
+            store = FakeKeyValueStore()
+            app["kv_server"] = await asyncio.start_server(store.handle, config.host, config.kv_port)
+            logger.info(f"Fake key-value store listening on redis://{config.host}:{config.kv_port}/0")
+
+        async def stop_kv_store(app: web.Application):
+            app["kv_server"].close()
+            await app["kv_server"].wait_closed()
+
+        app.on_startup.append(start_kv_store)
+        app.on_cleanup.append(stop_kv_store)
+    return app
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Fake upstream APIs for offline voice server testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--transcript", default=DEFAULT_TRANSCRIPT, help="Text every utterance transcribes to")
+    parser.add_argument("--silence-ms", type=int, default=600, help="Audio gap that ends an utterance")
+    parser.add_argument("--kv-port", type=int, default=None, help="Also serve a Redis-protocol key-value store")
+    parser.add_argument("--reply", default=DEFAULT_REPLY, help="Text every chat completion answers with")
+    parser.add_argument("--stt-latency", default="lognormal:250:0.3", help="Pre-recorded STT latency distribution")
+    parser.add_argument("--chat-latency", default="lognormal:400:0.4", help="Chat latency to the first token")
+    parser.add_argument("--chat-token-ms", type=float, default=15, help="Gap between streamed tokens")
+    parser.add_argument("--tts-latency", default="lognormal:200:0.3", help="TTS synthesis latency distribution")
+    parser.add_argument("--stt-error-rate", type=float, default=0.0)
+    parser.add_argument("--chat-error-rate", type=float, default=0.0)
+    parser.add_argument("--tts-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=None, help="Seed latency and failure sampling")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    args = parse_args()
+    logger.info(f"Fake upstreams listening on http://{args.host}:{args.port}")
+    web.run_app(create_app(args), host=args.host, port=args.port, print=None)
@@ -1,99 +1,2669 @@
 import asyncio
 import logging
+import logging.handlers
+import queue
 import json
 import os
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Union
 import uvicorn
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from datetime import datetime
 import uuid
+from urllib.parse import urlparse
+from xml.sax.saxutils import escape as xml_escape
 from dotenv import load_dotenv
 import aiohttp
 import traceback
-from collections import deque
+from collections import deque, OrderedDict
 import re
 import random
+import time
+import itertools
+import functools
+import mmap
+import sqlite3
+import threading
+import signal
+from contextlib import contextmanager, asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from bisect import bisect_left
+from contextvars import ContextVar
+import zlib
+import hashlib
+import hmac
+import secrets
+import abc
+import weakref
+import struct
+
+try:
+    import fcntl
+except ImportError:  # Windows - single-process writes only
+    fcntl = None
+
+try:
+    import tiktoken
+except ImportError:  # Token counts fall back to a character estimate
+    tiktoken = None
+
+try:
+    import numpy as np
+except ImportError:  # PCM input mode (and its speech gate) is unavailable
+    np = None
 
 # Google Cloud TTS imports
 from google.cloud import texttospeech
 from google.oauth2 import service_account
+from google.auth.credentials import AnonymousCredentials
+from google.api_core import exceptions as google_exceptions
+
+# Load environment variables
+load_dotenv()
+
+# Configuration
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+DEEPGRAM_API_KEY = os.getenv("DEEPGRAM_API_KEY")
+GOOGLE_APPLICATION_CREDENTIALS = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
+GOOGLE_APPLICATION_CREDENTIALS_JSON = os.getenv("GOOGLE_APPLICATION_CREDENTIALS_JSON")
+
+# Upstream endpoints - overridden to point at fake_upstreams.py for offline load tests
+DEEPGRAM_URL = os.getenv("DEEPGRAM_URL", "https://api.deepgram.com/v1/listen")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+GOOGLE_TTS_ENDPOINT = os.getenv("GOOGLE_TTS_ENDPOINT")  # REST transport, anonymous credentials
+
+# Ultra Sensitive Settings - Maximum responsiveness
+USE_GPT_3_5 = True
+MAX_CONTEXT_MESSAGES = 10
+CONTEXT_HISTORY_TOKEN_BUDGET = int(os.getenv("CONTEXT_HISTORY_TOKEN_BUDGET", "800"))  # Summary + recent turns; system prompt is pinned
+CONTEXT_SUMMARY_MAX_TOKENS = int(os.getenv("CONTEXT_SUMMARY_MAX_TOKENS", "200"))
+CONTEXT_MIN_RECENT_MESSAGES = 4  # Never folded, whatever the budget
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "2000"))
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.6"))  # Jaccard over words + word pairs, same conversation only
+RESPONSE_CACHE_MIN_WORDS = 3  # Shorter questions only match canned replies exactly
+MAX_RESPONSE_TOKENS = 200
+USE_VOICE_CACHE = True
+VOICE_CACHE_MAX_BYTES = int(os.getenv("VOICE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+VOICE_CACHE_TTL_SECONDS = int(os.getenv("VOICE_CACHE_TTL_SECONDS", "86400"))
+TTS_DISK_CACHE_DIR = os.getenv("TTS_DISK_CACHE_DIR")  # Shared across workers and restarts when set
+TTS_DISK_CACHE_MAX_BYTES = int(os.getenv("TTS_DISK_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+ENABLE_ADVANCED_SSML = True
+USE_EMOTIONAL_VARIANCE = True
+USE_BREATHING_PAUSES = False
+USE_SPEECH_PATTERNS = True
+SSML_CACHE_SIZE = int(os.getenv("SSML_CACHE_SIZE", "2048"))
+
+# Warm-up - pre-synthesize canned phrases for every voice before reporting ready
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true"
+WARMUP_CONCURRENCY = int(os.getenv("WARMUP_CONCURRENCY", "4"))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")  # /admin/* endpoints are disabled until this is set
+
+# Conversation state backend - "redis://host:port/db" shares state across workers, unset keeps it in-process
+CONVERSATION_STATE_URL = os.getenv("CONVERSATION_STATE_URL")
+CONVERSATION_STATE_TTL_SECONDS = int(os.getenv("CONVERSATION_STATE_TTL_SECONDS", "1800"))
+CONVERSATION_STATE_TIMEOUT_SECONDS = float(os.getenv("CONVERSATION_STATE_TIMEOUT_SECONDS", "1.0"))  # Per connect and per command
+
+# Turn queue - audio arriving during a turn is merged into the next utterance instead of dropped
+TURN_QUEUE_MAX_FRAMES = int(os.getenv("TURN_QUEUE_MAX_FRAMES", "200"))
+TURN_QUEUE_POLICY = os.getenv("TURN_QUEUE_POLICY", "drop_oldest")  # or "drop_newest" when full
+BARGE_IN_TIMEOUT_SECONDS = 0.25  # Upper bound on how long interrupt_ai waits for a turn to unwind
+
+# Utterance assembly - chunked MediaRecorder audio is collected into one STT call per utterance
+UTTERANCE_ASSEMBLY = os.getenv("UTTERANCE_ASSEMBLY", "true").lower() == "true"
+UTTERANCE_GAP_MS = int(os.getenv("UTTERANCE_GAP_MS", "400"))           # No chunk for this long ends an utterance
+UTTERANCE_SILENCE_MS = int(os.getenv("UTTERANCE_SILENCE_MS", "700"))   # Trailing silence that ends one (PCM input)
+UTTERANCE_MAX_MS = int(os.getenv("UTTERANCE_MAX_MS", "15000"))
+UTTERANCE_MAX_BYTES = int(os.getenv("UTTERANCE_MAX_BYTES", str(512 * 1024)))
+UTTERANCE_MIN_BYTES = 200
+
+WEBM_EBML_MAGIC = b"\x1a\x45\xdf\xa3"
+WEBM_CLUSTER_ID = b"\x1f\x43\xb6\x75"
+
+# PCM input - opt-in with "input_audio": {"encoding": "LINEAR16", "sample_rate_hertz": 16000} (mono, little-endian)
+PCM_SAMPLE_RATES = (8000, 16000, 24000, 48000)
+PCM_FRAME_MS = 20
+PCM_SPEECH_DBFS = float(os.getenv("PCM_SPEECH_DBFS", "-45"))          # Frames quieter than this are silence
+PCM_MAX_ZCR = float(os.getenv("PCM_MAX_ZCR", "0.35"))                 # Zero crossings per sample above this sound like noise or breath
+PCM_LOUD_MARGIN_DB = float(os.getenv("PCM_LOUD_MARGIN_DB", "15"))     # Frames this far above PCM_SPEECH_DBFS pass regardless of ZCR
+PCM_MIN_SPEECH_MS = int(os.getenv("PCM_MIN_SPEECH_MS", "200"))        # Utterances with less speech than this skip STT
+PCM_TRIM_PADDING_MS = int(os.getenv("PCM_TRIM_PADDING_MS", "200"))    # Silence kept either side of the speech
+WAV_HEADER = struct.Struct("<4sI4s4sIHHIIHH4sI")
+
+# Upstream HTTP pools - one keep-alive connector per upstream (Deepgram, OpenAI)
+UPSTREAM_POOL_LIMIT = int(os.getenv("UPSTREAM_POOL_LIMIT", "32"))        # Max open connections per upstream
+UPSTREAM_POOL_PREWARM = int(os.getenv("UPSTREAM_POOL_PREWARM", "2"))     # Connections opened at startup and kept warm
+UPSTREAM_KEEPALIVE_SECONDS = 60
+UPSTREAM_KEEPWARM_INTERVAL_SECONDS = 25  # Idle pools are re-touched before keep-alives expire
+UPSTREAM_DNS_TTL_SECONDS = 300
+STT_CONNECT_TIMEOUT_SECONDS = float(os.getenv("STT_CONNECT_TIMEOUT_SECONDS", "3"))
+STT_READ_TIMEOUT_SECONDS = float(os.getenv("STT_READ_TIMEOUT_SECONDS", "30"))
+LLM_CONNECT_TIMEOUT_SECONDS = float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "3"))
+LLM_READ_TIMEOUT_SECONDS = float(os.getenv("LLM_READ_TIMEOUT_SECONDS", "20"))  # Per read, so streams may run longer
+
+# Admission control - shed load before latency collapses for everyone
+MAX_CONVERSATIONS = int(os.getenv("MAX_CONVERSATIONS", "200"))
+STT_MAX_CONCURRENCY = int(os.getenv("STT_MAX_CONCURRENCY", "32"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+UPSTREAM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("UPSTREAM_QUEUE_TIMEOUT_SECONDS", "5"))  # Calls waiting longer are shed
+ADMISSION_SHED_LOAD = 2.0  # New conversations are refused once an upstream has a full slot's worth queued
+ADMISSION_RETRY_AFTER_SECONDS = 5
+WS_CLOSE_TRY_AGAIN_LATER = 1013
+
+# Graceful drain - SIGTERM or POST /admin/drain stops new conversations, lets turns finish, then exits
+DRAIN_TIMEOUT_SECONDS = float(os.getenv("DRAIN_TIMEOUT_SECONDS", "20"))  # Keep under the orchestrator's grace period
+DRAIN_RECONNECT_DELAY_MS = int(os.getenv("DRAIN_RECONNECT_DELAY_MS", "500"))  # Jittered up to 2x so clients spread out
+DRAIN_METRICS_FILE = os.getenv("DRAIN_METRICS_FILE")  # Final /metrics snapshot, since the last scrape misses the drain
+DRAIN_CLEANUP_SECONDS = 2  # Closed sockets get this long to run their cleanup before caches are flushed
+WS_CLOSE_SERVICE_RESTART = 1012
+
+# Upstream call policy - client-side quotas per API key, retries within the turn deadline, hedged TTS
+OPENAI_REQUESTS_PER_MINUTE = int(os.getenv("OPENAI_REQUESTS_PER_MINUTE", "3500"))
+DEEPGRAM_REQUESTS_PER_MINUTE = int(os.getenv("DEEPGRAM_REQUESTS_PER_MINUTE", "1200"))
+GOOGLE_TTS_REQUESTS_PER_MINUTE = int(os.getenv("GOOGLE_TTS_REQUESTS_PER_MINUTE", "1000"))
+RATE_LIMIT_BURST_SECONDS = 2  # Bucket capacity, in seconds of quota
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "3"))
+RETRY_BASE_DELAY_SECONDS = 0.2
+RETRY_MAX_DELAY_SECONDS = 2.0
+TURN_DEADLINE_SECONDS = float(os.getenv("TURN_DEADLINE_SECONDS", "12"))
+TTS_HEDGING = os.getenv("TTS_HEDGING", "false").lower() == "true"
+HEDGE_MIN_SAMPLES = 20  # Latencies needed before the p95 hedge delay is trusted
+
+# TTS execution engine - synthesis runs off the event loop on pooled gRPC channels
+TTS_MAX_CONCURRENCY = int(os.getenv("TTS_MAX_CONCURRENCY", "8"))
+TTS_CHANNEL_POOL_SIZE = int(os.getenv("TTS_CHANNEL_POOL_SIZE", "4"))
+TTS_TIMEOUT_SECONDS = 30
+
+# Output audio - negotiated per conversation with "audio_format" in set_voice / set_context
+AUDIO_ENCODINGS = {  # encoding -> (MIME type, sample rates accepted)
+    "MP3": ("audio/mpeg", (16000, 22050, 24000, 32000, 44100, 48000)),
+    "OGG_OPUS": ("audio/ogg; codecs=opus", (8000, 12000, 16000, 24000, 48000)),
+    "LINEAR16": ("audio/wav", (8000, 16000, 22050, 24000, 44100, 48000)),
+}
+AUDIO_EFFECTS_PROFILES = frozenset({
+    "wearable-class-device", "handset-class-device", "headphone-class-device", "small-bluetooth-speaker-class-device",
+    "medium-bluetooth-speaker-class-device", "large-home-entertainment-class-device",
+    "large-automotive-class-device", "telephony-class-application",
+})
+AUDIO_FORMAT_PRESETS = {
+    "default": ("MP3", 24000, "headphone-class-device"),
+    "low_bandwidth": ("OGG_OPUS", 16000, "handset-class-device"),
+    "telephony": ("LINEAR16", 8000, "telephony-class-application"),
+}
+# Presets whose canned phrases are pre-synthesized at startup, e.g. "default,low_bandwidth"
+WARMUP_AUDIO_FORMATS = [name.strip() for name in os.getenv("WARMUP_AUDIO_FORMATS", "default").split(",") if name.strip()]
+
+# Framed audio - opt-in with "audio_framing": true; otherwise each segment is one binary message
+AUDIO_FRAME_BYTES = int(os.getenv("AUDIO_FRAME_BYTES", "8192"))  # Payload bytes per frame
+AUDIO_FRAME_HEADER = struct.Struct("!BBII")  # version, flags, turn id, sequence number (big-endian)
+AUDIO_FRAME_VERSION = 1
+AUDIO_FRAME_LAST = 0x01  # Flag on the final frame of a synthesized segment
+AUDIO_SEND_SLOW_SECONDS = 0.005  # Sends held longer than this are counted as backpressure
+AUDIO_SEND_STALL_SECONDS = float(os.getenv("AUDIO_SEND_STALL_SECONDS", "10"))  # One frame blocked this long fails the turn
+
+# Streaming turns - LLM tokens are cut into sentences and synthesized while generation continues
+STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "false").lower() == "true"
+STREAM_MIN_SENTENCE_CHARS = 20
+STREAM_TTS_LOOKAHEAD = 3
+
+# Streaming speech-to-text - one live Deepgram connection per conversation instead of a POST per chunk
+STT_STREAMING = os.getenv("STT_STREAMING", "false").lower() == "true"
+DEEPGRAM_STREAM_URL = os.getenv("DEEPGRAM_STREAM_URL", "wss://api.deepgram.com/v1/listen")
+STT_KEEPALIVE_SECONDS = 5
+
+# Metrics - Prometheus text exposition on /metrics
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+LOOP_LAG_INTERVAL_SECONDS = 0.5
+LATENCY_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.5, 5.0, 10.0, 30.0)
+
+# Tracing - per-turn spans, a turn_timing message to the client and an optional Chrome trace file
+TRACE_TIMING_MESSAGES = os.getenv("TRACE_TIMING_MESSAGES", "true").lower() == "true"
+TRACE_FILE = os.getenv("TRACE_FILE")  # Open in chrome://tracing or ui.perfetto.dev
+
+# Logging - "production" writes single-line JSON records from a background thread
+LOG_MODE = os.getenv("LOG_MODE", "development")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_SAMPLE_EVERY = int(os.getenv("LOG_SAMPLE_EVERY", "50" if LOG_MODE == "production" else "1"))
+# Transcripts, AI responses and TTS text are only logged at DEBUG in production
+CONTENT_LOG_LEVEL = logging.DEBUG if LOG_MODE == "production" else logging.INFO
+
+class JsonLogFormatter(logging.Formatter):
+    """One JSON object per line; fields passed with extra= become top-level keys"""
+    
+    RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+    
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in self.RESERVED:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class TraceContextFilter(logging.Filter):
+    """Tags records with the trace and conversation of the turn that logged them"""
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        trace = current_trace.get()
+        if trace is not None:
+            record.trace_id = trace.trace_id
+            record.conversation_id = trace.conversation_id
+        return True
+
+class SamplingFilter(logging.Filter):
+    """Passes one in every N records logged with extra={"sample": key}, counted per key"""
+    
+    def __init__(self, every: int):
+        super().__init__()
+        self.every = max(every, 1)
+        self.counts = {}
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = getattr(record, "sample", None)
+        if key is None or self.every == 1:
+            return True
+        count = self.counts.get(key, 0)
+        self.counts[key] = count + 1
+        if count % self.every:
+            return False
+        record.sample_rate = self.every
+        return True
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Queues records unformatted so message formatting happens on the listener thread"""
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+def configure_logging() -> Optional[logging.handlers.QueueListener]:
+    # Sampling sits on the root handlers so per-frame records from any logger are thinned out
+    sampling = SamplingFilter(LOG_SAMPLE_EVERY)
+    if LOG_MODE != "production":
+        logging.basicConfig(
+            level=LOG_LEVEL,
+            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+        )
+        for handler in logging.getLogger().handlers:
+            handler.addFilter(sampling)
+        return None
+    
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(JsonLogFormatter())
+    log_queue = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(TraceContextFilter())
+    queue_handler.addFilter(sampling)
+    
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    root.handlers[:] = [queue_handler]
+    listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    listener.start()
+    return listener
+
+# Setup logging
+log_listener = configure_logging()
+logger = logging.getLogger(__name__)
+
+def check_environment():
+    """Check if all required environment variables are set"""
+    required_vars = {
+        "OPENAI_API_KEY": OPENAI_API_KEY,
+        "DEEPGRAM_API_KEY": DEEPGRAM_API_KEY,
+    }
+    
+    missing_vars = []
+    for var_name, var_value in required_vars.items():
+        if not var_value:
+            missing_vars.append(var_name)
+            logger.error(f"❌ Missing environment variable: {var_name}")
+        else:
+            logger.info(f"✅ {var_name}: {'*' * (len(var_value) - 8)}{var_value[-8:]}")
+    
+    # Check Google Cloud credentials
+    if GOOGLE_TTS_ENDPOINT:
+        logger.info(f"✅ GOOGLE_TTS_ENDPOINT: {GOOGLE_TTS_ENDPOINT}")
+    elif GOOGLE_APPLICATION_CREDENTIALS and os.path.exists(GOOGLE_APPLICATION_CREDENTIALS):
+        logger.info(f"✅ GOOGLE_APPLICATION_CREDENTIALS: {GOOGLE_APPLICATION_CREDENTIALS}")
+    elif GOOGLE_APPLICATION_CREDENTIALS_JSON:
+        logger.info("✅ GOOGLE_APPLICATION_CREDENTIALS_JSON: Found JSON credentials")
+    else:
+        logger.error("❌ Missing Google Cloud credentials")
+        missing_vars.append("GOOGLE_APPLICATION_CREDENTIALS")
+    
+    if missing_vars:
+        logger.error("❌ Missing required environment variables")
+        return False
+    
+    logger.info("✅ All environment variables are set")
+    return True
+
+# Initialize FastAPI app
+app = FastAPI(title="Ultra-Sensitive Voice AI Server", version="8.0.0")
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+class Counter:
+    """Monotonic counter, optionally split by one label"""
+    
+    def __init__(self, name: str, help_text: str, label: str = None):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.values = {}
+    
+    def inc(self, amount: float = 1, label_value: str = ""):
+        self.values[label_value] = self.values.get(label_value, 0) + amount
+    
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for label_value, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_labels(self.label, label_value)} {value}")
+        return lines
+
+class Gauge:
+    """Point-in-time value, either set directly or read from a callback at scrape time"""
+    
+    def __init__(self, name: str, help_text: str, function=None):
+        self.name = name
+        self.help_text = help_text
+        self.function = function
+        self.value = 0.0
+    
+    def set(self, value: float):
+        self.value = value
+    
+    def render(self) -> list:
+        value = self.function() if self.function else self.value
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge", f"{self.name} {value}"]
+
+class Histogram:
+    """Fixed-bucket histogram, optionally split by one label
+    
+    observe() is a bisect and two additions; cumulative bucket counts are only
+    computed when the endpoint is scraped.
+    """
+    
+    def __init__(self, name: str, help_text: str, label: str = None, buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = buckets
+        self.series = {}  # label value -> [bucket counts..., +Inf count, sum]
+    
+    def observe(self, value: float, label_value: str = ""):
+        series = self.series.get(label_value)
+        if series is None:
+            series = self.series[label_value] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+    
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label_value, series in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.label, label_value, le=bound)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label, label_value)} {series[-1]}")
+            lines.append(f"{self.name}_count{_labels(self.label, label_value)} {cumulative}")
+        return lines
+
+def _labels(label: str, label_value: str, **extra) -> str:
+    pairs = [(label, label_value)] if label else []
+    pairs += [(key, value) for key, value in extra.items()]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+class VoiceMetrics:
+    """Per-stage latency histograms, upstream counters and runtime gauges"""
+    
+    def __init__(self):
+        self.stage_seconds = Histogram(
+            "voice_stage_duration_seconds", "Latency of each turn stage (stt, llm, llm_first_token, tts, audio_send, turn)", "stage"
+        )
+        self.loop_lag_seconds = Histogram(
+            "voice_event_loop_lag_seconds", "Event loop scheduling delay", buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+        )
+        self.upstream_errors = Counter("voice_upstream_errors_total", "Failed upstream calls", "upstream")
+        self.llm_tokens = Counter("voice_llm_tokens_total", "OpenAI tokens used", "kind")
+        self.response_cache = Counter("voice_response_cache_lookups_total", "LLM response cache lookups", "result")
+        self.response_cache_saved = Counter("voice_response_cache_saved_seconds_total", "LLM latency avoided by cached replies")
+        self.tts_characters = Counter("voice_tts_characters_total", "Characters sent to Google TTS", "voice")
+        self.tts_cache_hits = Counter("voice_tts_cache_hits_total", "Synthesis requests served from cache", "tier")
+        self.audio_bytes_sent = Counter("voice_audio_bytes_sent_total", "Synthesized audio bytes sent to clients", "encoding")
+        self.stt_calls_avoided = Counter("voice_stt_calls_avoided_total", "Utterances dropped before STT as non-speech", "reason")
+        self.audio_frames_sent = Counter("voice_audio_frames_sent_total", "Framed audio messages sent to clients")
+        self.audio_backpressure_seconds = Histogram(
+            "voice_audio_backpressure_seconds", "Time audio sends were held for the client socket to drain",
+            buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+        )
+        self.turns = Counter("voice_turns_total", "Completed conversation turns", "outcome")
+        self.interrupt_timeouts = Counter("voice_interrupt_timeouts_total", "Barge-ins whose cancelled tasks outlived the barge-in timeout")
+        self.prompt_tokens = Histogram(
+            "voice_llm_prompt_tokens", "Estimated prompt tokens per LLM request",
+            buckets=(250, 500, 750, 1000, 1500, 2000, 3000, 4000, 6000, 8000)
+        )
+        self.rejected_conversations = Counter("voice_rejected_conversations_total", "Conversations refused by admission control", "reason")
+        self.upstream_retries = Counter("voice_upstream_retries_total", "Upstream attempts retried after a retryable failure", "upstream")
+        self.upstream_throttled = Counter("voice_upstream_throttled_total", "429 responses from upstreams", "upstream")
+        self.rate_limit_waits = Counter("voice_rate_limit_waits_total", "Calls delayed by the client-side token bucket", "upstream")
+        self.hedges = Counter("voice_hedged_requests_total", "Hedged duplicate requests (fired, won, skipped)", "outcome")
+        self.shed_calls = Counter("voice_shed_upstream_calls_total", "Upstream calls shed after waiting too long for a slot", "upstream")
+        self.pool_wait_seconds = Histogram(
+            "voice_upstream_pool_wait_seconds", "Time requests waited for a free upstream connection", "upstream",
+            buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+        )
+        self.loop_lag = Gauge("voice_event_loop_lag_current_seconds", "Most recent event loop scheduling delay")
+        self.gauges = [self.loop_lag, Gauge("voice_inflight_tasks", "Tasks alive on the event loop", lambda: len(asyncio.all_tasks()))]
+        self.lag_task = None
+    
+    def add_gauge(self, name: str, help_text: str, function):
+        self.gauges.append(Gauge(name, help_text, function))
+    
+    def start(self):
+        if self.lag_task is None or self.lag_task.done():
+            self.lag_task = asyncio.create_task(self._measure_loop_lag())
+    
+    async def stop(self):
+        if self.lag_task:
+            self.lag_task.cancel()
+            try:
+                await self.lag_task
+            except asyncio.CancelledError:
+                pass
+    
+    async def _measure_loop_lag(self):
+        # A sleep that wakes late means something held the loop for the difference
+        while True:
+            expected = time.perf_counter() + LOOP_LAG_INTERVAL_SECONDS
+            await asyncio.sleep(LOOP_LAG_INTERVAL_SECONDS)
+            lag = max(time.perf_counter() - expected, 0.0)
+            self.loop_lag.set(lag)
+            self.loop_lag_seconds.observe(lag)
+    
+    def render(self) -> str:
+        lines = []
+        for metric in (self.stage_seconds, self.loop_lag_seconds, self.upstream_errors, self.llm_tokens,
+                       self.response_cache, self.response_cache_saved, self.stt_calls_avoided,
+                       self.tts_characters, self.tts_cache_hits, self.turns, self.interrupt_timeouts, self.rejected_conversations, self.shed_calls,
+                       self.audio_bytes_sent, self.audio_frames_sent, self.audio_backpressure_seconds,
+                       self.upstream_retries, self.upstream_throttled, self.rate_limit_waits, self.hedges, self.pool_wait_seconds, self.prompt_tokens, *self.gauges):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+metrics = VoiceMetrics()
+
+class TurnTrace:
+    """Spans recorded while handling one turn, keyed by a trace ID"""
+    
+    def __init__(self, conversation_id: str, kind: str = "turn", started: float = None):
+        self.trace_id = uuid.uuid4().hex
+        self.conversation_id = conversation_id
+        self.kind = kind
+        self.started = started if started is not None else time.perf_counter()
+        self.wall_started = time.time() - (time.perf_counter() - self.started)
+        self.ended = None
+        self.spans = []  # (name, start, end) in perf_counter seconds
+        self.prompt_tokens = None
+    
+    def add_span(self, name: str, start: float, end: float):
+        self.spans.append((name, start, end))
+    
+    def finish(self):
+        self.ended = time.perf_counter()
+    
+    def summary(self) -> dict:
+        """Compact per-stage timing for the client, summing repeated stages"""
+        stages = {}
+        for name, start, end in self.spans:
+            stages[name] = stages.get(name, 0.0) + (end - start) * 1000
+        return {
+            "type": "turn_timing",
+            "trace_id": self.trace_id,
+            "kind": self.kind,
+            "total_ms": round(((self.ended or time.perf_counter()) - self.started) * 1000, 1),
+            "stages": {name: round(ms, 1) for name, ms in stages.items()},
+            "prompt_tokens": self.prompt_tokens
+        }
+    
+    def to_chrome_events(self, pid: int) -> list:
+        """Complete ("X") events in the Chrome trace event format, one thread per conversation"""
+        tid = zlib.crc32(self.conversation_id.encode())
+        args = {"trace_id": self.trace_id, "conversation_id": self.conversation_id}
+        
+        def event(name: str, start: float, end: float) -> dict:
+            return {
+                "name": name, "cat": self.kind, "ph": "X", "pid": pid, "tid": tid,
+                "ts": round((self.wall_started + start - self.started) * 1e6),
+                "dur": round((end - start) * 1e6),
+                "args": args
+            }
+        
+        events = [event(self.kind, self.started, self.ended or time.perf_counter())]
+        events.extend(event(name, start, end) for name, start, end in self.spans)
+        return events
+
+class TraceExporter:
+    """Appends finished traces to a Chrome trace (JSON array) file off the event loop
+    
+    The format allows the closing bracket to be omitted, so events are simply
+    appended and the file stays loadable while the server is running.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self.exported = 0
+    
+    def export(self, trace: TurnTrace):
+        lines = "".join(json.dumps(event) + ",\n" for event in trace.to_chrome_events(self.pid))
+        asyncio.get_running_loop().run_in_executor(None, self._write, lines)
+    
+    def _write(self, lines: str):
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as trace_file:
+                if trace_file.tell() == 0:
+                    trace_file.write("[\n")
+                trace_file.write(lines)
+            self.exported += 1
+
+trace_exporter = TraceExporter(TRACE_FILE) if TRACE_FILE else None
+
+# The turn being handled by the current task (and the synthesis tasks it spawns)
+current_trace: ContextVar[Optional[TurnTrace]] = ContextVar("current_trace", default=None)
+turn_deadline: ContextVar[Optional[float]] = ContextVar("turn_deadline", default=None)  # perf_counter seconds
+
+def record_stage(stage: str, started: float):
+    """Record a stage that began at `started` in the metrics and on the current trace"""
+    ended = time.perf_counter()
+    metrics.stage_seconds.observe(ended - started, stage)
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add_span(stage, started, ended)
+
+class TrackedConnector(aiohttp.TCPConnector):
+    """TCPConnector that counts connections serving a request and idle keep-alive ones
+    
+    Acquisition goes through the public connect(); release is seen through the
+    connection's release callback, so no connector internals are read.
+    """
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.in_use = 0
+        self.idle_protocols = weakref.WeakSet()  # Pooled sockets; dead ones are skipped when counting
+    
+    async def connect(self, *args, **kwargs):
+        connection = await super().connect(*args, **kwargs)
+        protocol = connection.protocol
+        self.idle_protocols.discard(protocol)
+        self.in_use += 1
+        connection.add_callback(functools.partial(self._released, protocol))
+        return connection
+    
+    def _released(self, protocol):
+        self.in_use -= 1
+        if protocol is not None and not self.force_close:
+            self.idle_protocols.add(protocol)
+    
+    @property
+    def idle(self) -> int:
+        return sum(1 for protocol in list(self.idle_protocols) if protocol.is_connected())
+
+class UpstreamPool:
+    """Keep-alive HTTP connection pool for one upstream
+    
+    Each upstream gets its own connector so a slow provider cannot take the
+    sockets another stage needs. DNS answers are cached, a few connections are
+    opened at startup and re-touched while the pool is idle so the first turn
+    after a quiet period skips DNS and TLS setup, and the session's default
+    timeout carries the stage's connect and read deadlines.
+    """
+    
+    def __init__(self, name: str, url: str, timeout: aiohttp.ClientTimeout,
+                 limit: int = UPSTREAM_POOL_LIMIT, prewarm: int = UPSTREAM_POOL_PREWARM):
+        parsed = urlparse(url)
+        scheme = {"ws": "http", "wss": "https"}.get(parsed.scheme, parsed.scheme)
+        self.name = name
+        self.origin = f"{scheme}://{parsed.netloc}/"
+        self.timeout = timeout
+        self.limit = limit
+        self.prewarm = min(prewarm, limit) if limit else prewarm
+        self.session = None
+        self.keepwarm_task = None
+        self.last_request_at = 0.0
+        self.stats = {"requests": 0, "connections_created": 0, "connections_reused": 0, "queued": 0,
+                      "queue_wait_ms_max": 0.0, "timeouts": 0, "warmups": 0, "warmup_failures": 0}
+        self.trace_config = aiohttp.TraceConfig()
+        self.trace_config.on_request_start.append(self._on_request_start)
+        self.trace_config.on_request_exception.append(self._on_request_exception)
+        self.trace_config.on_connection_queued_start.append(self._on_queued_start)
+        self.trace_config.on_connection_queued_end.append(self._on_queued_end)
+        self.trace_config.on_connection_create_end.append(self._on_connection_created)
+        self.trace_config.on_connection_reuseconn.append(self._on_connection_reused)
+    
+    async def get_session(self) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            connector = TrackedConnector(
+                limit=self.limit,
+                ttl_dns_cache=UPSTREAM_DNS_TTL_SECONDS,
+                keepalive_timeout=UPSTREAM_KEEPALIVE_SECONDS
+            )
+            self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout, trace_configs=[self.trace_config])
+        return self.session
+    
+    # Trace callbacks; warm-up requests pass trace_request_ctx so they are not counted as traffic
+    async def _on_request_start(self, session, context, params):
+        if context.trace_request_ctx is None:
+            self.stats["requests"] += 1
+            self.last_request_at = time.monotonic()
+    
+    async def _on_request_exception(self, session, context, params):
+        if isinstance(params.exception, asyncio.TimeoutError):
+            self.stats["timeouts"] += 1
+    
+    async def _on_queued_start(self, session, context, params):
+        context.queued_at = time.perf_counter()
+    
+    async def _on_queued_end(self, session, context, params):
+        waited = time.perf_counter() - context.queued_at
+        self.stats["queued"] += 1
+        self.stats["queue_wait_ms_max"] = max(self.stats["queue_wait_ms_max"], round(waited * 1000, 1))
+        metrics.pool_wait_seconds.observe(waited, self.name)
+    
+    async def _on_connection_created(self, session, context, params):
+        self.stats["connections_created"] += 1
+    
+    async def _on_connection_reused(self, session, context, params):
+        self.stats["connections_reused"] += 1
+    
+    async def warm(self) -> int:
+        """Open (or refresh) `prewarm` keep-alive connections with concurrent HEAD requests"""
+        if not self.prewarm:
+            return 0
+        session = await self.get_session()
+        
+        async def touch():
+            async with session.head(self.origin, allow_redirects=False, trace_request_ctx={"warm": True},
+                                    timeout=aiohttp.ClientTimeout(total=10)) as response:
+                await response.read()
+        
+        results = await asyncio.gather(*(touch() for _ in range(self.prewarm)), return_exceptions=True)
+        failures = sum(1 for result in results if isinstance(result, Exception))
+        self.stats["warmups"] += 1
+        self.stats["warmup_failures"] += failures
+        if failures:
+            logger.warning("⚠️ %s pool warm-up: %d of %d connections failed", self.name, failures, self.prewarm)
+        return self.prewarm - failures
+    
+    def start(self):
+        if self.prewarm and (self.keepwarm_task is None or self.keepwarm_task.done()):
+            self.keepwarm_task = asyncio.create_task(self._keep_warm())
+    
+    async def _keep_warm(self):
+        await self.warm()
+        while True:
+            await asyncio.sleep(UPSTREAM_KEEPWARM_INTERVAL_SECONDS)
+            # Live traffic keeps its own connections alive
+            if time.monotonic() - self.last_request_at >= UPSTREAM_KEEPWARM_INTERVAL_SECONDS:
+                await self.warm()
+    
+    def get_stats(self) -> dict:
+        connector = self.session.connector if self.session and not self.session.closed else None
+        in_use = connector.in_use if connector else 0
+        idle = connector.idle if connector else 0
+        return {
+            "limit": self.limit or None,
+            "in_use": in_use,
+            "idle": idle,
+            "utilization": round(in_use / self.limit, 3) if self.limit else None,
+            "timeout": {"connect": self.timeout.sock_connect, "read": self.timeout.sock_read, "total": self.timeout.total},
+            **self.stats
+        }
+    
+    async def close(self):
+        if self.keepwarm_task:
+            self.keepwarm_task.cancel()
+            try:
+                await self.keepwarm_task
+            except asyncio.CancelledError:
+                pass
+        if self.session and not self.session.closed:
+            await self.session.close()
+
+class UpstreamSaturatedError(Exception):
+    """No upstream slot became free within UPSTREAM_QUEUE_TIMEOUT_SECONDS"""
+
+class UpstreamLimiter:
+    """Bounds concurrent calls to one upstream; callers that wait too long for a slot are shed"""
+    
+    def __init__(self, name: str, limit: int, queue_timeout: float = UPSTREAM_QUEUE_TIMEOUT_SECONDS):
+        self.name = name
+        self.limit = max(limit, 1)
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(self.limit)
+        self.waiting = 0
+        self.in_flight = 0
+        self.shed = 0
+    
+    @asynccontextmanager
+    async def slot(self):
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.shed += 1
+            metrics.shed_calls.inc(1, self.name)
+            raise UpstreamSaturatedError(self.name) from None
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+    
+    @property
+    def load(self) -> float:
+        """Calls running or queued per slot; above 1.0 means requests are waiting"""
+        return (self.in_flight + self.waiting) / self.limit
+    
+    def get_stats(self) -> dict:
+        return {"limit": self.limit, "in_flight": self.in_flight, "waiting": self.waiting,
+                "load": round(self.load, 3), "shed": self.shed}
+
+class AdmissionController:
+    """Caps concurrent conversations and refuses new ones while any upstream is saturated"""
+    
+    def __init__(self, max_conversations: int, limiters: dict, tts_engine=None):
+        self.max_conversations = max_conversations
+        self.limiters = limiters
+        self.tts_engine = tts_engine
+        self.active = 0  # Admitted sockets, counted before their conversation is registered
+        self.admitted = 0
+        self.rejected = {}
+        self.draining = False
+    
+    def upstream_load(self) -> dict:
+        load = {name: limiter.load for name, limiter in self.limiters.items()}
+        if self.tts_engine:
+            # in_flight includes cancelled hedge losers and barge-ins until their calls return
+            load["tts"] = (self.tts_engine.in_flight + self.tts_engine.queued) / self.tts_engine.max_concurrency
+        return load
+    
+    def rejection_reason(self) -> Optional[str]:
+        if self.draining:
+            return "draining"
+        if self.active >= self.max_conversations:
+            return "max_conversations"
+        for name, load in self.upstream_load().items():
+            if load >= ADMISSION_SHED_LOAD:
+                return f"{name}_saturated"
+        return None
+    
+    def admit(self) -> Optional[str]:
+        """Reserve a conversation slot; returns the rejection reason when there is none"""
+        reason = self.rejection_reason()
+        if reason:
+            self.rejected[reason] = self.rejected.get(reason, 0) + 1
+            metrics.rejected_conversations.inc(1, reason)
+            return reason
+        self.active += 1
+        self.admitted += 1
+        return None
+    
+    def release(self):
+        self.active -= 1
+    
+    def retry_after(self) -> float:
+        # Jittered so rejected clients do not come back in one wave
+        return round(ADMISSION_RETRY_AFTER_SECONDS * (1 + random.random()), 1)
+    
+    def get_stats(self) -> dict:
+        load = self.upstream_load()
+        reason = self.rejection_reason()
+        return {
+            "accepting": reason is None,
+            "saturation_reason": reason,
+            "conversations": self.active,
+            "max_conversations": self.max_conversations,
+            "conversation_utilization": round(self.active / self.max_conversations, 3) if self.max_conversations else None,
+            "upstream_load": {name: round(value, 3) for name, value in load.items()},
+            "upstreams": {name: limiter.get_stats() for name, limiter in self.limiters.items()},
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected)
+        }
+
+class RetryableUpstreamError(Exception):
+    """A failed attempt worth retrying: 429 or 5xx"""
+    
+    def __init__(self, upstream: str, status: int, retry_after: float = None):
+        super().__init__(f"{upstream} HTTP {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+def is_retryable_http_error(error: Exception) -> bool:
+    return isinstance(error, (RetryableUpstreamError, aiohttp.ClientConnectionError, asyncio.TimeoutError))
+
+TTS_RETRYABLE_EXCEPTIONS = (google_exceptions.ServiceUnavailable, google_exceptions.TooManyRequests,
+                            google_exceptions.ResourceExhausted, google_exceptions.DeadlineExceeded,
+                            google_exceptions.InternalServerError)
+TTS_RETRYABLE_GRPC_CODES = frozenset({"UNAVAILABLE", "RESOURCE_EXHAUSTED", "DEADLINE_EXCEEDED", "INTERNAL"})
+
+def is_retryable_tts_error(error: Exception) -> bool:
+    if isinstance(error, TTS_RETRYABLE_EXCEPTIONS):
+        return True
+    # Raw grpc.RpcError from the engine's future path
+    code = getattr(error, "code", None)
+    return callable(code) and getattr(code(), "name", None) in TTS_RETRYABLE_GRPC_CODES
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    try:
+        return max(float(value), 0.0) if value else None
+    except ValueError:  # HTTP-date form; fall back to jittered backoff
+        return None
+
+class TokenBucket:
+    """Client-side request quota for one API key: `rate` requests per second, bursts up to `capacity`"""
+    
+    def __init__(self, name: str, requests_per_minute: int, burst_seconds: float = RATE_LIMIT_BURST_SECONDS):
+        self.name = name
+        self.rate = max(requests_per_minute, 1) / 60
+        self.capacity = max(self.rate * burst_seconds, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.waits = 0
+        self.wait_seconds = 0.0
+    
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    async def acquire(self, deadline: float = None):
+        """Take a token, waiting in arrival order; shed if the wait would overrun the deadline"""
+        self._refill()
+        self.tokens -= 1  # Reserved now, so later callers queue behind this one
+        if self.tokens >= 0:
+            return
+        wait = -self.tokens / self.rate
+        if deadline is not None and time.perf_counter() + wait > deadline:
+            self.tokens += 1
+            raise UpstreamSaturatedError(self.name)
+        self.waits += 1
+        self.wait_seconds += wait
+        metrics.rate_limit_waits.inc(1, self.name)
+        try:
+            await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            self.tokens += 1
+            raise
+    
+    def pause(self, seconds: float):
+        """Honor a 429 Retry-After for every caller sharing this key"""
+        self._refill()
+        self.tokens = min(self.tokens, -seconds * self.rate)
+    
+    def get_stats(self) -> dict:
+        self._refill()
+        return {"requests_per_minute": round(self.rate * 60), "tokens": round(self.tokens, 2),
+                "waits": self.waits, "wait_seconds": round(self.wait_seconds, 3)}
+
+class LatencyWindow:
+    """Latencies of recent successful attempts, for hedge delays and retry budgeting"""
+    
+    def __init__(self, size: int = 200):
+        self.samples = deque(maxlen=size)
+        self._sorted = None
+    
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+        self._sorted = None
+    
+    def percentile(self, fraction: float) -> Optional[float]:
+        if len(self.samples) < HEDGE_MIN_SAMPLES:
+            return None
+        if self._sorted is None:
+            self._sorted = sorted(self.samples)
+        return self._sorted[min(int(len(self._sorted) * fraction), len(self._sorted) - 1)]
+
+class UpstreamCallPolicy:
+    """Rate limits, retries and optionally hedges calls to one upstream
+    
+    Every attempt takes a token from its API key's bucket. Retryable failures
+    back off with full jitter (or the server's Retry-After, which also pauses
+    the shared bucket) only while the turn deadline leaves room for another
+    attempt of typical length. Hedged calls, for idempotent requests, start a
+    duplicate once the first has run past the recent p95; the first success
+    wins and the loser is cancelled. Cancelling does not free the upstream's
+    capacity (a TTS call on the wire holds its engine slot until it returns),
+    so a hedge only fires while has_capacity() says a slot is free - a
+    duplicate that would queue behind other turns is pure extra load.
+    """
+    
+    def __init__(self, name: str, bucket: TokenBucket, is_retryable, hedge: bool = False,
+                 max_attempts: int = RETRY_MAX_ATTEMPTS, has_capacity=None):
+        self.name = name
+        self.bucket = bucket
+        self.is_retryable = is_retryable
+        self.hedge = hedge
+        self.has_capacity = has_capacity or (lambda: True)
+        self.max_attempts = max(max_attempts, 1)
+        self.latency = LatencyWindow()
+        self.stats = {"calls": 0, "retries": 0, "gave_up": 0, "hedges_fired": 0, "hedges_won": 0, "hedges_skipped": 0}
+    
+    async def call(self, attempt):
+        """Run `attempt` (a coroutine factory) under the policy"""
+        self.stats["calls"] += 1
+        deadline = turn_deadline.get()
+        for number in range(1, self.max_attempts + 1):
+            try:
+                if self.hedge:
+                    return await self._hedged(attempt, deadline)
+                return await self._timed(attempt, deadline)
+            except Exception as e:
+                if not self.is_retryable(e):
+                    raise
+                retry_after = getattr(e, "retry_after", None)
+                if retry_after:
+                    self.bucket.pause(retry_after)
+                delay = retry_after or random.uniform(0, min(RETRY_MAX_DELAY_SECONDS, RETRY_BASE_DELAY_SECONDS * 2 ** number))
+                typical = self.latency.percentile(0.5) or 0.0
+                if number == self.max_attempts or (deadline is not None and time.perf_counter() + delay + typical > deadline):
+                    self.stats["gave_up"] += 1
+                    raise
+                self.stats["retries"] += 1
+                metrics.upstream_retries.inc(1, self.name)
+                logger.warning("🔁 %s attempt %d failed (%s), retrying in %.0fms", self.name, number, e, delay * 1000)
+                await asyncio.sleep(delay)
+    
+    async def _timed(self, attempt, deadline: Optional[float]):
+        await self.bucket.acquire(deadline)
+        started = time.perf_counter()
+        result = await attempt()
+        self.latency.add(time.perf_counter() - started)
+        return result
+    
+    async def _hedged(self, attempt, deadline: Optional[float]):
+        delay = self.latency.percentile(0.95)
+        primary = asyncio.create_task(self._timed(attempt, deadline))
+        if delay is None:
+            return await primary
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done and not self.has_capacity():
+                self.stats["hedges_skipped"] += 1
+                metrics.hedges.inc(1, "skipped")
+            elif not done:
+                self.stats["hedges_fired"] += 1
+                metrics.hedges.inc(1, "fired")
+                tasks.add(asyncio.create_task(self._timed(attempt, deadline)))
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.stats["hedges_won"] += 1
+                            metrics.hedges.inc(1, "won")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    def get_stats(self) -> dict:
+        p95 = self.latency.percentile(0.95)
+        return {**self.stats, "hedging": self.hedge, "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+                "rate_limit": self.bucket.get_stats()}
+
+class TTSExecutionEngine:
+    """Runs blocking Google Cloud TTS calls on a bounded thread pool with pooled gRPC channels"""
+
+    def __init__(self, client_factory, max_concurrency: int = TTS_MAX_CONCURRENCY, pool_size: int = TTS_CHANNEL_POOL_SIZE):
+        # Every TextToSpeechClient owns its own gRPC channel
+        self.clients = [client_factory() for _ in range(max(pool_size, 1))]
+        self._client_cycle = itertools.cycle(self.clients)
+        self.max_concurrency = max(max_concurrency, 1)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="tts")
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.queued = 0
+        self.in_flight = 0
+        self.max_queue_depth = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.abandoned = 0  # Cancelled calls still on the wire; counted in in_flight until they return
+        self.total_wait_time = 0.0
+        self.total_synthesis_time = 0.0
+
+    async def synthesize(self, synthesis_input, voice, audio_config):
+        """Synthesize speech without blocking the event loop"""
+        self.queued += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queued)
+        queued_at = time.perf_counter()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queued -= 1
+
+        self.in_flight += 1
+        started_at = time.perf_counter()
+        self.total_wait_time += started_at - queued_at
+        client = next(self._client_cycle)
+        # The client's own method keeps its metadata and default retry/timeout wrappers
+        call = self.executor.submit(client.synthesize_speech, input=synthesis_input, voice=voice,
+                                    audio_config=audio_config, timeout=TTS_TIMEOUT_SECONDS)
+        try:
+            response = await asyncio.wrap_future(call)
+            self.completed += 1
+            return response
+        except asyncio.CancelledError:
+            # Barge-in: the turn moves on now, but a call already on the wire holds its
+            # thread and channel until it returns, so its slot is freed only then
+            self.cancelled += 1
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.total_synthesis_time += time.perf_counter() - started_at
+            if call.done():
+                self._release()
+            else:
+                self.abandoned += 1
+                loop = asyncio.get_running_loop()
+                call.add_done_callback(lambda _: loop.call_soon_threadsafe(self._release, True))
+
+    def _release(self, abandoned: bool = False):
+        self.in_flight -= 1
+        if abandoned:
+            self.abandoned -= 1
+        self._semaphore.release()
+
+    def has_free_slot(self) -> bool:
+        """Whether a call started now would run at once rather than queue"""
+        return self.queued == 0 and self.in_flight < self.max_concurrency
+
+    def get_stats(self) -> dict:
+        """Get TTS execution statistics"""
+        finished = max(self.completed + self.failed, 1)
+        return {
+            "channels": len(self.clients),
+            "max_concurrency": self.max_concurrency,
+            "queue_depth": self.queued,
+            "max_queue_depth": self.max_queue_depth,
+            "in_flight": self.in_flight,
+            "abandoned": self.abandoned,
+            "completed": self.completed,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "avg_queue_wait_ms": round(self.total_wait_time / finished * 1000, 2),
+            "avg_synthesis_ms": round(self.total_synthesis_time / finished * 1000, 2)
+        }
+
+    def shutdown(self):
+        """Stop worker threads and close pooled channels"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        for client in self.clients:
+            try:
+                client.transport.close()
+            except Exception:
+                pass
+
+class VoiceCache:
+    """Byte-budgeted LRU cache for synthesized audio with TTL and per-voice counters
+    
+    All operations are synchronous and O(1), so they are atomic with respect to
+    coroutines sharing the event loop.
+    """
+    
+    def __init__(self, max_bytes: int = VOICE_CACHE_MAX_BYTES, ttl_seconds: int = VOICE_CACHE_TTL_SECONDS):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()  # key -> (audio, voice, expires_at)
+        self.total_bytes = 0
+        self.voice_stats = {}
+    
+    def __len__(self) -> int:
+        return len(self.entries)
+    
+    def _count(self, voice: str, counter: str, amount: int = 1):
+        stats = self.voice_stats.get(voice)
+        if stats is None:
+            stats = self.voice_stats[voice] = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+        stats[counter] += amount
+    
+    def _remove(self, key: str):
+        audio, voice, _ = self.entries.pop(key)
+        self.total_bytes -= len(audio)
+        return voice
+    
+    def get(self, key: str, voice: str) -> Optional[bytes]:
+        """Return cached audio and mark it most recently used"""
+        entry = self.entries.get(key)
+        if entry is None:
+            self._count(voice, "misses")
+            return None
+        if entry[2] <= time.monotonic():
+            self._remove(key)
+            self._count(voice, "expirations")
+            self._count(voice, "misses")
+            return None
+        self.entries.move_to_end(key)
+        self._count(voice, "hits")
+        return entry[0]
+    
+    def put(self, key: str, voice: str, audio: bytes):
+        """Insert audio, evicting least recently used entries beyond the byte budget"""
+        if len(audio) > self.max_bytes:
+            return
+        if key in self.entries:
+            self._remove(key)
+        self.entries[key] = (audio, voice, time.monotonic() + self.ttl_seconds)
+        self.total_bytes += len(audio)
+        while self.total_bytes > self.max_bytes:
+            oldest_key = next(iter(self.entries))
+            self._count(self._remove(oldest_key), "evictions")
+    
+    def get_stats(self) -> dict:
+        """Get cache occupancy and per-voice counters"""
+        return {
+            "entries": len(self.entries),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "utilization": f"{self.total_bytes / max(self.max_bytes, 1):.2%}",
+            "ttl_seconds": self.ttl_seconds,
+            "per_voice": self.voice_stats
+        }
+
+class DiskAudioCache:
+    """Process-shared on-disk audio cache: append-only mmap'd segments indexed by SQLite
+    
+    Readers in any number of processes look entries up in the WAL-mode index and get a
+    zero-copy memoryview into the mapped segment. Writers append under an exclusive file
+    lock; compaction rewrites live entries into a fresh segment once the active one
+    outgrows the byte budget and unlinks the old ones. Every process unmaps a segment
+    once its file is gone, so the disk space is reclaimed when the last view is released.
+    """
+    
+    COMPACT_TARGET = 0.75
+    
+    def __init__(self, directory: str, max_bytes: int = TTS_DISK_CACHE_MAX_BYTES):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock_path = os.path.join(directory, "write.lock")
+        self.db_lock = threading.Lock()
+        self.db = sqlite3.connect(
+            os.path.join(directory, "index.sqlite"), timeout=10, check_same_thread=False, isolation_level=None
+        )
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, segment TEXT NOT NULL, "
+            "offset INTEGER NOT NULL, length INTEGER NOT NULL, created REAL NOT NULL)"
+        )
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.maps = {}
+        self.map_lock = threading.Lock()  # get() runs on executor threads
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.compactions = 0
+        self.indexed_entries = 0  # Index totals as of this process's last write, so get_stats never queries
+        self.indexed_bytes = 0
+        self._refresh_totals()
+    
+    @contextmanager
+    def _write_lock(self):
+        with open(self.lock_path, "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    def _query(self, sql: str, params: tuple = ()):
+        with self.db_lock:
+            return self.db.execute(sql, params).fetchall()
+    
+    def _refresh_totals(self):
+        self.indexed_entries, self.indexed_bytes = self._query(
+            "SELECT COUNT(*), COALESCE(SUM(length), 0) FROM entries")[0]
+    
+    def _active_segment(self) -> str:
+        rows = self._query("SELECT value FROM meta WHERE name = 'active_segment'")
+        return rows[0][0] if rows else "segment-0.dat"
+    
+    @staticmethod
+    def _unmap(mapped):
+        try:
+            mapped.close()
+        except BufferError:
+            pass  # Still exported to an in-flight send; freed when the view is released
+    
+    def _map(self, segment: str):
+        """(Re)map a segment so that it covers everything written so far (call with map_lock held)"""
+        try:
+            with open(os.path.join(self.directory, segment), "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            return None
+        previous = self.maps.get(segment)
+        self.maps[segment] = mapped
+        if previous is not None:
+            self._unmap(previous)
+        else:
+            # A segment this process has not seen means another worker may have compacted
+            self._unmap_removed_segments()
+        return mapped
+    
+    def _unmap_removed_segments(self):
+        """Drop mappings of segments compaction has unlinked, so their disk space can be freed"""
+        for segment in [name for name in self.maps if not os.path.exists(os.path.join(self.directory, name))]:
+            self._unmap(self.maps.pop(segment))
+    
+    def get(self, key: str) -> Optional[memoryview]:
+        """Return a zero-copy view of cached audio (blocking - run in an executor)"""
+        rows = self._query("SELECT segment, offset, length FROM entries WHERE key = ?", (key,))
+        if not rows:
+            self.misses += 1
+            return None
+        segment, offset, length = rows[0]
+        with self.map_lock:
+            mapped = self.maps.get(segment)
+            if mapped is None or len(mapped) < offset + length:
+                mapped = self._map(segment)
+            if mapped is None or len(mapped) < offset + length:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return memoryview(mapped)[offset:offset + length]
+    
+    def put(self, key: str, audio: bytes):
+        """Append audio to the active segment and index it (blocking - run in an executor)"""
+        try:
+            with self._write_lock():
+                segment = self._active_segment()
+                path = os.path.join(self.directory, segment)
+                with open(path, "ab") as f:
+                    offset = f.seek(0, os.SEEK_END)
+                    f.write(audio)
+                self._query(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                    (key, segment, offset, len(audio), time.time())
+                )
+                self.writes += 1
+                if offset + len(audio) > self.max_bytes:
+                    self._compact_locked()
+                self._refresh_totals()
+        except Exception as e:
+            logger.error(f"❌ Disk cache write failed: {e}")
+    
+    def compact(self):
+        """Rewrite live entries into a fresh segment, dropping superseded and oldest data"""
+        with self._write_lock():
+            self._compact_locked()
+    
+    def _compact_locked(self):
+        rows = self._query("SELECT key, segment, offset, length, created FROM entries ORDER BY created DESC")
+        new_segment = f"segment-{time.time_ns()}.dat"
+        budget = int(self.max_bytes * self.COMPACT_TARGET)
+        kept = []
+        written = 0
+        sources = {}
+        try:
+            with open(os.path.join(self.directory, new_segment), "wb") as out:
+                for key, segment, offset, length, created in rows:
+                    if written + length > budget:
+                        break
+                    source = sources.get(segment)
+                    if source is None:
+                        source = sources[segment] = open(os.path.join(self.directory, segment), "rb")
+                    source.seek(offset)
+                    data = source.read(length)
+                    if len(data) != length:
+                        continue
+                    kept.append((key, new_segment, out.tell(), length, created))
+                    out.write(data)
+                    written += length
+                out.flush()
+                os.fsync(out.fileno())
+        finally:
+            for source in sources.values():
+                source.close()
+        
+        with self.db_lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                self.db.execute("DELETE FROM entries")
+                self.db.executemany("INSERT INTO entries VALUES (?, ?, ?, ?, ?)", kept)
+                self.db.execute("INSERT OR REPLACE INTO meta VALUES ('active_segment', ?)", (new_segment,))
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+        
+        # Unlinked segments stay valid for views still in flight; other workers unmap theirs on next miss
+        for name in os.listdir(self.directory):
+            if name.startswith("segment-") and name != new_segment:
+                os.remove(os.path.join(self.directory, name))
+        with self.map_lock:
+            self._unmap_removed_segments()
+        self._refresh_totals()
+        self.compactions += 1
+        logger.info(f"🗜️ Disk cache compacted: kept {len(kept)}/{len(rows)} entries, {written} bytes")
+    
+    def get_stats(self) -> dict:
+        """Get disk cache statistics (index totals are refreshed by writes, off the event loop)"""
+        return {
+            "directory": self.directory,
+            "entries": self.indexed_entries,
+            "live_bytes": self.indexed_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "compactions": self.compactions
+        }
+    
+    def close(self):
+        """Release mappings and the index connection"""
+        with self.map_lock:
+            for mapped in self.maps.values():
+                self._unmap(mapped)
+            self.maps.clear()
+        with self.db_lock:
+            self.db.close()
+
+class SSMLBuilder:
+    """Single-pass SSML generation from vocabularies compiled once
+    
+    Sentence text is XML-escaped and every tag is opened and closed in the same step,
+    so the markup is well-formed by construction. Results are memoized per
+    (text, emotion) unless randomized breathing pauses are enabled.
+    """
+    
+    # Checked in priority order; keywords match anywhere in the text
+    EMOTION_KEYWORDS = (
+        ("excited", ('amazing', 'fantastic', 'incredible', 'wow', 'excellent', 'brilliant')),
+        ("encouraging", ('great job', 'well done', 'perfect', 'exactly', 'good work')),
+        ("thoughtful", ('let me explain', 'consider this', 'think about', 'understand')),
+        ("enthusiastic", ('let\'s explore', 'discover', 'learn about', 'dive into')),
+    )
+    EMPHASIS_WORDS = {
+        'strong': ('important', 'crucial', 'essential', 'key', 'vital', 'critical'),
+        'moderate': ('remember', 'note', 'notice', 'observe', 'consider', 'understand')
+    }
+    # Sentences are split on their punctuation, so every gap gets the same pause
+    SENTENCE_BREAK = '<break time="0.3s"/>'
+    
+    def __init__(self, emotional_states: dict, cache_size: int = SSML_CACHE_SIZE):
+        self.emotional_states = emotional_states
+        self.emotion_patterns = [
+            (emotion, re.compile("|".join(map(re.escape, keywords)))) for emotion, keywords in self.EMOTION_KEYWORDS
+        ]
+        
+        self.emphasis_tags = {}
+        for level, words in self.EMPHASIS_WORDS.items():
+            for word in words:
+                self.emphasis_tags.setdefault(word, f'<emphasis level="{level}">')
+        self.emphasis_pattern = re.compile(r"\b(" + "|".join(map(re.escape, self.emphasis_tags)) + r")\b", re.IGNORECASE)
+        self.sentence_pattern = re.compile(r"[^.!?]+")
+        
+        self.prosody_tags = {
+            name: f'<speak><prosody rate="{emotion["rate"]}" pitch="{emotion["pitch"]}" volume="{emotion["volume"]}">'
+            for name, emotion in emotional_states.items()
+        }
+        self._cached_build = functools.lru_cache(maxsize=cache_size)(self._build)
+        self.classify = functools.lru_cache(maxsize=cache_size)(self._classify)
+    
+    def _classify(self, text: str) -> str:
+        """Pick the emotional tone for a response from its wording"""
+        text_lower = text.lower()
+        for emotion, pattern in self.emotion_patterns:
+            if pattern.search(text_lower):
+                return emotion
+        return "explanatory"
+    
+    def build(self, text: str, emotional_state: str = "explanatory") -> str:
+        """SSML for the text, or the stripped text when it is too short to mark up"""
+        if USE_BREATHING_PAUSES:
+            return self._build(text, emotional_state)
+        return self._cached_build(text, emotional_state)
+    
+    def _emphasize(self, match) -> str:
+        word = match.group(1)
+        return self.emphasis_tags[word.lower()] + word + "</emphasis>"
+    
+    def _build(self, text: str, emotional_state: str) -> str:
+        if not ENABLE_ADVANCED_SSML:
+            return text
+        
+        enhanced = text.strip()
+        if len(enhanced) < 5:
+            return enhanced
+        
+        sentences = [sentence.strip() for sentence in self.sentence_pattern.findall(enhanced)]
+        sentences = [sentence for sentence in sentences if sentence]
+        if not sentences:
+            return enhanced
+        
+        total = len(sentences)
+        parts = [self.prosody_tags.get(emotional_state, self.prosody_tags["explanatory"])]
+        for i, sentence in enumerate(sentences):
+            if USE_BREATHING_PAUSES and i > 0 and len(sentence) > 30:
+                parts.append(f'<break time="{random.choice(["0.4s", "0.5s", "0.6s"])}"/>')
+            
+            marked = self.emphasis_pattern.sub(self._emphasize, xml_escape(sentence))
+            
+            if USE_SPEECH_PATTERNS and total > 1:
+                if i == 0:
+                    marked = f'<prosody pitch="+1st">{marked}</prosody>'
+                elif i == total - 1:
+                    marked = f'<prosody rate="0.95">{marked}</prosody>'
+                elif total > 2 and i % 2 == 1:
+                    marked = f'<prosody pitch="+0.5st">{marked}</prosody>'
+            parts.append(marked)
+            
+            if i < total - 1:
+                parts.append(self.SENTENCE_BREAK)
+        
+        parts.append('</prosody></speak>')
+        return ''.join(parts)
+    
+    def get_stats(self) -> dict:
+        info = self._cached_build.cache_info()
+        return {
+            "hits": info.hits,
+            "misses": info.misses,
+            "size": info.currsize,
+            "max_size": info.maxsize,
+            "hit_rate": f"{info.hits / max(info.hits + info.misses, 1):.2%}"
+        }
+
+class AudioFormat:
+    """Encoding, sample rate and effects profile of a conversation's synthesized audio"""
+    
+    __slots__ = ("encoding", "sample_rate_hertz", "effects_profile")
+    
+    def __init__(self, encoding: str, sample_rate_hertz: int, effects_profile: Optional[str]):
+        self.encoding = encoding
+        self.sample_rate_hertz = sample_rate_hertz
+        self.effects_profile = effects_profile
+    
+    @classmethod
+    def preset(cls, name: str) -> "AudioFormat":
+        return cls(*AUDIO_FORMAT_PRESETS[name])
+    
+    @classmethod
+    def negotiate(cls, requested, current: "AudioFormat" = None) -> tuple:
+        """Resolve a client request (preset name or partial dict) to a supported format plus adjustment notes"""
+        adjusted = []
+        base = current or cls.preset("default")
+        if isinstance(requested, str):
+            requested = {"preset": requested}
+        if not isinstance(requested, dict):
+            return base, [f"unsupported audio_format {requested!r}"]
+        
+        preset = requested.get("preset")
+        if preset is not None:
+            if preset in AUDIO_FORMAT_PRESETS:
+                base = cls.preset(preset)
+            else:
+                adjusted.append(f"unknown preset {preset!r}")
+        
+        encoding = str(requested.get("encoding", base.encoding)).upper()
+        if encoding not in AUDIO_ENCODINGS:
+            adjusted.append(f"unsupported encoding {encoding!r}")
+            encoding = base.encoding
+        
+        supported_rates = AUDIO_ENCODINGS[encoding][1]
+        try:
+            sample_rate = int(requested.get("sample_rate_hertz", base.sample_rate_hertz))
+        except (TypeError, ValueError):
+            adjusted.append("invalid sample_rate_hertz")
+            sample_rate = base.sample_rate_hertz
+        if sample_rate not in supported_rates:
+            nearest = min(supported_rates, key=lambda rate: abs(rate - sample_rate))
+            adjusted.append(f"{encoding} does not support {sample_rate} Hz, using {nearest}")
+            sample_rate = nearest
+        
+        effects_profile = requested.get("effects_profile", base.effects_profile) or None
+        if effects_profile is not None and effects_profile not in AUDIO_EFFECTS_PROFILES:
+            adjusted.append(f"unknown effects_profile {effects_profile!r}")
+            effects_profile = base.effects_profile
+        
+        return cls(encoding, sample_rate, effects_profile), adjusted
+    
+    @property
+    def mime_type(self) -> str:
+        return AUDIO_ENCODINGS[self.encoding][0]
+    
+    @property
+    def cache_suffix(self) -> str:
+        """Appended to audio cache keys; empty for the default format so existing entries stay valid"""
+        if self == DEFAULT_AUDIO_FORMAT:
+            return ""
+        return f":{self.encoding}:{self.sample_rate_hertz}:{self.effects_profile or 'none'}"
+    
+    def audio_config(self):
+        return texttospeech.AudioConfig(
+            audio_encoding=getattr(texttospeech.AudioEncoding, self.encoding),
+            speaking_rate=0.92,  # Slightly slower for clarity
+            pitch=1.5,           # Optimal pitch for engagement
+            volume_gain_db=6.0,  # Good volume boost
+            sample_rate_hertz=self.sample_rate_hertz,
+            effects_profile_id=[self.effects_profile] if self.effects_profile else []
+        )
+    
+    def to_dict(self) -> dict:
+        return {"encoding": self.encoding, "sample_rate_hertz": self.sample_rate_hertz,
+                "effects_profile": self.effects_profile}
+    
+    def _key(self) -> tuple:
+        return (self.encoding, self.sample_rate_hertz, self.effects_profile)
+    
+    def __eq__(self, other) -> bool:
+        return isinstance(other, AudioFormat) and self._key() == other._key()
+    
+    def __hash__(self) -> int:
+        return hash(self._key())
+    
+    def __repr__(self) -> str:
+        return f"AudioFormat({self.encoding}, {self.sample_rate_hertz}, {self.effects_profile})"
+
+DEFAULT_AUDIO_FORMAT = AudioFormat.preset("default")
+
+def frame_audio(audio: bytes, turn_id: int, first_seq: int, frame_bytes: int = AUDIO_FRAME_BYTES):
+    """Cut one segment into header-prefixed frames; the last one carries AUDIO_FRAME_LAST"""
+    view = memoryview(audio)
+    total = len(view)
+    seq = first_seq
+    for offset in range(0, max(total, 1), frame_bytes):
+        flags = AUDIO_FRAME_LAST if offset + frame_bytes >= total else 0
+        yield AUDIO_FRAME_HEADER.pack(AUDIO_FRAME_VERSION, flags, turn_id, seq & 0xFFFFFFFF) + view[offset:offset + frame_bytes]
+        seq += 1
+
+class TokenCounter:
+    """Counts chat message tokens with tiktoken when installed, otherwise ~4 characters per token"""
+    
+    MESSAGE_OVERHEAD = 4  # Role and separators per message
+    REPLY_PRIMING = 3
+    
+    def __init__(self, model: str):
+        self.encoding = None
+        if tiktoken is not None:
+            try:
+                self.encoding = tiktoken.encoding_for_model(model)
+            except Exception:
+                self.encoding = tiktoken.get_encoding("cl100k_base")
+        self.method = "tiktoken" if self.encoding else "estimate"
+    
+    def count(self, text: str) -> int:
+        if self.encoding:
+            return len(self.encoding.encode(text))
+        return (len(text) + 3) // 4
+    
+    def count_message(self, content: str) -> int:
+        return self.count(content) + self.MESSAGE_OVERHEAD
+
+class PromptStore:
+    """Content-addressed, reference-counted store for system prompts and unit content
+    
+    Students on the same unit share one copy of the unit text and of the
+    system prompt built from it. acquire() returns the stored string, so
+    callers hold a reference to the shared object instead of their own
+    copy; the entry is dropped when its last conversation releases it.
+    """
+    
+    def __init__(self):
+        self.entries = {}  # digest -> [text, references, token count or None]
+        self.acquires = 0
+        self.hits = 0
+    
+    @staticmethod
+    def digest(text: str) -> str:
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+    
+    def acquire(self, text: str) -> tuple:
+        """Store (or reference) text, returning (key, shared text)"""
+        key = self.digest(text)
+        entry = self.entries.get(key)
+        self.acquires += 1
+        if entry is None:
+            entry = self.entries[key] = [text, 0, None]
+        else:
+            self.hits += 1
+        entry[1] += 1
+        return key, entry[0]
+    
+    def get(self, key: str) -> str:
+        return self.entries[key][0]
+    
+    def find(self, key: str) -> Optional[str]:
+        entry = self.entries.get(key)
+        return entry[0] if entry else None
+    
+    def token_count(self, key: str, counter: TokenCounter) -> int:
+        entry = self.entries[key]
+        if entry[2] is None:
+            entry[2] = counter.count_message(entry[0])
+        return entry[2]
+    
+    def release(self, key: str):
+        entry = self.entries.get(key)
+        if entry is not None:
+            entry[1] -= 1
+            if entry[1] <= 0:
+                del self.entries[key]
+    
+    def get_stats(self) -> dict:
+        stored = sum(len(text) for text, _, _ in self.entries.values())
+        referenced = sum(len(text) * references for text, references, _ in self.entries.values())
+        return {
+            "entries": len(self.entries),
+            "references": sum(references for _, references, _ in self.entries.values()),
+            "stored_chars": stored,
+            "deduplicated_chars": referenced - stored,
+            "hit_rate": round(self.hits / self.acquires, 3) if self.acquires else 0.0
+        }
+
+class ChatMessage:
+    """One history message; turned into an OpenAI dict only when a request is built"""
+    
+    __slots__ = ("role", "content", "tokens")
+    
+    def __init__(self, role: str, content: str, tokens: int):
+        self.role = role
+        self.content = content
+        self.tokens = tokens
+    
+    def to_dict(self) -> dict:
+        return {"role": self.role, "content": self.content}
+
+class ConversationContext:
+    """LLM context for one conversation, bounded in tokens rather than messages
+    
+    The system prompt is pinned and never evicted. Recent messages are kept
+    verbatim until they exceed the history budget (or MAX_CONTEXT_MESSAGES),
+    then the oldest are folded into a running summary: one short line per
+    message, oldest lines dropped once the summary reaches its own cap. Token
+    counts are computed once per message, so the per-turn cost is a sum.
+    
+    The system prompt lives in the shared PromptStore; history is kept as
+    ChatMessage records. Call close() to release the prompt reference.
+    """
+    
+    SUMMARY_HEADER = "Summary of the earlier conversation:"
+    SUMMARY_LINE_CHARS = 160
+    SUMMARY_MIN_SENTENCE_CHARS = 25
+    SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+    
+    def __init__(self, system_prompt: str, counter: TokenCounter, store: PromptStore,
+                 budget: int = CONTEXT_HISTORY_TOKEN_BUDGET, summary_max_tokens: int = CONTEXT_SUMMARY_MAX_TOKENS):
+        self.counter = counter
+        self.store = store
+        self.budget = budget
+        self.summary_max_tokens = summary_max_tokens
+        self.system_key, _ = store.acquire(system_prompt)
+        self.system_tokens = store.token_count(self.system_key, counter)
+        self.messages = deque()  # Recent ChatMessage records, verbatim
+        self.history_tokens = 0
+        self.summary_lines = deque()   # (line, tokens)
+        self.summary_tokens = 0
+        self.folded_messages = 0
+        self.last_prompt_tokens = 0
+    
+    def __len__(self) -> int:
+        return 1 + bool(self.summary_lines) + len(self.messages)
+    
+    def __iter__(self):
+        return iter(self.to_messages())
+    
+    def append(self, role: str, content: str):
+        message = ChatMessage(role, content, self.counter.count_message(content))
+        self.messages.append(message)
+        self.history_tokens += message.tokens
+        self._fold()
+    
+    def _fold(self):
+        while len(self.messages) > CONTEXT_MIN_RECENT_MESSAGES and (
+                self.history_tokens + self.summary_tokens > self.budget or len(self.messages) > MAX_CONTEXT_MESSAGES):
+            message = self.messages.popleft()
+            self.history_tokens -= message.tokens
+            self._summarize(message)
+            self.folded_messages += 1
+    
+    def _summarize(self, message: ChatMessage):
+        speaker = "Student" if message.role == "user" else "Tutor"
+        text = message.content.replace("[User interrupted] ", "").strip()
+        # First sentence with substance; tutor replies tend to open with "Great question!"
+        sentences = self.SENTENCE_END.split(text, 3)
+        gist = next((sentence for sentence in sentences if len(sentence) >= self.SUMMARY_MIN_SENTENCE_CHARS), sentences[0])
+        if len(gist) > self.SUMMARY_LINE_CHARS:
+            gist = gist[:self.SUMMARY_LINE_CHARS].rsplit(" ", 1)[0] + "..."
+        line = f"- {speaker}: {gist}"
+        tokens = self.counter.count(line) + 1
+        self.summary_lines.append((line, tokens))
+        self.summary_tokens += tokens
+        while self.summary_tokens > self.summary_max_tokens and len(self.summary_lines) > 1:
+            self.summary_tokens -= self.summary_lines.popleft()[1]
+    
+    def summary_message(self) -> Optional[dict]:
+        if not self.summary_lines:
+            return None
+        lines = "\n".join(line for line, _ in self.summary_lines)
+        return {"role": "system", "content": f"{self.SUMMARY_HEADER}\n{lines}"}
+    
+    def to_messages(self) -> list:
+        """OpenAI chat messages: pinned system prompt, summary if any, recent turns"""
+        summary = self.summary_message()
+        system = {"role": "system", "content": self.store.get(self.system_key)}
+        return [system, *([summary] if summary else []), *(message.to_dict() for message in self.messages)]
+    
+    def prompt_tokens(self) -> int:
+        """Prompt size of a request built from this context"""
+        header = self.counter.count(self.SUMMARY_HEADER) + TokenCounter.MESSAGE_OVERHEAD if self.summary_lines else 0
+        self.last_prompt_tokens = (self.system_tokens + header + self.summary_tokens + self.history_tokens
+                                   + TokenCounter.REPLY_PRIMING)
+        return self.last_prompt_tokens
+    
+    def to_state(self) -> dict:
+        """Persistable form; the system prompt is referenced by its PromptStore key, not copied"""
+        return {
+            "system_key": self.system_key,
+            "summary": [line for line, _ in self.summary_lines],
+            "messages": [message.to_dict() for message in self.messages],
+            "folded_messages": self.folded_messages
+        }
+    
+    def close(self):
+        """Release the shared system prompt"""
+        if self.system_key is not None:
+            self.store.release(self.system_key)
+            self.system_key = None
+    
+    @classmethod
+    def from_state(cls, state: dict, counter: TokenCounter, store: PromptStore) -> "ConversationContext":
+        """Rebuild from to_state() once state["system"] holds the text behind state["system_key"]"""
+        context = cls(state["system"], counter, store)
+        for line in state.get("summary", []):
+            tokens = counter.count(line) + 1
+            context.summary_lines.append((line, tokens))
+            context.summary_tokens += tokens
+        context.folded_messages = state.get("folded_messages", 0)
+        for message in state.get("messages", []):
+            context.append(message["role"], message["content"])
+        return context
+    
+    @classmethod
+    def from_messages(cls, messages: list, counter: TokenCounter, store: PromptStore) -> "ConversationContext":
+        """Rebuild from a plain message list, as persisted before token budgets"""
+        context = cls(messages[0]["content"], counter, store)
+        for message in messages[1:]:
+            context.append(message["role"], message["content"])
+        return context
+
+class CachedResponse:
+    __slots__ = ("response", "shingles", "keywords", "conversation_id", "created", "latency", "hits")
+    
+    def __init__(self, response: str, shingles: frozenset, keywords: frozenset, conversation_id: Optional[str],
+                 latency: float):
+        self.response = response
+        self.shingles = shingles
+        self.keywords = keywords
+        self.conversation_id = conversation_id
+        self.created = time.monotonic()
+        self.latency = latency
+        self.hits = 0
+
+class ResponseCache:
+    """Cross-conversation cache of LLM replies, keyed by (unit scope, normalized question)
+    
+    Utterances are lowercased, de-punctuated, contraction-expanded and
+    stripped of disfluencies ("um", "uh"). Canned replies also ignore fillers,
+    so "hello!!", "hi there" and "thank you so much" hit them. Answers from
+    the LLM are shared between students on the same unit (the scope is the
+    system prompt's PromptStore key), but only on an exact match of every
+    remaining word: "how much does a whale weigh" is not "how does a whale
+    weigh". Within the conversation that asked, a rephrasing also matches by
+    Jaccard similarity over words plus word pairs, ignoring fillers, as long
+    as it uses the same keywords - numbers, negations and content words
+    alike - so "why is the sky not blue" never gets the answer to "why is the
+    sky blue". Questions that lean on the conversation ("explain that again",
+    "is my answer right") are never cached or served, and ones about either
+    speaker ("what should I revise") are only served to the student who asked.
+    """
+    
+    WORD = re.compile(r"[a-z0-9']+")
+    CONTRACTIONS = {"what's": "what is", "whats": "what is", "how's": "how is", "where's": "where is",
+                    "who's": "who is", "it's": "it is", "that's": "that is", "i'm": "i am", "don't": "do not",
+                    "doesn't": "does not", "can't": "cannot", "isn't": "is not", "aren't": "are not",
+                    "won't": "will not", "shan't": "shall not"}
+    DISFLUENCIES = frozenset({"um", "uh", "er", "erm", "hmm", "mm"})
+    FILLER_WORDS = frozenset({"so", "well", "oh", "okay", "ok", "like", "just", "please", "really", "very", "much",
+                              "there", "hey", "you", "a", "an", "the"})  # Ignored by canned and similarity matching only
+    FUNCTION_WORDS = frozenset({"is", "are", "was", "were", "be", "am", "do", "does", "did", "i", "me", "my", "we",
+                                "of", "to", "in", "on", "at", "for", "from", "by", "with", "about", "during", "and",
+                                "tell", "explain", "know", "can", "could", "would", "will"})  # Rephrasings may differ here
+    FOLLOW_UP_WORDS = frozenset({"that", "it", "this", "those", "these", "they", "them", "again", "more", "else",
+                                 "he", "she", "previous", "last", "before", "earlier", "repeat", "say", "said",
+                                 "saying", "mean", "meant", "example", "examples", "answer", "answers", "understand",
+                                 "understood", "confused", "wrong", "right", "correct", "slower", "louder"})
+    PERSONAL_WORDS = frozenset({"i", "my", "mine", "myself", "your", "yours", "yourself"})
+    
+    def __init__(self, canned: dict, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+                 ttl_seconds: int = RESPONSE_CACHE_TTL_SECONDS, similarity: float = RESPONSE_CACHE_SIMILARITY):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity = similarity
+        self.canned = {" ".join(self.content(self.normalize(question))): response for question, response in canned.items()}
+        self.entries = OrderedDict()  # (scope, normalized, owner) -> CachedResponse, least recently used first
+        self.index = {}               # scope -> shingle -> keys containing it
+        self.llm_calls = 0
+        self.llm_seconds = 0.0
+        self.stats = {"lookups": 0, "canned_hits": 0, "exact_hits": 0, "fuzzy_hits": 0, "misses": 0,
+                      "uncacheable": 0, "stored": 0, "evictions": 0, "expirations": 0, "seconds_saved": 0.0}
+    
+    def normalize(self, text: str) -> list:
+        """Words of the utterance that the cache key keeps"""
+        words = []
+        for word in self.WORD.findall(text.lower()):
+            if word not in self.CONTRACTIONS and word.endswith("n't"):
+                word = word[:-3] + " not"
+            words.extend(self.CONTRACTIONS.get(word, word).split())
+        return [word for word in words if word not in self.DISFLUENCIES]
+    
+    def content(self, words: list) -> list:
+        """Words that count when matching canned replies and rephrasings"""
+        return [word for word in words if word not in self.FILLER_WORDS] or words
+    
+    @staticmethod
+    def shingles(words: list) -> frozenset:
+        return frozenset(words) | frozenset(zip(words, words[1:]))
+    
+    def keywords(self, words: list) -> frozenset:
+        """Words a rephrasing must keep for the answer to still apply"""
+        return frozenset(words) - self.FUNCTION_WORDS
+    
+    def _cacheable(self, words: list) -> bool:
+        return len(self.content(words)) >= RESPONSE_CACHE_MIN_WORDS and not self.FOLLOW_UP_WORDS.intersection(words)
+    
+    def _key(self, scope: Optional[str], words: list, conversation_id: Optional[str]) -> tuple:
+        """Questions about either speaker are kept apart per conversation"""
+        owner = conversation_id if self.PERSONAL_WORDS.intersection(words) else None
+        return scope, " ".join(words), owner
+    
+    def record_llm_latency(self, seconds: float):
+        self.llm_calls += 1
+        self.llm_seconds += seconds
+    
+    def _hit(self, kind: str, saved: float) -> None:
+        self.stats[kind] += 1
+        self.stats["seconds_saved"] += saved
+        metrics.response_cache.inc(1, kind[:-5])
+        metrics.response_cache_saved.inc(saved)
+    
+    def lookup(self, scope: Optional[str], text: str, conversation_id: Optional[str] = None) -> Optional[str]:
+        self.stats["lookups"] += 1
+        words = self.normalize(text)
+        content = self.content(words)
+        average_llm = self.llm_seconds / self.llm_calls if self.llm_calls else 0.0
+        canned = self.canned.get(" ".join(content))
+        if canned is not None:
+            self._hit("canned_hits", average_llm)
+            return canned
+        if not self._cacheable(words):
+            self.stats["uncacheable"] += 1
+            metrics.response_cache.inc(1, "uncacheable")
+            return None
+        
+        entry = self._get(self._key(scope, words, conversation_id))
+        kind = "exact_hits"
+        if entry is None:
+            entry = self._nearest(scope, content, conversation_id)
+            kind = "fuzzy_hits"
+        if entry is None:
+            self.stats["misses"] += 1
+            metrics.response_cache.inc(1, "miss")
+            return None
+        entry.hits += 1
+        self._hit(kind, entry.latency)
+        return entry.response
+    
+    def _get(self, key: tuple) -> Optional[CachedResponse]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry.created > self.ttl_seconds:
+            self._remove(key)
+            self.stats["expirations"] += 1
+            return None
+        self.entries.move_to_end(key)
+        return entry
+    
+    def _nearest(self, scope: Optional[str], words: list, conversation_id: Optional[str]) -> Optional[CachedResponse]:
+        """Closest answer this conversation already got; other students' answers only match exactly"""
+        scope_index = self.index.get(scope)
+        if not scope_index or conversation_id is None:
+            return None
+        shingles = self.shingles(words)
+        keywords = self.keywords(words)
+        overlaps = {}
+        for shingle in shingles:
+            for key in scope_index.get(shingle, ()):
+                overlaps[key] = overlaps.get(key, 0) + 1
+        best_key, best_score = None, self.similarity
+        for key, overlap in overlaps.items():
+            entry = self.entries[key]
+            score = overlap / (len(shingles) + len(entry.shingles) - overlap)
+            if score >= best_score and entry.conversation_id == conversation_id and entry.keywords == keywords:
+                best_key, best_score = key, score
+        return self._get(best_key) if best_key else None
+    
+    def store(self, scope: Optional[str], text: str, response: str, latency: float,
+              conversation_id: Optional[str] = None):
+        words = self.normalize(text)
+        content = self.content(words)
+        if " ".join(content) in self.canned or not self._cacheable(words) or not response:
+            return
+        key = self._key(scope, words, conversation_id)
+        if key in self.entries:
+            self._remove(key)
+        entry = CachedResponse(response, self.shingles(content), self.keywords(content), conversation_id, latency)
+        self.entries[key] = entry
+        scope_index = self.index.setdefault(scope, {})
+        for shingle in entry.shingles:
+            scope_index.setdefault(shingle, set()).add(key)
+        self.stats["stored"] += 1
+        while len(self.entries) > self.max_entries:
+            self._remove(next(iter(self.entries)))
+            self.stats["evictions"] += 1
+    
+    def _remove(self, key: tuple):
+        entry = self.entries.pop(key)
+        scope_index = self.index[key[0]]
+        for shingle in entry.shingles:
+            keys = scope_index[shingle]
+            keys.discard(key)
+            if not keys:
+                del scope_index[shingle]
+        if not scope_index:
+            del self.index[key[0]]
+    
+    def get_stats(self) -> dict:
+        hits = self.stats["canned_hits"] + self.stats["exact_hits"] + self.stats["fuzzy_hits"]
+        return {
+            **self.stats,
+            "seconds_saved": round(self.stats["seconds_saved"], 2),
+            "entries": len(self.entries),
+            "hit_rate": round(hits / self.stats["lookups"], 3) if self.stats["lookups"] else 0.0
+        }
 
-# Load environment variables
-load_dotenv()
+class SentenceSegmenter:
+    """Cuts a streamed token sequence into speakable sentences"""
 
-# Configuration
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-DEEPGRAM_API_KEY = os.getenv("DEEPGRAM_API_KEY")
-GOOGLE_APPLICATION_CREDENTIALS = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
-GOOGLE_APPLICATION_CREDENTIALS_JSON = os.getenv("GOOGLE_APPLICATION_CREDENTIALS_JSON")
+    BOUNDARY = re.compile(r'(?<=[.!?])\s+')
 
-# Ultra Sensitive Settings - Maximum responsiveness
-USE_GPT_3_5 = True
-MAX_CONTEXT_MESSAGES = 10
-MAX_RESPONSE_TOKENS = 200
-USE_VOICE_CACHE = True
-ENABLE_ADVANCED_SSML = True
-USE_EMOTIONAL_VARIANCE = True
-USE_BREATHING_PAUSES = False
-USE_SPEECH_PATTERNS = True
+    def __init__(self, min_chars: int = STREAM_MIN_SENTENCE_CHARS):
+        self.min_chars = min_chars
+        self.buffer = ""
 
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
+    def feed(self, delta: str) -> list:
+        """Add a token delta and return any sentences completed by it"""
+        self.buffer += delta
+        sentences = []
+        start = 0
+        for match in self.BOUNDARY.finditer(self.buffer):
+            # Merge very short sentences ("Great!") into the next one
+            if match.start() - start >= self.min_chars:
+                sentences.append(self.buffer[start:match.start()].strip())
+                start = match.end()
+        self.buffer = self.buffer[start:]
+        return sentences
 
-def check_environment():
-    """Check if all required environment variables are set"""
-    required_vars = {
-        "OPENAI_API_KEY": OPENAI_API_KEY,
-        "DEEPGRAM_API_KEY": DEEPGRAM_API_KEY,
-    }
+    def flush(self) -> str:
+        """Return whatever text remains at the end of the stream"""
+        remainder = self.buffer.strip()
+        self.buffer = ""
+        return remainder
+
+def split_webm_header(chunk: bytes):
+    """Split a chunk that starts a WebM stream into (container header, cluster data)"""
+    if not chunk.startswith(WEBM_EBML_MAGIC):
+        return b"", chunk
+    cluster_start = chunk.find(WEBM_CLUSTER_ID)
+    if cluster_start < 0:
+        return chunk, b""
+    return chunk[:cluster_start], chunk[cluster_start:]
+
+def group_webm_recordings(utterances: list) -> list:
+    """One payload per recording: chunks without a container header continue the one before
     
-    missing_vars = []
-    for var_name, var_value in required_vars.items():
-        if not var_value:
-            missing_vars.append(var_name)
-            logger.error(f"❌ Missing environment variable: {var_name}")
+    Utterances that start with their own EBML header are never spliced together, since
+    clusters from a separate recording restart their timecodes.
+    """
+    recordings = []
+    for utterance in utterances:
+        if recordings and not utterance.startswith(WEBM_EBML_MAGIC):
+            recordings[-1] += utterance
         else:
-            logger.info(f"✅ {var_name}: {'*' * (len(var_value) - 8)}{var_value[-8:]}")
+            recordings.append(utterance)
+    return recordings
+
+def pcm_to_wav(pcm: bytes, sample_rate: int) -> bytes:
+    """Wrap 16-bit mono PCM in a WAV header so STT can read the format from the payload"""
+    return WAV_HEADER.pack(b"RIFF", 36 + len(pcm), b"WAVE", b"fmt ", 16, 1, 1, sample_rate, sample_rate * 2, 2, 16,
+                           b"data", len(pcm)) + pcm
+
+def merge_utterances(utterances: list) -> list:
+    """STT payloads for queued utterances: WAV (PCM input mode) joins into one, WebM one per recording"""
+    if len(utterances) > 1 and utterances[0].startswith(b"RIFF"):
+        sample_rate = WAV_HEADER.unpack_from(utterances[0])[7]
+        return [pcm_to_wav(b"".join(utterance[WAV_HEADER.size:] for utterance in utterances), sample_rate)]
+    return group_webm_recordings(utterances)
+
+class SpeechGate:
+    """Energy and zero-crossing speech detection over 16-bit mono PCM, vectorized with NumPy
     
-    # Check Google Cloud credentials
-    if GOOGLE_APPLICATION_CREDENTIALS and os.path.exists(GOOGLE_APPLICATION_CREDENTIALS):
-        logger.info(f"✅ GOOGLE_APPLICATION_CREDENTIALS: {GOOGLE_APPLICATION_CREDENTIALS}")
-    elif GOOGLE_APPLICATION_CREDENTIALS_JSON:
-        logger.info("✅ GOOGLE_APPLICATION_CREDENTIALS_JSON: Found JSON credentials")
-    else:
-        logger.error("❌ Missing Google Cloud credentials")
-        missing_vars.append("GOOGLE_APPLICATION_CREDENTIALS")
+    Audio is cut into PCM_FRAME_MS frames. A frame is speech when its RMS level is above
+    speech_dbfs and its zero-crossing rate is speech-like, or when it is loud enough that
+    the rate doesn't matter (sibilants). Breathing and hiss are quiet with a high crossing
+    rate; hum and room tone are simply quiet.
+    """
     
-    if missing_vars:
-        logger.error("❌ Missing required environment variables")
-        return False
+    def __init__(self, sample_rate: int, speech_dbfs: float = PCM_SPEECH_DBFS, max_zcr: float = PCM_MAX_ZCR,
+                 min_speech_ms: int = PCM_MIN_SPEECH_MS, padding_ms: int = PCM_TRIM_PADDING_MS):
+        self.sample_rate = sample_rate
+        self.frame_samples = sample_rate * PCM_FRAME_MS // 1000
+        self.speech_dbfs = speech_dbfs
+        self.loud_dbfs = speech_dbfs + PCM_LOUD_MARGIN_DB
+        self.max_zcr = max_zcr
+        self.min_speech_frames = max(min_speech_ms // PCM_FRAME_MS, 1)
+        self.padding_frames = padding_ms // PCM_FRAME_MS
     
-    logger.info("✅ All environment variables are set")
-    return True
+    def speech_mask(self, pcm: bytes):
+        """One boolean per whole frame; a trailing partial frame is ignored"""
+        samples = np.frombuffer(pcm, dtype="<i2", count=len(pcm) // 2)
+        usable = len(samples) - len(samples) % self.frame_samples
+        frames = samples[:usable].reshape(-1, self.frame_samples).astype(np.float32)
+        rms = np.sqrt(np.mean(frames * frames, axis=1))
+        level_dbfs = 20 * np.log10(np.maximum(rms, 1.0) / 32768.0)
+        signs = np.signbit(frames)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / self.frame_samples
+        return (level_dbfs > self.speech_dbfs) & ((zcr <= self.max_zcr) | (level_dbfs > self.loud_dbfs))
+    
+    def has_speech(self, pcm: bytes) -> bool:
+        return bool(self.speech_mask(pcm).any())
+    
+    def trim(self, pcm: bytes) -> Optional[bytes]:
+        """Cut leading and trailing silence, or None when there is too little speech to transcribe"""
+        speech = np.flatnonzero(self.speech_mask(pcm))
+        if len(speech) < self.min_speech_frames:
+            return None
+        frame_bytes = self.frame_samples * 2
+        start = max(int(speech[0]) - self.padding_frames, 0) * frame_bytes
+        end = min((int(speech[-1]) + 1 + self.padding_frames) * frame_bytes, len(pcm))
+        return pcm[start:end]
+    
+    def get_settings(self) -> dict:
+        return {
+            "sample_rate_hertz": self.sample_rate,
+            "speech_dbfs": self.speech_dbfs,
+            "max_zcr": self.max_zcr,
+            "loud_margin_db": PCM_LOUD_MARGIN_DB,
+            "min_speech_ms": self.min_speech_frames * PCM_FRAME_MS,
+            "padding_ms": self.padding_frames * PCM_FRAME_MS
+        }
 
-# Initialize FastAPI app
-app = FastAPI(title="Ultra-Sensitive Voice AI Server", version="8.0.0")
+class UtteranceAssembler:
+    """Collects chunked client audio into whole utterances before transcription
+    
+    The container header from the start of a recording is kept and prepended to every
+    utterance cut from it. An utterance ends on an explicit client marker, when no chunk
+    arrives for UTTERANCE_GAP_MS, or when it reaches the duration/size caps.
+    
+    WebM chunks are kept whole: MediaRecorder does not cut them at cluster boundaries, so
+    dropping any would leave the header followed by an undecodable mid-cluster chunk, and
+    their size says nothing reliable about silence. Only too-small utterances are discarded.
+    When the caps force a flush, the utterance is cut at its last cluster boundary and the
+    partial cluster is carried into the next one, so both decode.
+    
+    There is no end-of-speech detection inside WebM: telling silence from speech needs the
+    Opus decoded. Clients that record continuously without sending utterance_end should
+    use PCM input mode (or streaming STT, whose endpointing runs upstream); otherwise their
+    utterances are cut by the duration/size caps.
+    
+    With a SpeechGate (PCM input mode) chunks are raw samples: silence is measured from
+    the audio itself, ends an utterance after UTTERANCE_SILENCE_MS, and utterances are
+    trimmed to their speech and sent as WAV.
+    """
+    
+    def __init__(self, on_utterance, gate: SpeechGate = None):
+        self.on_utterance = on_utterance
+        self.gate = gate
+        self.header = b""
+        self.chunks = []
+        self.size = 0
+        self.voiced = False
+        self.silence_ms = 0.0
+        self.started_at = None
+        self.gap_timer = None
+        self.chunks_received = 0
+        self.utterances = 0
+        self.discarded = 0
+        self.gated = 0
+        self.trimmed_bytes = 0
+    
+    def add_chunk(self, chunk: bytes):
+        """Add a client audio chunk and emit an utterance if it completes one"""
+        now = time.monotonic()
+        header, body = (b"", chunk) if self.gate else split_webm_header(chunk)
+        if header:
+            # A new recording: anything pending belongs to the previous one
+            self.flush("new_stream")
+            self.header = header
+        
+        self.chunks_received += 1
+        
+        if self.gate:
+            if self.gate.has_speech(body):
+                self.voiced = True
+                self.silence_ms = 0.0
+            else:
+                self.silence_ms += len(body) / (2 * self.gate.sample_rate) * 1000  # Audio time, not arrival spacing
+                if not self.voiced:
+                    # Raw samples can be cut anywhere: keep one chunk of lead-in for the speech onset
+                    self.chunks = self.chunks[-1:]
+                    self.size = sum(len(c) for c in self.chunks)
+        elif body:
+            # Whether WebM audio holds speech is left to STT; the marker or gap ends the utterance
+            self.voiced = True
+        
+        if not self.chunks:
+            self.started_at = now
+        self.chunks.append(body)
+        self.size += len(body)
+        
+        if self.voiced and self.silence_ms >= UTTERANCE_SILENCE_MS:
+            self.flush("silence")
+        elif self.size >= UTTERANCE_MAX_BYTES:
+            self.flush("max_bytes")
+        elif now - self.started_at >= UTTERANCE_MAX_MS / 1000:
+            self.flush("max_duration")
+        else:
+            self._arm_gap_timer()
+    
+    def _arm_gap_timer(self):
+        if self.gap_timer:
+            self.gap_timer.cancel()
+        self.gap_timer = asyncio.get_running_loop().call_later(UTTERANCE_GAP_MS / 1000, self.flush, "gap")
+    
+    def flush(self, reason: str = "marker"):
+        """End the current utterance and hand it on if it contains speech"""
+        if self.gap_timer:
+            self.gap_timer.cancel()
+            self.gap_timer = None
+        if not self.chunks:
+            return
+        body = b"".join(self.chunks)
+        voiced = self.voiced
+        self.chunks = []
+        self.size = 0
+        self.voiced = False
+        self.silence_ms = 0.0
+        
+        if not self.gate and reason in ("max_bytes", "max_duration"):
+            cut = body.rfind(WEBM_CLUSTER_ID)
+            if cut > 0:
+                # The last cluster is still being recorded: it starts the next utterance
+                body, carried = body[:cut], body[cut:]
+                self.chunks = [carried]
+                self.size = len(carried)
+                self.voiced = voiced
+                self.started_at = time.monotonic()
+                self._arm_gap_timer()
+        
+        if not voiced or len(body) < UTTERANCE_MIN_BYTES:
+            self.discarded += 1
+            metrics.stt_calls_avoided.inc(1, "silence")
+            logger.info("🔇 Discarded non-speech audio (%d bytes, %s)", len(body), reason)
+            return
+        if self.gate:
+            speech = self.gate.trim(body)
+            if speech is None:
+                self.gated += 1
+                metrics.stt_calls_avoided.inc(1, "short_speech")
+                logger.info("🔇 Gated utterance with too little speech (%d bytes, %s)", len(body), reason)
+                return
+            self.trimmed_bytes += len(body) - len(speech)
+            body = pcm_to_wav(speech, self.gate.sample_rate)
+        self.utterances += 1
+        logger.info("🧩 Utterance assembled: %d bytes (%s)", len(body), reason)
+        self.on_utterance(self.header + body)
+    
+    def close(self):
+        """Drop pending audio and stop the gap timer"""
+        if self.gap_timer:
+            self.gap_timer.cancel()
+            self.gap_timer = None
+        self.chunks = []
+    
+    def get_stats(self) -> dict:
+        return {
+            "chunks_received": self.chunks_received,
+            "utterances": self.utterances,
+            "discarded": self.discarded,
+            "gated": self.gated,
+            "trimmed_bytes": self.trimmed_bytes,
+            "stt_calls_saved": max(self.chunks_received - self.utterances, 0)
+        }
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+class TurnQueue:
+    """Bounded per-conversation input queue drained by a single consumer task
+    
+    Everything that arrives while a turn is running is coalesced into the next turn:
+    audio becomes that turn's STT payloads (see merge_utterances), whose transcripts are
+    joined like streaming ones.
+    """
+    
+    def __init__(self, handler, max_frames: int = TURN_QUEUE_MAX_FRAMES, policy: str = TURN_QUEUE_POLICY):
+        self.handler = handler
+        self.max_frames = max(max_frames, 1)
+        self.policy = policy
+        self.frames = deque()
+        self.transcripts = []
+        self.wakeup = asyncio.Event()
+        self.consumer = None
+        self.current_turn = None
+        self.busy = False
+        self.queued_at = None  # When the oldest pending input arrived
+        self.accepting = True
+        self.idle = asyncio.Event()  # Set when no turn is running or pending
+        self.idle.set()
+        self.enqueued = 0
+        self.cancelled = 0
+        self.dropped = 0
+        self.merged = 0
+        self.turns = 0
+    
+    def __len__(self) -> int:
+        return len(self.frames) + len(self.transcripts)
+    
+    def put_audio(self, frame: bytes) -> bool:
+        """Queue an audio frame, applying the backpressure policy when full"""
+        if not self.accepting:
+            self.dropped += 1
+            return False
+        if len(self.frames) >= self.max_frames:
+            self.dropped += 1
+            if self.policy == "drop_newest":
+                return False
+            self.frames.popleft()
+        self.frames.append(frame)
+        self.enqueued += 1
+        self._wake()
+        return True
+    
+    def put_transcript(self, transcript: str):
+        """Queue a transcript produced by streaming STT"""
+        if not self.accepting:
+            self.dropped += 1
+            return
+        self.transcripts.append(transcript)
+        self.enqueued += 1
+        self._wake()
+    
+    def _wake(self):
+        self.idle.clear()
+        if self.queued_at is None:
+            self.queued_at = time.perf_counter()
+        self.wakeup.set()
+        if self.consumer is None or self.consumer.done():
+            self.consumer = asyncio.create_task(self._consume())
+    
+    async def _consume(self):
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            if not self.frames and not self.transcripts:
+                self.idle.set()
+                continue
+            
+            frames = list(self.frames)
+            self.frames.clear()
+            transcripts, self.transcripts = self.transcripts, []
+            queued_at, self.queued_at = self.queued_at, None
+            self.merged += max(len(frames) - 1, 0) + max(len(transcripts) - 1, 0)
+            
+            self.busy = True
+            turn = self.current_turn = asyncio.create_task(
+                self.handler(merge_utterances(frames), " ".join(transcripts) if transcripts else None, queued_at)
+            )
+            try:
+                # wait() rather than await so a cancelled turn doesn't stop the consumer
+                await asyncio.wait({turn})
+            except asyncio.CancelledError:
+                turn.cancel()
+                raise
+            finally:
+                self.busy = False
+                self.current_turn = None
+                self.turns += 1
+            
+            if turn.cancelled():
+                self.cancelled += 1
+            elif turn.exception():
+                logger.error("❌ Turn failed: %s", turn.exception())
+            if not self.frames and not self.transcripts:
+                self.idle.set()
+    
+    async def finish(self, timeout: float) -> bool:
+        """Accept no more input and wait up to timeout for queued and running turns; False if time ran out"""
+        self.accepting = False
+        if self.idle.is_set():
+            return True
+        try:
+            await asyncio.wait_for(self.idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+    
+    def cancel_current(self) -> Optional[asyncio.Task]:
+        """Cancel the running turn, if any, and return its task"""
+        turn = self.current_turn
+        if turn is None or turn.done():
+            return None
+        turn.cancel()
+        return turn
+    
+    def get_stats(self) -> dict:
+        return {
+            "queue_length": len(self),
+            "busy": self.busy,
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "merged": self.merged,
+            "cancelled": self.cancelled,
+            "turns": self.turns
+        }
+    
+    async def close(self):
+        """Stop the consumer and discard pending input"""
+        self.frames.clear()
+        self.transcripts = []
+        self.queued_at = None
+        self.idle.set()
+        if self.consumer and not self.consumer.done():
+            self.consumer.cancel()
+            try:
+                await self.consumer
+            except asyncio.CancelledError:
+                pass
+
+class ConversationStateBackend(abc.ABC):
+    """Interface for conversation state stored outside the worker process"""
+    
+    @abc.abstractmethod
+    async def load(self, conversation_id: str) -> Optional[dict]:
+        ...
+    
+    @abc.abstractmethod
+    async def save(self, conversation_id: str, state: dict, ttl_seconds: int = CONVERSATION_STATE_TTL_SECONDS):
+        ...
+    
+    @abc.abstractmethod
+    async def delete(self, conversation_id: str):
+        ...
+    
+    @abc.abstractmethod
+    async def load_prompt(self, digest: str) -> Optional[str]:
+        ...
+    
+    @abc.abstractmethod
+    async def save_prompt(self, digest: str, text: str, ttl_seconds: int):
+        """Store a prompt body once per PromptStore digest; states reference it by digest"""
+        ...
+    
+    def get_stats(self) -> dict:
+        return {}
+    
+    async def close(self):
+        pass
+
+class InMemoryConversationStateBackend(ConversationStateBackend):
+    """Single-process state backend (the original behaviour)"""
+    
+    def __init__(self):
+        self.states = {}   # conversation_id -> (serialized state, expires_at)
+        self.prompts = {}  # digest -> (prompt text, expires_at)
+    
+    def _purge_expired(self):
+        now = time.monotonic()
+        for entries in (self.states, self.prompts):
+            for key in [key for key, (_, expires_at) in entries.items() if expires_at <= now]:
+                del entries[key]
+    
+    async def load(self, conversation_id: str) -> Optional[dict]:
+        entry = self.states.get(conversation_id)
+        if entry is None or entry[1] <= time.monotonic():
+            return None
+        return json.loads(entry[0])
+    
+    async def save(self, conversation_id: str, state: dict, ttl_seconds: int = CONVERSATION_STATE_TTL_SECONDS):
+        self.states[conversation_id] = (json.dumps(state), time.monotonic() + ttl_seconds)
+        if len(self.states) % 100 == 0:
+            self._purge_expired()
+    
+    async def delete(self, conversation_id: str):
+        self.states.pop(conversation_id, None)
+    
+    async def load_prompt(self, digest: str) -> Optional[str]:
+        entry = self.prompts.get(digest)
+        if entry is None or entry[1] <= time.monotonic():
+            return None
+        return entry[0]
+    
+    async def save_prompt(self, digest: str, text: str, ttl_seconds: int):
+        self.prompts[digest] = (text, time.monotonic() + ttl_seconds)
+    
+    def get_stats(self) -> dict:
+        return {"backend": "memory", "stored_conversations": len(self.states), "stored_prompts": len(self.prompts)}
+
+class RedisConversationStateBackend(ConversationStateBackend):
+    """Networked key-value state backend speaking the Redis protocol (RESP) directly"""
+    
+    def __init__(self, url: str, timeout: float = CONVERSATION_STATE_TIMEOUT_SECONDS):
+        parsed = urlparse(url)
+        self.timeout = timeout
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.reader = None
+        self.writer = None
+        self.lock = asyncio.Lock()
+        self.commands = 0
+        self.errors = 0
+        self.timeouts = 0
+    
+    async def _connect(self):
+        self.reader, self.writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+        try:
+            # A connection that failed AUTH or SELECT must never be reused for commands
+            if self.password and await self._send("AUTH", self.password) != "OK":
+                raise ConnectionError("State backend rejected AUTH")
+            if self.db and await self._send("SELECT", str(self.db)) != "OK":
+                raise ConnectionError(f"State backend rejected SELECT {self.db}")
+        except BaseException:
+            self._disconnect()
+            raise
+        logger.info(f"🔗 Conversation state backend connected: {self.host}:{self.port}/{self.db}")
+    
+    def _disconnect(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = None
+        self.writer = None
+    
+    async def _send(self, *args: str):
+        payload = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            encoded = arg.encode()
+            payload.append(f"${len(encoded)}\r\n".encode() + encoded + b"\r\n")
+        self.writer.write(b"".join(payload))
+        return await asyncio.wait_for(self._drain_and_read(), self.timeout)
+    
+    async def _drain_and_read(self):
+        await self.writer.drain()
+        return await self._read_reply()
+    
+    async def _read_reply(self):
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionError("State backend closed the connection")
+        prefix, body = line[:1], line[1:-2]
+        if prefix == b"+":
+            return body.decode()
+        if prefix == b"-":
+            raise RuntimeError(body.decode())
+        if prefix == b":":
+            return int(body)
+        if prefix == b"$":
+            length = int(body)
+            if length < 0:
+                return None
+            data = await self.reader.readexactly(length + 2)
+            return data[:-2].decode()
+        raise RuntimeError(f"Unexpected RESP reply: {line!r}")
+    
+    async def command(self, *args: str):
+        """Run one command, reconnecting once if the connection dropped; connect and reply are each bounded by timeout"""
+        async with self.lock:
+            self.commands += 1
+            for attempt in range(2):
+                try:
+                    if self.writer is None or self.writer.is_closing():
+                        await self._connect()
+                    return await self._send(*args)
+                except asyncio.TimeoutError:
+                    # A stalled backend gets no second attempt; the reply may still arrive, so the connection goes
+                    self._disconnect()
+                    self.errors += 1
+                    self.timeouts += 1
+                    raise
+                except (ConnectionError, OSError, asyncio.IncompleteReadError):
+                    self._disconnect()
+                    if attempt:
+                        self.errors += 1
+                        raise
+                except asyncio.CancelledError:
+                    # A half-read reply would desynchronise the next command
+                    self._disconnect()
+                    raise
+    
+    async def load(self, conversation_id: str) -> Optional[dict]:
+        raw = await self.command("GET", f"conversation:{conversation_id}")
+        return json.loads(raw) if raw else None
+    
+    async def save(self, conversation_id: str, state: dict, ttl_seconds: int = CONVERSATION_STATE_TTL_SECONDS):
+        await self.command("SET", f"conversation:{conversation_id}", json.dumps(state), "EX", str(ttl_seconds))
+    
+    async def delete(self, conversation_id: str):
+        await self.command("DEL", f"conversation:{conversation_id}")
+    
+    async def load_prompt(self, digest: str) -> Optional[str]:
+        return await self.command("GET", f"prompt:{digest}")
+    
+    async def save_prompt(self, digest: str, text: str, ttl_seconds: int):
+        await self.command("SET", f"prompt:{digest}", text, "EX", str(ttl_seconds))
+    
+    def get_stats(self) -> dict:
+        return {
+            "backend": "redis",
+            "address": f"{self.host}:{self.port}/{self.db}",
+            "connected": self.writer is not None and not self.writer.is_closing(),
+            "commands": self.commands,
+            "errors": self.errors,
+            "timeouts": self.timeouts
+        }
+    
+    async def close(self):
+        self._disconnect()
+
+def create_state_backend() -> ConversationStateBackend:
+    """Pick the conversation state backend from CONVERSATION_STATE_URL"""
+    if CONVERSATION_STATE_URL and CONVERSATION_STATE_URL.startswith("redis://"):
+        return RedisConversationStateBackend(CONVERSATION_STATE_URL)
+    return InMemoryConversationStateBackend()
 
 class UltraSensitiveVoiceProcessor:
     """Ultra-sensitive voice processing optimized for maximum speech detection"""
     
     def __init__(self):
-        self.session = None
-        self.conversation_contexts = {}
-        self.voice_cache = {}
+        self.upstreams = {
+            "deepgram": UpstreamPool(
+                "deepgram", DEEPGRAM_URL,
+                aiohttp.ClientTimeout(total=STT_READ_TIMEOUT_SECONDS, sock_connect=STT_CONNECT_TIMEOUT_SECONDS),
+                prewarm=UPSTREAM_POOL_PREWARM if DEEPGRAM_API_KEY else 0
+            ),
+            "openai": UpstreamPool(
+                "openai", OPENAI_BASE_URL,
+                aiohttp.ClientTimeout(total=None, sock_connect=LLM_CONNECT_TIMEOUT_SECONDS, sock_read=LLM_READ_TIMEOUT_SECONDS),
+                prewarm=UPSTREAM_POOL_PREWARM if OPENAI_API_KEY else 0
+            ),
+            # Live STT sockets hold a connection for a whole conversation, so they are neither capped nor pre-opened
+            "deepgram_live": UpstreamPool(
+                "deepgram_live", DEEPGRAM_STREAM_URL,
+                aiohttp.ClientTimeout(total=None, sock_connect=STT_CONNECT_TIMEOUT_SECONDS),
+                limit=0, prewarm=0
+            )
+        }
+        self.limiters = {
+            "stt": UpstreamLimiter("stt", STT_MAX_CONCURRENCY),
+            "llm": UpstreamLimiter("llm", LLM_MAX_CONCURRENCY)
+        }
+        self.rate_limits = {}
+        self.policies = {
+            "deepgram": UpstreamCallPolicy("deepgram", self.rate_limit("deepgram", DEEPGRAM_API_KEY, DEEPGRAM_REQUESTS_PER_MINUTE),
+                                           is_retryable_http_error),
+            "openai": UpstreamCallPolicy("openai", self.rate_limit("openai", OPENAI_API_KEY, OPENAI_REQUESTS_PER_MINUTE),
+                                         is_retryable_http_error),
+            "google_tts": UpstreamCallPolicy("google_tts", self.rate_limit("google_tts", GOOGLE_APPLICATION_CREDENTIALS, GOOGLE_TTS_REQUESTS_PER_MINUTE),
+                                             is_retryable_tts_error, hedge=TTS_HEDGING,
+                                             has_capacity=lambda: self.tts_client is not None and self.tts_client.has_free_slot())
+        }
+        self.conversation_contexts: Dict[str, ConversationContext] = {}
+        self.token_counter = TokenCounter("gpt-3.5-turbo" if USE_GPT_3_5 else "gpt-4")
+        self.prompt_store = PromptStore()
+        self.unit_content_keys: Dict[str, str] = {}
+        self.prompt_token_totals = {"requests": 0, "prompt_tokens": 0, "last_prompt_tokens": 0}
+        self.voice_cache = VoiceCache()
+        self.disk_cache = self._initialize_disk_cache()
+        self.pending_cache_writes = set()  # Disk cache writes still running on the default executor
         self.cache_hits = 0
         self.total_requests = 0
         self.tts_client = self._initialize_tts_client()
@@ -107,48 +2677,10 @@ class UltraSensitiveVoiceProcessor:
             "encouraging": {"pitch": "+2st", "rate": "0.95", "volume": "+3dB"},
             "explanatory": {"pitch": "+1st", "rate": "0.88", "volume": "+2dB"}
         }
+        self.ssml_builder = SSMLBuilder(self.emotional_states)
         
-    def _initialize_tts_client(self):
-        """Initialize Google Cloud TTS client"""
-        try:
-            if GOOGLE_APPLICATION_CREDENTIALS and os.path.exists(GOOGLE_APPLICATION_CREDENTIALS):
-                logger.info(f"Loading credentials from file: {GOOGLE_APPLICATION_CREDENTIALS}")
-                client = texttospeech.TextToSpeechClient()
-                logger.info("✅ Google Cloud TTS client initialized from file")
-                return client
-            elif GOOGLE_APPLICATION_CREDENTIALS_JSON:
-                logger.info("Loading credentials from JSON environment variable")
-                creds_info = json.loads(GOOGLE_APPLICATION_CREDENTIALS_JSON)
-                credentials = service_account.Credentials.from_service_account_info(creds_info)
-                client = texttospeech.TextToSpeechClient(credentials=credentials)
-                logger.info("✅ Google Cloud TTS client initialized from JSON")
-                return client
-            else:
-                logger.error("❌ No Google Cloud credentials found")
-                return None
-        except Exception as e:
-            logger.error(f"❌ Failed to initialize Google Cloud TTS client: {e}")
-            return None
-        
-    async def get_session(self):
-        """Get or create aiohttp session"""
-        if self.session is None or self.session.closed:
-            self.session = aiohttp.ClientSession()
-        return self.session
-    
-    async def close_session(self):
-        """Close aiohttp session"""
-        if self.session and not self.session.closed:
-            await self.session.close()
-            
-    def get_cache_key(self, text: str, voice_config: str) -> str:
-        """Generate cache key for voice responses"""
-        normalized = text.lower().strip()
-        return f"{voice_config}:{normalized}"
-    
-    def get_cost_optimized_voice_config(self, voice_id: str = None) -> Dict[str, Any]:
-        """Get cost-optimized voice configuration - Standard voices by default with Neural2 premium options"""
-        voice_map = {
+        # Voice catalogue - Standard voices by default with Neural2 premium options
+        self.voice_map = {
             # STANDARD VOICES (75% CHEAPER - $4/1M chars) - DEFAULT
             "female": {
                 "language_code": "en-US",
@@ -226,6 +2758,133 @@ class UltraSensitiveVoiceProcessor:
             }
         }
         
+        # Enhanced responses for ultra-natural interaction with more variety
+        self.common_responses = {
+            "hello": "Hello there! I'm absolutely delighted to meet you and I'm genuinely excited about our learning journey together. What fascinating topic would you like to explore today?",
+            "hi": "Hi! It's wonderful to connect with you. I'm here to make learning engaging and enjoyable. What subject are you curious about right now?",
+            "hey": "Hey! I love your enthusiasm. I'm ready to dive into some exciting learning with you. What would you like to discover today?",
+            "how are you": "I'm doing fantastic, thank you for asking! I'm energized and ready to help you learn something amazing. How are you feeling about tackling new concepts today?",
+            "thank you": "You're so very welcome! It genuinely makes me happy when I can help clarify things for you. Learning together like this is exactly what I love most. What else can we explore?",
+            "thanks": "My absolute pleasure! Seeing concepts click for students is incredibly rewarding. I'm here whenever you need support on this learning adventure.",
+            "goodbye": "It's been such a pleasure learning with you today! Remember, every new concept you master builds your confidence. Keep that curiosity alive!",
+            "bye": "Take care, and remember how much you've accomplished today! I'm excited for our next learning session together.",
+            "yes": "Wonderful! I can tell you're really engaging with this material. Your understanding is building beautifully. Let me share the next fascinating piece of this puzzle.",
+            "no": "That's perfectly okay! Questions and uncertainty are natural parts of learning. Let me approach this from a different angle that might resonate better with you.",
+            "okay": "Excellent! I can see you're following along really well. Your engagement tells me you're ready for the next exciting concept we'll explore together.",
+            "ok": "Perfect! You're showing great focus and understanding. Now, here's where things get really interesting in our topic.",
+            "sure": "Fantastic! I love your openness to learning. Let me paint a clearer picture of this concept that I think you'll find genuinely fascinating.",
+            "right": "Exactly right! You're demonstrating excellent understanding. Building on that insight, let's explore how this connects to even bigger ideas.",
+            "good": "I'm so glad this is making sense! Your grasp of these concepts is developing beautifully. Let's continue building on this strong foundation.",
+            "what": "Great question! Let me explain that clearly for you.",
+            "why": "That's such an important question! Let me walk you through the reasoning behind this.",
+            "how": "Excellent question! Let me break that down step by step for you.",
+            "really": "Yes, absolutely! This is fascinating stuff. Let me tell you more about why this works the way it does.",
+            "interesting": "I'm so glad you find this interesting! There's actually so much more to discover here.",
+            "cool": "Right? This topic has so many amazing layers to it! Let me show you another fascinating aspect."
+        }
+        
+        self.response_cache = ResponseCache(self.common_responses)
+        
+        self.default_introduction = "Hello there! I'm absolutely delighted to meet you and genuinely excited about our learning journey together. What fascinating topic would you like to explore today?"
+        self.warmup_status = {"state": "pending", "total": 0, "completed": 0, "failed": 0, "duration_ms": None}
+        
+    def _initialize_tts_client(self):
+        """Initialize Google Cloud TTS execution engine"""
+        try:
+            if GOOGLE_TTS_ENDPOINT:
+                logger.info(f"Using Google TTS REST endpoint: {GOOGLE_TTS_ENDPOINT}")
+                client = TTSExecutionEngine(lambda: texttospeech.TextToSpeechClient(
+                    transport="rest",
+                    credentials=AnonymousCredentials(),
+                    client_options={"api_endpoint": GOOGLE_TTS_ENDPOINT}
+                ))
+                logger.info(f"✅ Google Cloud TTS engine initialized for {GOOGLE_TTS_ENDPOINT} ({len(client.clients)} channels)")
+                return client
+            elif GOOGLE_APPLICATION_CREDENTIALS and os.path.exists(GOOGLE_APPLICATION_CREDENTIALS):
+                logger.info(f"Loading credentials from file: {GOOGLE_APPLICATION_CREDENTIALS}")
+                client = TTSExecutionEngine(lambda: texttospeech.TextToSpeechClient())
+                logger.info(f"✅ Google Cloud TTS engine initialized from file ({len(client.clients)} channels)")
+                return client
+            elif GOOGLE_APPLICATION_CREDENTIALS_JSON:
+                logger.info("Loading credentials from JSON environment variable")
+                creds_info = json.loads(GOOGLE_APPLICATION_CREDENTIALS_JSON)
+                credentials = service_account.Credentials.from_service_account_info(creds_info)
+                client = TTSExecutionEngine(lambda: texttospeech.TextToSpeechClient(credentials=credentials))
+                logger.info(f"✅ Google Cloud TTS engine initialized from JSON ({len(client.clients)} channels)")
+                return client
+            else:
+                logger.error("❌ No Google Cloud credentials found")
+                return None
+        except Exception as e:
+            logger.error(f"❌ Failed to initialize Google Cloud TTS client: {e}")
+            return None
+        
+    def _initialize_disk_cache(self):
+        """Initialize the optional shared on-disk audio cache"""
+        if not (USE_VOICE_CACHE and TTS_DISK_CACHE_DIR):
+            return None
+        try:
+            disk_cache = DiskAudioCache(TTS_DISK_CACHE_DIR)
+            logger.info(f"✅ Disk audio cache enabled: {TTS_DISK_CACHE_DIR}")
+            return disk_cache
+        except Exception as e:
+            logger.error(f"❌ Failed to initialize disk audio cache: {e}")
+            return None
+        
+    def rate_limit(self, upstream: str, api_key: Optional[str], requests_per_minute: int) -> TokenBucket:
+        """The token bucket for an API key, shared by every upstream that uses the key"""
+        key = PromptStore.digest(f"{upstream}:{api_key or ''}")
+        if key not in self.rate_limits:
+            self.rate_limits[key] = TokenBucket(upstream, requests_per_minute)
+        return self.rate_limits[key]
+    
+    async def _post_attempt(self, upstream: str, url: str, **kwargs) -> aiohttp.ClientResponse:
+        session = await self.get_session(upstream)
+        response = await session.post(url, **kwargs)
+        if response.status == 429 or response.status >= 500:
+            await response.read()
+            response.release()
+            if response.status == 429:
+                metrics.upstream_throttled.inc(1, upstream)
+            raise RetryableUpstreamError(upstream, response.status, parse_retry_after(response.headers.get("Retry-After")))
+        return response
+    
+    @asynccontextmanager
+    async def upstream_post(self, upstream: str, url: str, **kwargs):
+        """POST under the upstream's call policy, yielding the first non-retryable response"""
+        response = await self.policies[upstream].call(lambda: self._post_attempt(upstream, url, **kwargs))
+        async with response:
+            yield response
+    
+    async def get_session(self, upstream: str) -> aiohttp.ClientSession:
+        """Get the pooled aiohttp session for an upstream"""
+        return await self.upstreams[upstream].get_session()
+    
+    def start_upstream_pools(self):
+        """Pre-open keep-alive connections and keep idle pools warm"""
+        for pool in self.upstreams.values():
+            pool.start()
+    
+    def get_upstream_stats(self) -> dict:
+        return {name: pool.get_stats() for name, pool in self.upstreams.items()}
+    
+    async def close_session(self):
+        """Close every upstream pool"""
+        for pool in self.upstreams.values():
+            await pool.close()
+    
+    async def flush_caches(self):
+        """Wait for in-flight disk cache writes so audio synthesized during a drain survives the restart"""
+        if self.pending_cache_writes:
+            await asyncio.gather(*self.pending_cache_writes, return_exceptions=True)
+            
+    def get_cache_key(self, text: str, voice_config: str) -> str:
+        """Generate cache key for voice responses"""
+        normalized = text.lower().strip()
+        return f"{voice_config}:{normalized}"
+    
+    def get_cost_optimized_voice_config(self, voice_id: str = None) -> Dict[str, Any]:
+        """Get cost-optimized voice configuration - Standard voices by default with Neural2 premium options"""
         # Default to cost-effective Standard female voice
         default_config = {
             "language_code": "en-US",
@@ -236,26 +2895,27 @@ class UltraSensitiveVoiceProcessor:
             "description": "High-quality female voice - excellent for teaching"
         }
         
-        return voice_map.get(voice_id or "female", default_config)
+        return self.voice_map.get(voice_id or "female", default_config)
         
     async def transcribe_audio(self, audio_data: bytes) -> str:
         """Ultra-sensitive transcription optimized for maximum speech detection"""
         try:
-            logger.info(f"🎤 ULTRA-SENSITIVE transcription: {len(audio_data)} bytes")
+            logger.info("🎤 ULTRA-SENSITIVE transcription: %d bytes", len(audio_data))
             
             # ULTRA-LOW threshold - catch even the smallest audio clips
             if len(audio_data) < 200:  # Reduced from 300 to 200
-                logger.info(f"⚠️ Audio chunk very small: {len(audio_data)} bytes")
+                logger.info("⚠️ Audio chunk very small: %d bytes", len(audio_data))
                 return ""
             
             if not DEEPGRAM_API_KEY:
                 logger.error("❌ Deepgram API key not configured")
                 return ""
                 
-            url = "https://api.deepgram.com/v1/listen"
+            url = DEEPGRAM_URL
             headers = {
                 "Authorization": f"Token {DEEPGRAM_API_KEY}",
-                "Content-Type": "audio/webm"
+                # Trimmed PCM input-mode utterances arrive as WAV, everything else is MediaRecorder WebM
+                "Content-Type": "audio/wav" if audio_data[:4] == b"RIFF" else "audio/webm"
             }
             
             # ULTRA-SENSITIVE Deepgram parameters for maximum detection (Fixed API)
@@ -266,11 +2926,8 @@ class UltraSensitiveVoiceProcessor:
                 "punctuate": "true",
                 "diarize": "false",
                 "filler_words": "true",  # Include filler words to catch more speech
-                "interim_results": "false",
                 "utterances": "true",
                 "utt_split": "0.3",  # ULTRA-SHORT splits for responsiveness
-                "endpointing": "10",   # ULTRA-quick endpointing (10ms - very sensitive)
-                "no_delay": "true",    # Process immediately
                 "multichannel": "false",
                 "alternatives": "1",
                 "profanity_filter": "false",
@@ -281,15 +2938,15 @@ class UltraSensitiveVoiceProcessor:
                 "summarize": "false"   # Speed optimization
             }
             
-            session = await self.get_session()
-            timeout = aiohttp.ClientTimeout(total=30)
-            
-            logger.info(f"🔍 Sending to Deepgram with ultra-sensitive params: {params}")
+            logger.debug("🔍 Sending to Deepgram with ultra-sensitive params: %s", params)
             
-            async with session.post(url, headers=headers, params=params, data=audio_data, timeout=timeout) as response:
+            started = time.perf_counter()
+            async with self.limiters["stt"].slot(), self.upstream_post("deepgram", url, headers=headers, params=params, data=audio_data) as response:
                 if response.status == 200:
                     result = await response.json()
-                    logger.info(f"📊 Deepgram response: {json.dumps(result, indent=2)}")
+                    record_stage("stt", started)
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug("📊 Deepgram response: %s", json.dumps(result))
                     
                     channels = result.get("results", {}).get("channels", [])
                     if not channels:
@@ -304,171 +2961,61 @@ class UltraSensitiveVoiceProcessor:
                     transcript = alternatives[0].get("transcript", "").strip()
                     confidence = alternatives[0].get("confidence", 0)
                     
-                    logger.info(f"📝 TRANSCRIPT: '{transcript}' (confidence: {confidence:.3f})")
+                    logger.log(CONTENT_LOG_LEVEL, "📝 TRANSCRIPT: '%s' (confidence: %.3f)", transcript, confidence)
                     
                     # ULTRA-LOW confidence threshold for maximum sensitivity
                     if confidence > 0.05 and len(transcript) > 0:  # Reduced from 0.15 to 0.05
-                        logger.info(f"✅ ACCEPTED transcript: '{transcript}' with confidence {confidence:.3f}")
+                        logger.info("✅ ACCEPTED transcript: %d chars with confidence %.3f", len(transcript), confidence)
                         return transcript
                     else:
-                        logger.warning(f"❌ REJECTED transcript: '{transcript}' - confidence too low: {confidence:.3f}")
+                        logger.warning("❌ REJECTED transcript: %d chars - confidence too low: %.3f", len(transcript), confidence)
                         
                         # If we have text but low confidence, try anyway for very short phrases
                         if len(transcript) > 0 and len(transcript.split()) <= 2:
-                            logger.info(f"🔄 ACCEPTING short phrase anyway: '{transcript}'")
+                            logger.log(CONTENT_LOG_LEVEL, "🔄 ACCEPTING short phrase anyway: '%s'", transcript)
                             return transcript
                         
                         return ""
                 else:
                     error_text = await response.text()
-                    logger.error(f"❌ Deepgram API error: {response.status} - {error_text}")
+                    metrics.upstream_errors.inc(1, "deepgram")
+                    logger.error("❌ Deepgram API error: %s - %s", response.status, error_text)
                     return ""
                         
+        except UpstreamSaturatedError:
+            logger.warning("⚠️ Transcription shed: no STT slot within %ss", UPSTREAM_QUEUE_TIMEOUT_SECONDS)
+            return ""
         except Exception as e:
-            logger.error(f"❌ Transcription critical error: {e}")
+            metrics.upstream_errors.inc(1, "deepgram")
+            logger.error("❌ Transcription critical error: %s", e)
             logger.error(traceback.format_exc())
             return ""
 
     def analyze_content_emotion(self, text: str) -> str:
         """Analyze text content to determine appropriate emotional tone"""
-        text_lower = text.lower()
-        
-        if any(word in text_lower for word in ['amazing', 'fantastic', 'incredible', 'wow', 'excellent', 'brilliant']):
-            return "excited"
-        elif any(word in text_lower for word in ['great job', 'well done', 'perfect', 'exactly', 'good work']):
-            return "encouraging"
-        elif any(word in text_lower for word in ['let me explain', 'consider this', 'think about', 'understand']):
-            return "thoughtful"
-        elif any(word in text_lower for word in ['let\'s explore', 'discover', 'learn about', 'dive into']):
-            return "enthusiastic"
-        else:
-            return "explanatory"
+        return self.ssml_builder.classify(text)
 
     def create_ultra_natural_ssml(self, text: str, emotional_state: str = "explanatory") -> str:
         """Create ultra-sophisticated SSML for maximum naturalness"""
         try:
-            if not ENABLE_ADVANCED_SSML:
-                return text
-            
-            emotion = self.emotional_states.get(emotional_state, self.emotional_states["explanatory"])
-            enhanced = text.strip()
-            
-            if len(enhanced) < 5:
-                return enhanced
-            
-            sentences = re.split(r'[.!?]+', enhanced)
-            sentences = [s.strip() for s in sentences if s.strip()]
-            
-            if not sentences:
-                return enhanced
-            
-            ssml_parts = ['<speak>']
-            ssml_parts.append(f'<prosody rate="{emotion["rate"]}" pitch="{emotion["pitch"]}" volume="{emotion["volume"]}">')
-            
-            for i, sentence in enumerate(sentences):
-                if not sentence:
-                    continue
-                
-                if USE_BREATHING_PAUSES and i > 0 and len(sentence) > 30:
-                    pause_length = random.choice(["0.4s", "0.5s", "0.6s"])
-                    ssml_parts.append(f'<break time="{pause_length}"/>')
-                
-                emphasized_sentence = self.add_intelligent_emphasis(sentence)
-                
-                if USE_SPEECH_PATTERNS:
-                    emphasized_sentence = self.add_speech_patterns(emphasized_sentence, i, len(sentences))
-                
-                ssml_parts.append(emphasized_sentence)
-                
-                if i < len(sentences) - 1:
-                    if sentence.endswith('?'):
-                        ssml_parts.append('<break time="0.6s"/>')
-                    elif sentence.endswith('!'):
-                        ssml_parts.append('<break time="0.4s"/>')
-                    else:
-                        ssml_parts.append('<break time="0.3s"/>')
-            
-            ssml_parts.append('</prosody>')
-            ssml_parts.append('</speak>')
-            
-            ssml_result = ''.join(ssml_parts)
-            
-            if self.validate_ssml(ssml_result):
-                logger.info(f"Generated ultra-natural SSML with {emotional_state} emotion")
-                return ssml_result
-            else:
-                logger.warning("SSML validation failed, using enhanced plain text")
-                return self.create_enhanced_plain_text(text)
-                
+            return self.ssml_builder.build(text, emotional_state)
         except Exception as e:
-            logger.warning(f"Ultra-natural SSML generation failed: {e}, using enhanced text")
+            logger.warning("Ultra-natural SSML generation failed: %s, using enhanced text", e)
             return self.create_enhanced_plain_text(text)
     
-    def add_intelligent_emphasis(self, sentence: str) -> str:
-        """Add intelligent emphasis to important words"""
-        emphasis_patterns = {
-            'strong': ['important', 'crucial', 'essential', 'key', 'vital', 'critical'],
-            'moderate': ['remember', 'note', 'notice', 'observe', 'consider', 'understand']
-        }
-        
-        result = sentence
-        
-        for level, words in emphasis_patterns.items():
-            for word in words:
-                pattern = rf'\b({re.escape(word)})\b'
-                replacement = f'<emphasis level="{level}">\\1</emphasis>'
-                result = re.sub(pattern, replacement, result, flags=re.IGNORECASE)
-        
-        return result
-    
-    def add_speech_patterns(self, sentence: str, position: int, total: int) -> str:
-        """Add natural speech patterns"""
-        if position == 0 and total > 1:
-            return f'<prosody pitch="+1st">{sentence}</prosody>'
-        elif position == total - 1 and total > 1:
-            return f'<prosody rate="0.95">{sentence}</prosody>'
-        elif total > 2 and position % 2 == 1:
-            return f'<prosody pitch="+0.5st">{sentence}</prosody>'
-        
-        return sentence
-    
     def create_enhanced_plain_text(self, text: str) -> str:
         """Create enhanced plain text as fallback"""
         enhanced = text.strip()
         enhanced = re.sub(r'([.!?])\s+', r'\1 ', enhanced)
         return enhanced
     
-    def validate_ssml(self, ssml: str) -> bool:
-        """Validate SSML structure"""
-        try:
-            speak_open = ssml.count('<speak>')
-            speak_close = ssml.count('</speak>')
-            
-            if speak_open != 1 or speak_close != 1:
-                return False
-            
-            prosody_open = ssml.count('<prosody')
-            prosody_close = ssml.count('</prosody>')
-            
-            if prosody_open != prosody_close:
-                return False
-            
-            emphasis_open = ssml.count('<emphasis')
-            emphasis_close = ssml.count('</emphasis>')
-            
-            return emphasis_open == emphasis_close
-            
-        except Exception:
-            return False
-
-    async def get_ai_response(self, text: str, conversation_id: str, interrupted: bool = False, context: dict = None) -> str:
-        """Get response from OpenAI optimized for natural conversation flow"""
-        try:
-            if conversation_id not in self.conversation_contexts:
-                if context:
-                    self.get_introduction(conversation_id, context)
-                else:
-                    system_prompt = """You are a highly engaging AI tutor in a live voice conversation. 
+    def _prepare_ai_request(self, text: str, conversation_id: str, interrupted: bool = False, context: dict = None):
+        """Ensure a conversation context exists and return (canned_response, request_messages)"""
+        if conversation_id not in self.conversation_contexts:
+            if context:
+                self.get_introduction(conversation_id, context)
+            else:
+                system_prompt = """You are a highly engaging AI tutor in a live voice conversation. 
                     
                     SPEECH OPTIMIZATION:
                     - Give naturally flowing responses (100-200 words) that sound conversational
@@ -486,94 +3033,181 @@ class UltraSensitiveVoiceProcessor:
                     - Maintain energy and engagement throughout
                     
                     Remember: This is spoken conversation, so prioritize natural flow and engagement over formal structure."""
-                    
-                    self.conversation_contexts[conversation_id] = deque([
-                        {"role": "system", "content": system_prompt}
-                    ], maxlen=MAX_CONTEXT_MESSAGES + 1)
-            
-            # Enhanced responses for ultra-natural interaction with more variety
-            common_responses = {
-                "hello": "Hello there! I'm absolutely delighted to meet you and I'm genuinely excited about our learning journey together. What fascinating topic would you like to explore today?",
-                "hi": "Hi! It's wonderful to connect with you. I'm here to make learning engaging and enjoyable. What subject are you curious about right now?",
-                "hey": "Hey! I love your enthusiasm. I'm ready to dive into some exciting learning with you. What would you like to discover today?",
-                "how are you": "I'm doing fantastic, thank you for asking! I'm energized and ready to help you learn something amazing. How are you feeling about tackling new concepts today?",
-                "thank you": "You're so very welcome! It genuinely makes me happy when I can help clarify things for you. Learning together like this is exactly what I love most. What else can we explore?",
-                "thanks": "My absolute pleasure! Seeing concepts click for students is incredibly rewarding. I'm here whenever you need support on this learning adventure.",
-                "goodbye": "It's been such a pleasure learning with you today! Remember, every new concept you master builds your confidence. Keep that curiosity alive!",
-                "bye": "Take care, and remember how much you've accomplished today! I'm excited for our next learning session together.",
-                "yes": "Wonderful! I can tell you're really engaging with this material. Your understanding is building beautifully. Let me share the next fascinating piece of this puzzle.",
-                "no": "That's perfectly okay! Questions and uncertainty are natural parts of learning. Let me approach this from a different angle that might resonate better with you.",
-                "okay": "Excellent! I can see you're following along really well. Your engagement tells me you're ready for the next exciting concept we'll explore together.",
-                "ok": "Perfect! You're showing great focus and understanding. Now, here's where things get really interesting in our topic.",
-                "sure": "Fantastic! I love your openness to learning. Let me paint a clearer picture of this concept that I think you'll find genuinely fascinating.",
-                "right": "Exactly right! You're demonstrating excellent understanding. Building on that insight, let's explore how this connects to even bigger ideas.",
-                "good": "I'm so glad this is making sense! Your grasp of these concepts is developing beautifully. Let's continue building on this strong foundation.",
-                "what": "Great question! Let me explain that clearly for you.",
-                "why": "That's such an important question! Let me walk you through the reasoning behind this.",
-                "how": "Excellent question! Let me break that down step by step for you.",
-                "really": "Yes, absolutely! This is fascinating stuff. Let me tell you more about why this works the way it does.",
-                "interesting": "I'm so glad you find this interesting! There's actually so much more to discover here.",
-                "cool": "Right? This topic has so many amazing layers to it! Let me show you another fascinating aspect."
-            }
-            
-            text_lower = text.lower().strip().rstrip('?!.')
-            if text_lower in common_responses:
-                response = common_responses[text_lower]
-                self.conversation_contexts[conversation_id].append({"role": "user", "content": text})
-                self.conversation_contexts[conversation_id].append({"role": "assistant", "content": response})
-                logger.info("✅ Using ultra-natural response for common query")
-                return response
-            
-            if interrupted and len(self.conversation_contexts[conversation_id]) > 1:
-                text = f"[User interrupted] {text}"
-            
-            self.conversation_contexts[conversation_id].append({"role": "user", "content": text})
-            messages = list(self.conversation_contexts[conversation_id])
+                
+                self.set_conversation_context(conversation_id, system_prompt)
+        
+        conversation_context = self.conversation_contexts[conversation_id]
+        response = None if interrupted else self.response_cache.lookup(conversation_context.system_key, text, conversation_id)
+        if response:
+            conversation_context.append("user", text)
+            conversation_context.append("assistant", response)
+            logger.info("✅ Using cached response for common query")
+            return response, None
+        
+        if interrupted and len(conversation_context) > 1:
+            text = f"[User interrupted] {text}"
+        
+        conversation_context.append("user", text)
+        self.record_prompt_size(conversation_context.prompt_tokens())
+        return None, conversation_context.to_messages()
+    
+    def _build_chat_request(self, messages: list, stream: bool = False):
+        """Build OpenAI chat completion request (url, headers, payload)"""
+        url = f"{OPENAI_BASE_URL}/chat/completions"
+        headers = {
+            "Authorization": f"Bearer {OPENAI_API_KEY}",
+            "Content-Type": "application/json"
+        }
+        data = {
+            "model": "gpt-3.5-turbo" if USE_GPT_3_5 else "gpt-4",
+            "messages": messages,
+            "max_tokens": MAX_RESPONSE_TOKENS,
+            "temperature": 0.9,
+            "presence_penalty": 0.2,
+            "frequency_penalty": 0.1,
+            "n": 1,
+            "stream": stream
+        }
+        if stream:
+            # Final chunk carries token usage, as in non-streamed responses
+            data["stream_options"] = {"include_usage": True}
+        return url, headers, data
+
+    async def get_ai_response(self, text: str, conversation_id: str, interrupted: bool = False, context: dict = None) -> str:
+        """Get response from OpenAI optimized for natural conversation flow"""
+        try:
+            canned_response, messages = self._prepare_ai_request(text, conversation_id, interrupted, context)
+            if canned_response:
+                return canned_response
             
-            url = "https://api.openai.com/v1/chat/completions"
-            headers = {
-                "Authorization": f"Bearer {OPENAI_API_KEY}",
-                "Content-Type": "application/json"
-            }
-            data = {
-                "model": "gpt-3.5-turbo" if USE_GPT_3_5 else "gpt-4",
-                "messages": messages,
-                "max_tokens": MAX_RESPONSE_TOKENS,
-                "temperature": 0.9,
-                "presence_penalty": 0.2,
-                "frequency_penalty": 0.1,
-                "n": 1,
-                "stream": False
-            }
+            url, headers, data = self._build_chat_request(messages)
             
-            session = await self.get_session()
-            async with session.post(url, headers=headers, json=data) as response:
+            started = time.perf_counter()
+            async with self.limiters["llm"].slot(), self.upstream_post("openai", url, headers=headers, json=data) as response:
                 if response.status == 200:
                     result = await response.json()
+                    record_stage("llm", started)
                     ai_response = result["choices"][0]["message"]["content"]
                     
-                    self.conversation_contexts[conversation_id].append({"role": "assistant", "content": ai_response})
+                    conversation_context = self.conversation_contexts[conversation_id]
+                    conversation_context.append("assistant", ai_response)
+                    self.cache_response(conversation_id, text, ai_response, interrupted, time.perf_counter() - started)
                     
                     usage = result.get("usage", {})
-                    logger.info(f"Tokens used - Prompt: {usage.get('prompt_tokens', 0)}, "
-                              f"Completion: {usage.get('completion_tokens', 0)}, "
-                              f"Total: {usage.get('total_tokens', 0)}")
+                    self.record_token_usage(usage)
+                    logger.info("Tokens used - Prompt: %s, Completion: %s, Total: %s",
+                                usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0), usage.get("total_tokens", 0))
                     
                     return ai_response
                 else:
-                    logger.error(f"OpenAI error: {response.status}")
+                    metrics.upstream_errors.inc(1, "openai")
+                    logger.error("OpenAI error: %s", response.status)
                     return "I'm having a brief technical moment, but I'm still here and excited to help. Could you share that thought again?"
             
+        except UpstreamSaturatedError:
+            logger.warning("⚠️ AI response shed: no LLM slot within %ss", UPSTREAM_QUEUE_TIMEOUT_SECONDS)
+            return "I'm experiencing a small hiccup, but I'm absolutely committed to helping you learn. Let's try that again."
         except Exception as e:
-            logger.error(f"AI response error: {e}")
+            metrics.upstream_errors.inc(1, "openai")
+            logger.error("AI response error: %s", e)
             return "I'm experiencing a small hiccup, but I'm absolutely committed to helping you learn. Let's try that again."
 
-    async def synthesize_speech(self, text: str, voice_id: str = None) -> bytes:
-        """Cost-optimized speech synthesis with excellent quality"""
+    async def stream_ai_response(self, text: str, conversation_id: str, interrupted: bool = False, context: dict = None):
+        """Stream response text deltas from OpenAI as they are generated"""
+        full_response = []
+        try:
+            canned_response, messages = self._prepare_ai_request(text, conversation_id, interrupted, context)
+            if canned_response:
+                yield canned_response
+                return
+            
+            url, headers, data = self._build_chat_request(messages, stream=True)
+            
+            started = time.perf_counter()
+            async with self.limiters["llm"].slot(), self.upstream_post("openai", url, headers=headers, json=data) as response:
+                if response.status != 200:
+                    metrics.upstream_errors.inc(1, "openai")
+                    logger.error("OpenAI streaming error: %s", response.status)
+                    yield "I'm having a brief technical moment, but I'm still here and excited to help. Could you share that thought again?"
+                    return
+                
+                # Server-sent events: one "data: {...}" line per token chunk
+                async for raw_line in response.content:
+                    line = raw_line.decode("utf-8").strip()
+                    if not line.startswith("data:"):
+                        continue
+                    payload = line[5:].strip()
+                    if payload == "[DONE]":
+                        break
+                    chunk = json.loads(payload)
+                    if chunk.get("usage"):
+                        self.record_token_usage(chunk["usage"])
+                    choices = chunk.get("choices") or [{}]
+                    delta = choices[0].get("delta", {}).get("content")
+                    if delta:
+                        if not full_response:
+                            record_stage("llm_first_token", started)
+                        full_response.append(delta)
+                        yield delta
+                record_stage("llm", started)
+                self.cache_response(conversation_id, text, "".join(full_response), interrupted,
+                                    time.perf_counter() - started)
+            
+        except UpstreamSaturatedError:
+            logger.warning("⚠️ AI stream shed: no LLM slot within %ss", UPSTREAM_QUEUE_TIMEOUT_SECONDS)
+            yield "I'm experiencing a small hiccup, but I'm absolutely committed to helping you learn. Let's try that again."
+        except Exception as e:
+            metrics.upstream_errors.inc(1, "openai")
+            logger.error("AI streaming error: %s", e)
+            if not full_response:
+                yield "I'm experiencing a small hiccup, but I'm absolutely committed to helping you learn. Let's try that again."
+        finally:
+            if full_response and conversation_id in self.conversation_contexts:
+                self.conversation_contexts[conversation_id].append("assistant", "".join(full_response))
+
+    def cache_response(self, conversation_id: str, text: str, response: str, interrupted: bool, latency: float):
+        """Share a completed answer with other students on the same unit"""
+        self.response_cache.record_llm_latency(latency)
+        conversation_context = self.conversation_contexts.get(conversation_id)
+        if conversation_context is not None and not interrupted:
+            self.response_cache.store(conversation_context.system_key, text, response, latency, conversation_id)
+    
+    def record_prompt_size(self, prompt_tokens: int):
+        totals = self.prompt_token_totals
+        totals["requests"] += 1
+        totals["prompt_tokens"] += prompt_tokens
+        totals["last_prompt_tokens"] = prompt_tokens
+        metrics.prompt_tokens.observe(prompt_tokens)
+        trace = current_trace.get()
+        if trace is not None:
+            trace.prompt_tokens = prompt_tokens
+        logger.info("📏 Prompt size: %d tokens", prompt_tokens)
+    
+    def get_context_stats(self) -> dict:
+        contexts = list(self.conversation_contexts.values())
+        totals = self.prompt_token_totals
+        return {
+            "tokenizer": self.token_counter.method,
+            "history_budget_tokens": CONTEXT_HISTORY_TOKEN_BUDGET,
+            "summary_max_tokens": CONTEXT_SUMMARY_MAX_TOKENS,
+            "requests": totals["requests"],
+            "avg_prompt_tokens": round(totals["prompt_tokens"] / totals["requests"], 1) if totals["requests"] else 0,
+            "last_prompt_tokens": totals["last_prompt_tokens"],
+            "summarized_conversations": sum(1 for context in contexts if context.summary_lines),
+            "folded_messages": sum(context.folded_messages for context in contexts)
+        }
+    
+    def record_token_usage(self, usage: dict):
+        metrics.llm_tokens.inc(usage.get("prompt_tokens", 0), "prompt")
+        metrics.llm_tokens.inc(usage.get("completion_tokens", 0), "completion")
+
+    async def synthesize_speech(self, text: str, voice_id: str = None,
+                                audio_format: AudioFormat = None) -> Union[bytes, memoryview]:
+        """Cost-optimized speech synthesis with excellent quality; disk cache hits are memoryviews"""
         try:
             self.total_requests += 1
             
-            logger.info(f"🎤 Cost-optimized synthesis: '{text}' with voice: {voice_id}")
+            logger.log(CONTENT_LOG_LEVEL, "🎤 Cost-optimized synthesis: '%s' with voice: %s", text, voice_id)
             
             if not text or not text.strip():
                 logger.error("Empty text provided for synthesis")
@@ -584,17 +3218,30 @@ class UltraSensitiveVoiceProcessor:
                 return b""
             
             voice_config = self.get_cost_optimized_voice_config(voice_id)
-            cache_key_str = f"{voice_config['name']}:{voice_config['language_code']}"
+            audio_format = audio_format or DEFAULT_AUDIO_FORMAT
+            cache_key_str = f"{voice_config['name']}:{voice_config['language_code']}{audio_format.cache_suffix}"
             
             # Check cache first
             if USE_VOICE_CACHE:
                 cache_key = self.get_cache_key(text, cache_key_str)
-                if cache_key in self.voice_cache:
+                cached_audio = self.voice_cache.get(cache_key, voice_config["name"])
+                if cached_audio is not None:
                     self.cache_hits += 1
-                    logger.info(f"Voice cache hit! Rate: {self.cache_hits/self.total_requests:.2%}")
-                    return self.voice_cache[cache_key]
+                    metrics.tts_cache_hits.inc(1, "memory")
+                    logger.info("Voice cache hit! Rate: %.2f%%", 100 * self.cache_hits / self.total_requests)
+                    return cached_audio
+                
+                # Shared disk tier - the index lookup blocks, so it runs off the loop. Hits stay zero-copy:
+                # the view into the segment mapping goes straight to send_audio_segment, which releases it
+                if self.disk_cache:
+                    cached_view = await asyncio.get_running_loop().run_in_executor(None, self.disk_cache.get, cache_key)
+                    if cached_view is not None:
+                        self.cache_hits += 1
+                        metrics.tts_cache_hits.inc(1, "disk")
+                        logger.info("Disk cache hit! Rate: %.2f%%", 100 * self.cache_hits / self.total_requests)
+                        return cached_view
             
-            logger.info(f"Using cost-optimized voice: {voice_config}")
+            logger.debug("Using cost-optimized voice: %s", voice_config)
             
             # Determine emotional state for optimal naturalness
             emotional_state = self.analyze_content_emotion(text) if USE_EMOTIONAL_VARIANCE else "explanatory"
@@ -606,13 +3253,13 @@ class UltraSensitiveVoiceProcessor:
                 
                 if ssml_text.startswith('<speak>'):
                     synthesis_input = texttospeech.SynthesisInput(ssml=ssml_text)
-                    logger.info(f"Using ultra-natural SSML with {emotional_state} emotion")
+                    logger.info("Using ultra-natural SSML with %s emotion", emotional_state)
                 else:
                     synthesis_input = texttospeech.SynthesisInput(text=ssml_text)
                     logger.info("Using enhanced plain text")
                     
             except Exception as ssml_error:
-                logger.warning(f"SSML generation failed: {ssml_error}, using plain text")
+                logger.warning("SSML generation failed: %s, using plain text", ssml_error)
                 synthesis_input = texttospeech.SynthesisInput(text=text)
             
             # Build the voice request
@@ -622,52 +3269,46 @@ class UltraSensitiveVoiceProcessor:
                 ssml_gender=voice_config["ssml_gender"]
             )
             
-            # High-quality audio configuration optimized for cost-effectiveness
-            audio_config = texttospeech.AudioConfig(
-                audio_encoding=texttospeech.AudioEncoding.MP3,
-                speaking_rate=0.92,  # Slightly slower for clarity
-                pitch=1.5,           # Optimal pitch for engagement
-                volume_gain_db=6.0,  # Good volume boost
-                sample_rate_hertz=24000,  # High quality
-                effects_profile_id=["headphone-class-device"]
-            )
+            # Encoding, rate and effects profile follow the conversation's negotiated format
+            audio_config = audio_format.audio_config()
             
             # Perform synthesis
             try:
-                logger.info(f"Performing {voice_config['quality']} synthesis")
-                response = self.tts_client.synthesize_speech(
-                    input=synthesis_input,
-                    voice=voice,
-                    audio_config=audio_config
+                logger.info("Performing %s synthesis as %s", voice_config["quality"], audio_format)
+                started = time.perf_counter()
+                response = await self.policies["google_tts"].call(
+                    lambda: self.tts_client.synthesize(synthesis_input, voice, audio_config)
                 )
+                record_stage("tts", started)
+                metrics.tts_characters.inc(len(text), voice_config["name"])
                 
                 audio_data = response.audio_content
-                logger.info(f"✅ Audio synthesized successfully: {len(audio_data)} bytes")
+                logger.info("✅ Audio synthesized successfully: %d bytes", len(audio_data))
                 
             except Exception as tts_error:
-                logger.error(f"❌ Synthesis failed: {tts_error}")
+                metrics.upstream_errors.inc(1, "google_tts")
+                logger.error("❌ Synthesis failed: %s", tts_error)
                 return b""
             
             # Validate audio quality
             if not audio_data or len(audio_data) < 500:
-                logger.error(f"❌ Audio validation failed: {len(audio_data) if audio_data else 0} bytes")
+                logger.error("❌ Audio validation failed: %d bytes", len(audio_data) if audio_data else 0)
                 return b""
             
             # Cache responses for performance
             if USE_VOICE_CACHE and len(text) < 300:
                 cache_key = self.get_cache_key(text, cache_key_str)
-                self.voice_cache[cache_key] = audio_data
-                if len(self.voice_cache) > 100:
-                    oldest_keys = list(self.voice_cache.keys())[:20]
-                    for key in oldest_keys:
-                        del self.voice_cache[key]
-                    logger.info("Voice cache optimized")
+                self.voice_cache.put(cache_key, voice_config["name"], audio_data)
+                if self.disk_cache:
+                    write = asyncio.get_running_loop().run_in_executor(None, self.disk_cache.put, cache_key, audio_data)
+                    self.pending_cache_writes.add(write)
+                    write.add_done_callback(self.pending_cache_writes.discard)
             
-            logger.info(f"✅ Synthesis completed: {len(audio_data)} bytes")
+            logger.info("✅ Synthesis completed: %d bytes", len(audio_data))
             return audio_data
                         
         except Exception as e:
-            logger.error(f"❌ TTS critical error: {e}")
+            logger.error("❌ TTS critical error: %s", e)
             logger.error(traceback.format_exc())
             return b""
     
@@ -705,9 +3346,7 @@ CONVERSATION STYLE:
 
 Your goal is to create an engaging learning experience through natural, flowing conversation."""
             
-            self.conversation_contexts[conversation_id] = deque([
-                {"role": "system", "content": system_prompt}
-            ], maxlen=MAX_CONTEXT_MESSAGES + 1)
+            self.set_conversation_context(conversation_id, system_prompt)
             
             if unit_content and len(unit_content.strip()) > 10:
                 return f"Hello! I'm absolutely thrilled to be your {subject} tutor today. We're going to explore {unit_title} together, and I'm genuinely excited to share these concepts with you. Are you ready to dive into some really engaging learning?"
@@ -725,16 +3364,70 @@ Your goal is to create an engaging learning experience through natural, flowing
             
             Your mission is to make every learning interaction genuinely exciting and memorable."""
             
-            self.conversation_contexts[conversation_id] = deque([
-                {"role": "system", "content": system_prompt}
-            ], maxlen=MAX_CONTEXT_MESSAGES + 1)
+            self.set_conversation_context(conversation_id, system_prompt)
             
-            return "Hello there! I'm absolutely delighted to meet you and genuinely excited about our learning journey together. What fascinating topic would you like to explore today?"
+            return self.default_introduction
+    
+    def get_warmup_phrases(self) -> list:
+        """Fixed phrases whose audio is worth pre-synthesizing"""
+        return [self.default_introduction] + list(self.common_responses.values())
+    
+    async def warm_up(self, concurrency: int = WARMUP_CONCURRENCY) -> dict:
+        """Pre-synthesize canned phrases for every configured voice and warm-up format with bounded parallelism"""
+        audio_formats = [AudioFormat.preset(name) for name in WARMUP_AUDIO_FORMATS if name in AUDIO_FORMAT_PRESETS]
+        jobs = [(voice_id, phrase, audio_format) for audio_format in audio_formats or [DEFAULT_AUDIO_FORMAT]
+                for voice_id in self.voice_map for phrase in self.get_warmup_phrases()]
+        status = self.warmup_status = {
+            "state": "running",
+            "total": len(jobs),
+            "completed": 0,
+            "failed": 0,
+            "started_at": datetime.utcnow().isoformat(),
+            "duration_ms": None
+        }
+        semaphore = asyncio.Semaphore(max(concurrency, 1))
+        started = time.perf_counter()
+        logger.info(f"🔥 Warming up {len(jobs)} phrases across {len(self.voice_map)} voices")
+        
+        async def warm(voice_id: str, phrase: str, audio_format: AudioFormat):
+            async with semaphore:
+                audio = await self.synthesize_speech(phrase, voice_id, audio_format)
+            status["completed" if audio else "failed"] += 1
+            done = status["completed"] + status["failed"]
+            if done % 25 == 0 or done == status["total"]:
+                logger.info(f"🔥 Warm-up progress: {done}/{status['total']} ({status['failed']} failed)")
+        
+        await asyncio.gather(*(warm(*job) for job in jobs))
+        status["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        status["state"] = "done"
+        logger.info(f"✅ Warm-up finished in {status['duration_ms']}ms: {status['completed']} synthesized, {status['failed']} failed")
+        return status
+    
+    def set_conversation_context(self, conversation_id: str, system_prompt: str = None, context: ConversationContext = None):
+        """Install a conversation's LLM context, releasing the one it replaces"""
+        previous = self.conversation_contexts.pop(conversation_id, None)
+        if context is None:
+            context = ConversationContext(system_prompt, self.token_counter, self.prompt_store)
+        self.conversation_contexts[conversation_id] = context
+        if previous:
+            previous.close()
+    
+    def share_unit_content(self, conversation_id: str, context: dict) -> dict:
+        """Swap context["unitContent"] for the shared stored copy"""
+        previous = self.unit_content_keys.pop(conversation_id, None)
+        unit_content = context.get("unitContent") if context else None
+        if unit_content:
+            self.unit_content_keys[conversation_id], context["unitContent"] = self.prompt_store.acquire(unit_content)
+        if previous:
+            self.prompt_store.release(previous)
+        return context
     
     def clear_conversation_context(self, conversation_id: str):
-        """Clear conversation context"""
+        """Clear conversation context and release its shared prompt text"""
         if conversation_id in self.conversation_contexts:
-            del self.conversation_contexts[conversation_id]
+            self.conversation_contexts.pop(conversation_id).close()
+        if conversation_id in self.unit_content_keys:
+            self.prompt_store.release(self.unit_content_keys.pop(conversation_id))
             
     def get_stats(self) -> dict:
         """Get optimization statistics"""
@@ -743,17 +3436,311 @@ Your goal is to create an engaging learning experience through natural, flowing
             "total_requests": self.total_requests,
             "cache_hit_rate": f"{self.cache_hits/max(self.total_requests, 1):.2%}",
             "cached_phrases": len(self.voice_cache),
-            "active_conversations": len(self.conversation_contexts)
+            "voice_cache": self.voice_cache.get_stats(),
+            "disk_cache": self.disk_cache.get_stats() if self.disk_cache else None,
+            "ssml_cache": self.ssml_builder.get_stats(),
+            "llm_context": self.get_context_stats(),
+            "prompt_store": self.prompt_store.get_stats(),
+            "response_cache": self.response_cache.get_stats(),
+            "upstream_policies": {name: policy.get_stats() for name, policy in self.policies.items()},
+            "active_conversations": len(self.conversation_contexts),
+            "tts_engine": self.tts_client.get_stats() if self.tts_client else None
         }
 
+class StreamingTranscriptionSession:
+    """Persistent Deepgram live-transcription connection for one conversation"""
+    
+    # Endpointing and interim results only apply to the streaming API
+    PARAMS = {
+        "model": "nova-2",
+        "language": "en",
+        "smart_format": "true",
+        "punctuate": "true",
+        "filler_words": "true",
+        "interim_results": "true",
+        "endpointing": "300",
+        "utterance_end_ms": "1000",
+        "vad_events": "true"
+    }
+    
+    def __init__(self, processor: UltraSensitiveVoiceProcessor, on_transcript, on_endpoint, audio_params: dict = None):
+        self.processor = processor
+        self.audio_params = audio_params or {}  # Raw PCM needs its encoding spelled out
+        self.on_transcript = on_transcript
+        self.on_endpoint = on_endpoint
+        self.ws = None
+        self.final_segments = []
+        self.receiver_task = None
+        self.keepalive_task = None
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.last_audio_at = time.monotonic()
+    
+    @property
+    def is_open(self) -> bool:
+        return self.ws is not None and not self.ws.closed
+    
+    async def start(self):
+        """Open the live connection and start the receive and keep-alive loops"""
+        session = await self.processor.get_session("deepgram_live")
+        self.ws = await session.ws_connect(
+            DEEPGRAM_STREAM_URL,
+            params={**self.PARAMS, **self.audio_params},
+            headers={"Authorization": f"Token {DEEPGRAM_API_KEY}"}
+        )
+        self.receiver_task = asyncio.create_task(self._receive_loop())
+        self.keepalive_task = asyncio.create_task(self._keepalive_loop())
+        logger.info("🔗 Streaming STT session opened")
+    
+    async def send_audio(self, audio_data: bytes):
+        """Forward an audio frame to the live connection"""
+        await self.ws.send_bytes(audio_data)
+        self.frames_sent += 1
+        self.bytes_sent += len(audio_data)
+        self.last_audio_at = time.monotonic()
+    
+    async def _receive_loop(self):
+        try:
+            async for message in self.ws:
+                if message.type != aiohttp.WSMsgType.TEXT:
+                    continue
+                result = json.loads(message.data)
+                result_type = result.get("type")
+                
+                if result_type == "Results":
+                    alternatives = result.get("channel", {}).get("alternatives", [])
+                    transcript = alternatives[0].get("transcript", "").strip() if alternatives else ""
+                    is_final = result.get("is_final", False)
+                    
+                    if transcript:
+                        if is_final:
+                            self.final_segments.append(transcript)
+                            await self.on_transcript(" ".join(self.final_segments), True)
+                        else:
+                            await self.on_transcript(" ".join(self.final_segments + [transcript]), False)
+                    
+                    if result.get("speech_final"):
+                        await self._endpoint()
+                elif result_type == "UtteranceEnd":
+                    await self._endpoint()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("❌ Streaming STT receive error: %s", e)
+    
+    async def _endpoint(self):
+        utterance = " ".join(self.final_segments).strip()
+        self.final_segments = []
+        if utterance:
+            logger.log(CONTENT_LOG_LEVEL, "🏁 Streaming STT endpoint: '%s'", utterance)
+            await self.on_endpoint(utterance)
+    
+    async def _keepalive_loop(self):
+        # Deepgram closes idle streams after ~10s without audio
+        while self.is_open:
+            await asyncio.sleep(STT_KEEPALIVE_SECONDS)
+            if self.is_open and time.monotonic() - self.last_audio_at >= STT_KEEPALIVE_SECONDS:
+                await self.ws.send_str(json.dumps({"type": "KeepAlive"}))
+    
+    async def close(self):
+        """Flush pending audio and close the live connection"""
+        if self.is_open:
+            try:
+                await self.ws.send_str(json.dumps({"type": "CloseStream"}))
+            except Exception:
+                pass
+        for task in (self.keepalive_task, self.receiver_task):
+            if task and not task.done():
+                task.cancel()
+        if self.ws is not None:
+            await self.ws.close()
+        logger.info(f"🔌 Streaming STT session closed ({self.frames_sent} frames, {self.bytes_sent} bytes)")
+
 class UltraSensitiveVoiceServer:
     def __init__(self):
         self.active_conversations: Dict[str, Any] = {}
         self.processor = UltraSensitiveVoiceProcessor()
+        self.state_backend = create_state_backend()
+        self.saved_prompts = {}  # PromptStore digest -> until when the state backend is known to hold it
+        self.pending_states = {}  # conversation_id -> newest (state, prompts) snapshot not yet written
+        self.persist_tasks = {}   # conversation_id -> task writing its pending snapshots
+        self.persist_failures = 0
+        self.admission = AdmissionController(MAX_CONVERSATIONS, self.processor.limiters, self.processor.tts_client)
+        self.warmup_task = None
+        self.closed_queue_totals = {"dropped": 0, "merged": 0}
+        self.closed_assembler_totals = {"chunks_received": 0, "utterances": 0, "discarded": 0, "gated": 0,
+                                        "trimmed_bytes": 0, "stt_calls_saved": 0}
+        # Not ready until the first warm-up has finished (re-warming keeps serving)
+        self.is_ready = not WARMUP_ON_STARTUP
+        self.drain_task = None
+        self.drain_status = {"state": "serving"}
+        self.previous_sigterm_handler = None
+        metrics.add_gauge("voice_active_conversations", "Open conversation WebSockets", lambda: len(self.active_conversations))
+        metrics.add_gauge("voice_inflight_turns", "Turns currently being processed",
+                          lambda: sum(1 for data in self.active_conversations.values() if data["turn_queue"].busy))
+        for name, pool in self.processor.upstreams.items():
+            if pool.limit:
+                metrics.add_gauge(f"voice_upstream_{name}_connections_in_use", f"Open {name} connections serving a request",
+                                  lambda pool=pool: pool.get_stats()["in_use"])
+        metrics.add_gauge("voice_accepting_conversations", "1 while admission control accepts new conversations",
+                          lambda: int(self.admission.rejection_reason() is None))
+        for name, limiter in self.processor.limiters.items():
+            metrics.add_gauge(f"voice_upstream_{name}_load", f"{name.upper()} calls running or queued per slot",
+                              lambda limiter=limiter: limiter.load)
+        metrics.add_gauge("voice_tts_inflight", "Google TTS calls running on the engine",
+                          lambda: self.processor.tts_client.in_flight if self.processor.tts_client else 0)
+        metrics.add_gauge("voice_draining", "1 while the server drains before exiting", lambda: int(self.admission.draining))
+    
+    def start_warmup(self):
+        """Start a background warm-up unless one is already running"""
+        if self.warmup_task is None or self.warmup_task.done():
+            self.processor.warmup_status["state"] = "running"
+            self.warmup_task = asyncio.create_task(self.processor.warm_up())
+            self.warmup_task.add_done_callback(self._on_warmup_done)
+        return self.processor.warmup_status
+    
+    def _on_warmup_done(self, task: asyncio.Task):
+        if not task.cancelled() and task.exception():
+            logger.error(f"❌ Warm-up failed: {task.exception()}")
+            self.processor.warmup_status["state"] = "failed"
+        self.is_ready = True
+    
+    def install_drain_signal_handler(self):
+        """Make SIGTERM drain first; the server's own handler runs once the drain is done"""
+        try:
+            self.previous_sigterm_handler = signal.signal(signal.SIGTERM, self._on_sigterm)
+        except ValueError:  # Not the main thread (embedded or test servers)
+            logger.info("SIGTERM drain unavailable outside the main thread; use POST /admin/drain")
+    
+    def _on_sigterm(self, signum, frame):
+        loop = asyncio.get_event_loop()
+        if self.drain_task is not None:
+            # A second SIGTERM means the orchestrator has stopped waiting
+            loop.call_soon_threadsafe(self._request_exit)
+        else:
+            loop.call_soon_threadsafe(self.start_drain, "sigterm")
+    
+    def start_drain(self, trigger: str) -> dict:
+        """Begin draining unless a drain is already running"""
+        if self.drain_task is None:
+            self.admission.draining = True  # Refuse new sockets from this moment, not the task's first step
+            self.drain_status = {"state": "draining", "trigger": trigger}
+            self.drain_task = asyncio.create_task(self.drain(trigger))
+        return self.drain_status
+    
+    async def drain(self, trigger: str) -> dict:
+        """Stop admitting, let running turns finish within DRAIN_TIMEOUT_SECONDS, hand clients a reconnect hint, flush, exit"""
+        started = time.perf_counter()
+        deadline = started + DRAIN_TIMEOUT_SECONDS
+        status = self.drain_status = {
+            "state": "draining",
+            "trigger": trigger,
+            "started_at": datetime.utcnow().isoformat(),
+            "deadline_seconds": DRAIN_TIMEOUT_SECONDS,
+            "conversations": len(self.active_conversations),
+            "idle": 0,
+            "finished": 0,
+            "cut_off": 0,
+            "failed": 0,
+            "duration_ms": None
+        }
+        self.admission.draining = True
+        logger.warning(f"🚰 Draining {status['conversations']} conversations ({trigger}), deadline {DRAIN_TIMEOUT_SECONDS}s")
+        
+        # Sockets admitted just before the drain began register late, so sweep until every slot is released
+        handled = set()
+        cleanup_deadline = deadline + DRAIN_CLEANUP_SECONDS
+        while True:
+            pending = [cid for cid in self.active_conversations if cid not in handled]
+            if not pending:
+                if self.admission.active <= 0 or time.perf_counter() >= cleanup_deadline:
+                    break
+                await asyncio.sleep(0.05)
+                continue
+            handled.update(pending)
+            status["conversations"] = len(handled)
+            outcomes = await asyncio.gather(*(self._drain_conversation(cid, deadline) for cid in pending),
+                                            return_exceptions=True)
+            for outcome in outcomes:
+                if isinstance(outcome, BaseException):
+                    logger.error(f"❌ Drain failed for a conversation: {outcome}")
+                    outcome = "failed"
+                status[outcome] += 1
+        
+        status["state"] = "flushing"
+        await self.flush()
+        status["state"] = "drained"
+        status["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        logger.warning(f"✅ Drained in {status['duration_ms']}ms: {status['finished']} turns finished, "
+                       f"{status['idle']} idle, {status['cut_off']} cut off")
+        self._request_exit()
+        return status
+    
+    async def _drain_conversation(self, conversation_id: str, deadline: float) -> str:
+        """Let one conversation finish its turn, then persist it and close it with a reconnect hint"""
+        conversation_data = self.active_conversations.get(conversation_id)
+        if conversation_data is None:
+            return "idle"
+        turn_queue = conversation_data["turn_queue"]
+        # Speech already buffered becomes one last turn rather than being dropped
+        conversation_data["assembler"].flush("drain")
+        busy = turn_queue.busy or len(turn_queue) > 0
+        finished = await turn_queue.finish(max(deadline - time.perf_counter(), 0))
+        introduction_task = conversation_data.get("introduction_task")
+        if introduction_task and not introduction_task.done():
+            busy = True
+            _, unfinished = await asyncio.wait({introduction_task}, timeout=max(deadline - time.perf_counter(), 0))
+            finished = finished and not unfinished
+        if not finished:
+            await self.interrupt_turn(conversation_id)
+        
+        await self.persist_conversation(conversation_id)
+        reconnect_after_ms = int(DRAIN_RECONNECT_DELAY_MS * (1 + random.random()))
+        try:
+            await conversation_data["websocket"].send_json({
+                "type": "reconnect",
+                "reason": "server_draining",
+                "conversation_id": conversation_id,
+                "retry_after_ms": reconnect_after_ms
+            })
+            await conversation_data["websocket"].close(code=WS_CLOSE_SERVICE_RESTART, reason="server draining")
+        except Exception as e:
+            logger.debug("Drained socket already closed: %s", e)
+        if not finished:
+            return "cut_off"
+        return "finished" if busy else "idle"
+    
+    async def flush(self):
+        """Write out what would otherwise be lost on exit: disk cache writes and the final metrics"""
+        await self.processor.flush_caches()
+        await self.flush_states(DRAIN_CLEANUP_SECONDS)
+        if METRICS_ENABLED and DRAIN_METRICS_FILE:
+            try:
+                with open(DRAIN_METRICS_FILE, "w", encoding="utf-8") as snapshot:
+                    snapshot.write(metrics.render())
+            except OSError as e:
+                logger.error(f"❌ Failed to write metrics snapshot: {e}")
+        logger.info("📊 Final totals: %d turns, %d conversations admitted, %d rejected",
+                    sum(metrics.turns.values.values()), self.admission.admitted, sum(self.admission.rejected.values()))
+    
+    def _request_exit(self):
+        """Hand SIGTERM back to the server (uvicorn) so it shuts down the now-empty process"""
+        handler = self.previous_sigterm_handler
+        if handler is None:
+            logger.info("Drain complete; no SIGTERM handler to hand back to, process left running")
+            return
+        self.previous_sigterm_handler = None
+        signal.signal(signal.SIGTERM, handler)
+        signal.raise_signal(signal.SIGTERM)
 
     async def create_conversation(self, conversation_id: str, websocket: WebSocket):
         """Create a new ultra-sensitive conversation session"""
         try:
+            turn_queue = TurnQueue(
+                lambda audio, transcript, queued_at: self.process_audio(
+                    conversation_id, audio, transcript=transcript, queued_at=queued_at
+                )
+            )
             self.active_conversations[conversation_id] = {
                 "websocket": websocket,
                 "start_time": datetime.utcnow(),
@@ -761,8 +3748,21 @@ class UltraSensitiveVoiceServer:
                 "is_processing": False,
                 "voice_id": None,
                 "context": None,
+                "audio_format": DEFAULT_AUDIO_FORMAT,
+                "audio_framing": False,
+                "input_audio": None,  # {"encoding": "LINEAR16", "sample_rate_hertz": ...} in PCM input mode
+                "audio_turn": 0,
+                "audio_seq": 0,
+                "stream_responses": STREAM_RESPONSES,
+                "stt_streaming": STT_STREAMING,
+                "stt_session": None,
+                "turn_queue": turn_queue,
+                "assembler": UtteranceAssembler(self._enqueue_utterance(conversation_id, turn_queue)),
                 "was_interrupted": False,
-                "quality_level": "ultra_sensitive"
+                "audio_streaming": False,
+                "introduction_task": None,
+                "quality_level": "ultra_sensitive",
+                "resume_token": secrets.token_urlsafe(24)  # Proof of ownership when reconnecting
             }
             logger.info(f"✅ Created ultra-sensitive conversation: {conversation_id}")
             return True
@@ -770,6 +3770,340 @@ class UltraSensitiveVoiceServer:
             logger.error(f"❌ Error creating conversation: {e}")
             raise
 
+    # Conversation fields that survive reconnects to any worker
+    PERSISTED_FIELDS = ("voice_id", "context", "message_count", "stream_responses", "stt_streaming", "quality_level",
+                        "audio_framing", "input_audio", "resume_token")
+    
+    async def send_audio_start(self, conversation_data: dict):
+        """Open an audio stream to the client; frames sent until audio_end carry its turn id"""
+        conversation_data["audio_streaming"] = True
+        conversation_data["audio_turn"] = (conversation_data["audio_turn"] + 1) & 0xFFFFFFFF
+        conversation_data["audio_seq"] = 0
+        await conversation_data["websocket"].send_json({
+            "type": "audio_start",
+            "mime_type": conversation_data["audio_format"].mime_type,
+            "turn_id": conversation_data["audio_turn"],
+            "framed": conversation_data["audio_framing"]
+        })
+    
+    async def send_audio_segment(self, conversation_data: dict, audio: Union[bytes, memoryview]):
+        """Send one synthesized segment in the conversation's negotiated format, framed if the client opted in
+        
+        A memoryview (a disk cache hit) is sent without copying and released afterwards, so
+        compaction can unmap its segment.
+        """
+        websocket = conversation_data["websocket"]
+        size = len(audio)
+        try:
+            if not conversation_data["audio_framing"]:
+                await websocket.send_bytes(audio)
+            else:
+                frames = 0
+                for frame in frame_audio(audio, conversation_data["audio_turn"], conversation_data["audio_seq"]):
+                    if frames:
+                        await asyncio.sleep(0)  # Let other conversations' frames interleave
+                    await self._send_with_backpressure(websocket, frame)
+                    frames += 1
+                conversation_data["audio_seq"] += frames
+                metrics.audio_frames_sent.inc(frames)
+        finally:
+            if isinstance(audio, memoryview):
+                audio.release()
+        metrics.audio_bytes_sent.inc(size, conversation_data["audio_format"].encoding)
+    
+    async def _send_with_backpressure(self, websocket: WebSocket, data: bytes):
+        # uvicorn holds a send while the socket's write buffer is above its high-water mark,
+        # so awaiting each frame paces delivery to what the client actually drains
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(websocket.send_bytes(data), AUDIO_SEND_STALL_SECONDS)
+        except asyncio.TimeoutError:
+            raise ConnectionError(f"client drained no audio for {AUDIO_SEND_STALL_SECONDS}s") from None
+        waited = time.perf_counter() - started
+        if waited > AUDIO_SEND_SLOW_SECONDS:
+            metrics.audio_backpressure_seconds.observe(waited)
+    
+    async def set_audio_framing(self, conversation_id: str, enabled: bool):
+        """Switch a conversation between framed and whole-segment binary audio"""
+        conversation_data = self.active_conversations[conversation_id]
+        conversation_data["audio_framing"] = enabled
+        await conversation_data["websocket"].send_json({
+            "type": "audio_framing",
+            "enabled": enabled,
+            "version": AUDIO_FRAME_VERSION,
+            "header_bytes": AUDIO_FRAME_HEADER.size,
+            "frame_bytes": AUDIO_FRAME_BYTES
+        })
+    
+    async def set_audio_format(self, conversation_id: str, requested) -> AudioFormat:
+        """Apply a client's audio_format request and acknowledge what was actually chosen"""
+        conversation_data = self.active_conversations[conversation_id]
+        audio_format, adjusted = AudioFormat.negotiate(requested, conversation_data["audio_format"])
+        conversation_data["audio_format"] = audio_format
+        if adjusted:
+            logger.warning("⚠️ Audio format request adjusted for %s: %s", conversation_id, "; ".join(adjusted))
+        logger.info("🎚️ Audio format for %s: %s", conversation_id, audio_format)
+        await conversation_data["websocket"].send_json({
+            "type": "audio_format",
+            **audio_format.to_dict(),
+            "mime_type": audio_format.mime_type,
+            "adjusted": adjusted
+        })
+        return audio_format
+    
+    async def send_audio_end(self, conversation_data: dict, interrupted: bool = False):
+        """Close the client's audio stream if one is open"""
+        if not conversation_data.get("audio_streaming"):
+            return
+        conversation_data["audio_streaming"] = False
+        message = {"type": "audio_end"}
+        if interrupted:
+            message["interrupted"] = True
+        await conversation_data["websocket"].send_json(message)
+    
+    async def interrupt_turn(self, conversation_id: str):
+        """Barge-in: cancel the in-flight LLM, TTS and audio send and free the conversation"""
+        conversation_data = self.active_conversations.get(conversation_id)
+        if conversation_data is None:
+            return
+        
+        started = time.perf_counter()
+        conversation_data["was_interrupted"] = True
+        tasks = [task for task in (
+            conversation_data["turn_queue"].cancel_current(),
+            conversation_data.get("introduction_task")
+        ) if task is not None and not task.done()]
+        for task in tasks:
+            task.cancel()
+        
+        # Cancellation propagates into aiohttp (closing the upstream request) and the TTS engine
+        # (abandoning the call, whose slot frees when it returns); don't let a slow unwind hold the conversation hostage
+        if tasks:
+            _, still_running = await asyncio.wait(tasks, timeout=BARGE_IN_TIMEOUT_SECONDS)
+            if still_running:
+                # The conversation stays busy: the cancelled turn clears is_processing when it
+                # really ends, and the turn queue starts nothing new until then
+                metrics.interrupt_timeouts.inc()
+                logger.warning(f"⚠️ {len(still_running)} task(s) still unwinding after barge-in: {conversation_id}")
+        
+        await self.send_audio_end(conversation_data, interrupted=True)
+        latency_ms = round((time.perf_counter() - started) * 1000, 1)
+        await conversation_data["websocket"].send_json({
+            "type": "ai_interrupted",
+            "cancelled_tasks": len(tasks),
+            "latency_ms": latency_ms
+        })
+        logger.info(f"🛑 AI interrupted: {conversation_id} ({len(tasks)} tasks cancelled in {latency_ms}ms)")
+    
+    @staticmethod
+    def _enqueue_utterance(conversation_id: str, turn_queue: TurnQueue):
+        def enqueue(utterance: bytes):
+            if not turn_queue.put_audio(utterance):
+                logger.warning("⚠️ Turn queue %s, dropped utterance: %s",
+                               "full" if turn_queue.accepting else "draining", conversation_id)
+        return enqueue
+    
+    def receive_audio(self, conversation_id: str, audio_data: bytes):
+        """Route a non-streaming audio chunk to the utterance assembler or straight to the turn queue"""
+        conversation_data = self.active_conversations[conversation_id]
+        if UTTERANCE_ASSEMBLY or conversation_data["input_audio"]:
+            conversation_data["assembler"].add_chunk(audio_data)
+        elif len(audio_data) > 200:  # Reduced from 300
+            turn_queue = conversation_data["turn_queue"]
+            if not turn_queue.put_audio(audio_data):
+                logger.warning("⚠️ Turn queue %s, dropped audio frame: %s", "full" if turn_queue.accepting else "draining",
+                               conversation_id, extra={"sample": "queue_full"})
+        else:
+            logger.info("⚠️ Audio too small, skipping: %d bytes", len(audio_data), extra={"sample": "audio_frame"})
+    
+    def configure_input_audio(self, conversation_id: str, requested) -> dict:
+        """Switch a conversation between WebM chunks and gated PCM16 input; returns the acknowledgement"""
+        conversation_data = self.active_conversations[conversation_id]
+        if isinstance(requested, str):
+            requested = {"encoding": requested}
+        if not isinstance(requested, dict):
+            requested = {}
+        encoding = str(requested.get("encoding", "WEBM_OPUS")).upper()
+        sample_rate = requested.get("sample_rate_hertz", 16000)
+        message = {"type": "input_audio", "encoding": "WEBM_OPUS"}
+        gate = None
+        if encoding in ("LINEAR16", "PCM16"):
+            if np is None:
+                message["error"] = "PCM input is not available on this server"
+            elif sample_rate not in PCM_SAMPLE_RATES:
+                message["error"] = f"Unsupported PCM sample rate {sample_rate}, use one of {list(PCM_SAMPLE_RATES)}"
+            else:
+                gate = SpeechGate(sample_rate)
+                message.update(encoding="LINEAR16", sample_rate_hertz=sample_rate, gate=gate.get_settings())
+        elif encoding != "WEBM_OPUS":
+            message["error"] = f"Unsupported input encoding {encoding}"
+        
+        # Pending audio is in the old format, so the assembler is replaced rather than reconfigured
+        previous = conversation_data["assembler"]
+        previous.close()
+        for name, value in previous.get_stats().items():
+            self.closed_assembler_totals[name] += value
+        conversation_data["assembler"] = UtteranceAssembler(
+            self._enqueue_utterance(conversation_id, conversation_data["turn_queue"]), gate
+        )
+        conversation_data["input_audio"] = {"encoding": "LINEAR16", "sample_rate_hertz": sample_rate} if gate else None
+        if "error" in message:
+            logger.warning("⚠️ Input audio request refused for %s: %s", conversation_id, message["error"])
+        logger.info("🎙️ Input audio for %s: %s", conversation_id, conversation_data["input_audio"] or "WebM")
+        return message
+    
+    def get_assembler_stats(self) -> dict:
+        """Aggregate utterance assembly counters across active and closed conversations"""
+        totals = dict(self.closed_assembler_totals)
+        for data in self.active_conversations.values():
+            for name, value in data["assembler"].get_stats().items():
+                totals[name] += value
+        totals["enabled"] = UTTERANCE_ASSEMBLY
+        return totals
+    
+    def get_turn_queue_stats(self) -> dict:
+        """Aggregate turn queue counters across active conversations"""
+        queues = [data["turn_queue"] for data in self.active_conversations.values()]
+        return {
+            "policy": TURN_QUEUE_POLICY,
+            "max_frames": TURN_QUEUE_MAX_FRAMES,
+            "queued_frames": sum(len(queue) for queue in queues),
+            "busy_conversations": sum(1 for queue in queues if queue.busy),
+            "dropped_frames": self.closed_queue_totals["dropped"] + sum(queue.dropped for queue in queues),
+            "merged_frames": self.closed_queue_totals["merged"] + sum(queue.merged for queue in queues)
+        }
+    
+    def snapshot_conversation(self, conversation_id: str) -> Optional[tuple]:
+        """(state, prompt bodies by digest) for the state backend, taken synchronously"""
+        conversation_data = self.active_conversations.get(conversation_id)
+        if conversation_data is None:
+            return None
+        state = {field: conversation_data.get(field) for field in self.PERSISTED_FIELDS}
+        state["start_time"] = conversation_data["start_time"].isoformat()
+        state["audio_format"] = conversation_data["audio_format"].to_dict()
+        processor = self.processor
+        prompts = {}
+        unit_key = processor.unit_content_keys.get(conversation_id)
+        if unit_key and state.get("context"):
+            state["context"] = {key: value for key, value in state["context"].items() if key != "unitContent"}
+            state["unit_content_key"] = unit_key
+            prompts[unit_key] = processor.prompt_store.get(unit_key)
+        conversation_context = processor.conversation_contexts.get(conversation_id)
+        state["llm_context"] = conversation_context.to_state() if conversation_context else None
+        if conversation_context:
+            prompts[conversation_context.system_key] = processor.prompt_store.get(conversation_context.system_key)
+        return state, prompts
+    
+    def persist_in_background(self, conversation_id: str) -> Optional[asyncio.Task]:
+        """Write conversation settings, counters and LLM context through to the state backend without waiting
+        
+        The snapshot is taken now; writes for one conversation never overlap, and
+        snapshots taken while one is in flight collapse into the newest.
+        """
+        snapshot = self.snapshot_conversation(conversation_id)
+        if snapshot is None:
+            return self.persist_tasks.get(conversation_id)
+        self.pending_states[conversation_id] = snapshot
+        task = self.persist_tasks.get(conversation_id)
+        if task is None:
+            task = self.persist_tasks[conversation_id] = asyncio.create_task(self._write_pending_states(conversation_id))
+        return task
+    
+    async def persist_conversation(self, conversation_id: str):
+        """Persist and wait until the state backend has it (or the write failed)"""
+        task = self.persist_in_background(conversation_id)
+        if task is not None:
+            await asyncio.shield(task)
+    
+    async def _write_pending_states(self, conversation_id: str):
+        try:
+            while conversation_id in self.pending_states:
+                state, prompts = self.pending_states.pop(conversation_id)
+                try:
+                    await self.save_prompts(prompts)
+                    await self.state_backend.save(conversation_id, state)
+                except Exception as e:
+                    # The conversation carries on; only a reconnect elsewhere would miss this write
+                    self.persist_failures += 1
+                    logger.error(f"❌ Failed to persist conversation state {conversation_id}: {e!r}")
+        finally:
+            self.persist_tasks.pop(conversation_id, None)
+    
+    async def flush_states(self, timeout: float):
+        """Wait up to timeout for background state writes"""
+        if self.persist_tasks:
+            await asyncio.wait(list(self.persist_tasks.values()), timeout=timeout)
+    
+    async def save_prompts(self, prompts: dict):
+        """Write prompt bodies the backend may not hold yet; each outlives every state saved while it is fresh"""
+        now = time.monotonic()
+        for digest, text in prompts.items():
+            if self.saved_prompts.get(digest, 0) - now < CONVERSATION_STATE_TTL_SECONDS:
+                await self.state_backend.save_prompt(digest, text, 2 * CONVERSATION_STATE_TTL_SECONDS)
+                self.saved_prompts[digest] = now + 2 * CONVERSATION_STATE_TTL_SECONDS
+        if len(self.saved_prompts) > len(prompts) and len(self.saved_prompts) % 100 == 0:
+            for digest in [digest for digest, fresh_until in self.saved_prompts.items() if fresh_until <= now]:
+                del self.saved_prompts[digest]
+    
+    async def load_prompt(self, digest: str) -> Optional[str]:
+        """Prompt text for a persisted digest, from this worker's PromptStore if any conversation holds it"""
+        text = self.processor.prompt_store.find(digest)
+        return text if text is not None else await self.state_backend.load_prompt(digest)
+    
+    async def load_resumable_state(self, conversation_id: str, resume_token: Optional[str]) -> Optional[dict]:
+        """Persisted state for a reconnect, only when the client proves it was issued this conversation"""
+        if not conversation_id or not resume_token or conversation_id in self.active_conversations:
+            return None
+        try:
+            state = await self.state_backend.load(conversation_id)
+        except Exception as e:
+            logger.error(f"❌ Failed to load conversation state {conversation_id}: {e}")
+            return None
+        stored_token = (state or {}).get("resume_token")
+        if not stored_token or not hmac.compare_digest(stored_token.encode(), resume_token.encode()):
+            logger.warning("⚠️ Resume refused for %s: unknown conversation or wrong token", conversation_id)
+            return None
+        try:
+            if state.get("unit_content_key") and state.get("context") is not None:
+                state["context"]["unitContent"] = await self.load_prompt(state["unit_content_key"])
+            if state.get("llm_context") and "system_key" in state["llm_context"]:
+                state["llm_context"]["system"] = await self.load_prompt(state["llm_context"]["system_key"])
+        except Exception as e:
+            logger.error(f"❌ Failed to load conversation prompts {conversation_id}: {e}")
+            return None
+        if state.get("llm_context") and state["llm_context"].get("system") is None:
+            logger.warning("⚠️ Resume refused for %s: its system prompt has expired", conversation_id)
+            return None
+        return state
+    
+    def restore_conversation(self, conversation_id: str, state: dict) -> bool:
+        """Apply previously persisted state to a conversation registered on this worker"""
+        if conversation_id not in self.active_conversations:
+            return False
+        
+        conversation_data = self.active_conversations[conversation_id]
+        for field in self.PERSISTED_FIELDS:
+            if field in state:
+                conversation_data[field] = state[field]
+        if state.get("start_time"):
+            conversation_data["start_time"] = datetime.fromisoformat(state["start_time"])
+        if state.get("audio_format"):
+            conversation_data["audio_format"] = AudioFormat.negotiate(state["audio_format"])[0]
+        if state.get("input_audio"):
+            self.configure_input_audio(conversation_id, state["input_audio"])
+        processor = self.processor
+        processor.share_unit_content(conversation_id, conversation_data.get("context"))
+        if state.get("llm_context"):
+            conversation_context = ConversationContext.from_state(state["llm_context"], processor.token_counter, processor.prompt_store)
+        elif state.get("messages"):
+            conversation_context = ConversationContext.from_messages(state["messages"], processor.token_counter, processor.prompt_store)
+        else:
+            conversation_context = None
+        if conversation_context:
+            processor.set_conversation_context(conversation_id, context=conversation_context)
+        logger.info(f"♻️ Restored conversation {conversation_id} ({len(conversation_context or ())} messages)")
+        return True
+    
     async def send_introduction(self, conversation_id: str):
         """Send ultra-engaging AI introduction"""
         try:
@@ -782,10 +4116,12 @@ class UltraSensitiveVoiceServer:
             voice_id = conversation_data.get("voice_id", "female")
             context = conversation_data.get("context")
             
-            logger.info(f"🎤 Sending ultra-sensitive introduction with voice: {voice_id}")
+            logger.info("🎤 Sending ultra-sensitive introduction with voice: %s", voice_id)
+            trace = TurnTrace(conversation_id, kind="introduction")
+            trace_token = current_trace.set(trace)
             
             intro_text = self.processor.get_introduction(conversation_id, context)
-            logger.info(f"📝 Introduction text: {intro_text}")
+            logger.log(CONTENT_LOG_LEVEL, "📝 Introduction text: %s", intro_text)
             
             await websocket.send_json({
                 "type": "ai_response",
@@ -795,18 +4131,20 @@ class UltraSensitiveVoiceServer:
             
             try:
                 logger.info("🎵 Starting audio synthesis")
-                audio_response = await self.processor.synthesize_speech(intro_text, voice_id)
+                audio_response = await self.processor.synthesize_speech(intro_text, voice_id, conversation_data["audio_format"])
                 
                 if audio_response and len(audio_response) > 500:
-                    logger.info(f"🔊 Sending audio: {len(audio_response)} bytes")
+                    logger.info("🔊 Sending audio: %d bytes", len(audio_response))
                     
-                    await websocket.send_json({"type": "audio_start"})
-                    await websocket.send_bytes(audio_response)
-                    await websocket.send_json({"type": "audio_end"})
+                    started = time.perf_counter()
+                    await self.send_audio_start(conversation_data)
+                    await self.send_audio_segment(conversation_data, audio_response)
+                    await self.send_audio_end(conversation_data)
+                    record_stage("audio_send", started)
                     
                     logger.info("✅ Introduction delivered successfully")
                 else:
-                    logger.error(f"❌ Audio generation failed: {len(audio_response) if audio_response else 0} bytes")
+                    logger.error("❌ Audio generation failed: %d bytes", len(audio_response) if audio_response else 0)
                     await websocket.send_json({
                         "type": "ai_response",
                         "text": "I'm experiencing a brief technical moment with audio, but I'm absolutely here and excited to help you learn! Please go ahead and speak - I'm listening.",
@@ -814,19 +4152,36 @@ class UltraSensitiveVoiceServer:
                     })
                     
             except Exception as audio_error:
-                logger.error(f"❌ Audio synthesis failed: {audio_error}")
+                logger.error("❌ Audio synthesis failed: %s", audio_error)
                 await websocket.send_json({
                     "type": "ai_response", 
                     "text": "I'm here and genuinely excited to start our learning journey! There's a small audio hiccup, but I'm fully ready to engage with you.",
                     "timestamp": datetime.utcnow().isoformat()
                 })
+            finally:
+                current_trace.reset(trace_token)
+            await self.finish_trace(websocket, trace)
                 
         except Exception as e:
             logger.error(f"❌ Error sending introduction: {e}")
             logger.error(traceback.format_exc())
 
-    async def process_audio(self, conversation_id: str, audio_data: bytes):
-        """Process audio with ultra-sensitive detection pipeline"""
+    async def finish_trace(self, websocket: WebSocket, trace: TurnTrace, send_timing: bool = True):
+        """Close a trace, export it and send its timing summary to the client"""
+        trace.finish()
+        if trace_exporter:
+            trace_exporter.export(trace)
+        if send_timing and TRACE_TIMING_MESSAGES:
+            try:
+                await websocket.send_json(trace.summary())
+            except Exception as e:
+                logger.warning("⚠️ Could not send turn timing: %s", e)
+
+    async def process_audio(self, conversation_id: str, utterances: list, transcript: str = None, queued_at: float = None):
+        """Process audio with ultra-sensitive detection pipeline (transcript given when STT already ran)
+        
+        utterances are STT payloads coalesced into this turn; each is transcribed on its own.
+        """
         try:
             if conversation_id not in self.active_conversations:
                 logger.error(f"❌ Conversation not found: {conversation_id}")
@@ -835,12 +4190,17 @@ class UltraSensitiveVoiceServer:
             conversation_data = self.active_conversations[conversation_id]
             websocket = conversation_data["websocket"]
             
-            if conversation_data.get("is_processing", False):
-                logger.info(f"⏳ Ultra-sensitive processing in progress for {conversation_id}")
-                return
-                
+            # The turn queue runs one turn at a time, so nothing is in progress here
             conversation_data["is_processing"] = True
-            logger.info(f"🎤 Starting ULTRA-SENSITIVE audio processing: {len(audio_data)} bytes")
+            logger.info("🎤 Starting ULTRA-SENSITIVE audio processing: %d bytes in %d utterance(s)",
+                        sum(len(utterance) for utterance in utterances), len(utterances))
+            turn_started = time.perf_counter()
+            outcome = "cancelled"  # Unless the turn gets far enough to say otherwise
+            trace = TurnTrace(conversation_id, started=queued_at if queued_at is not None else turn_started)
+            if queued_at is not None:
+                trace.add_span("queue_wait", queued_at, turn_started)
+            trace_token = current_trace.set(trace)
+            deadline_token = turn_deadline.set(trace.started + TURN_DEADLINE_SECONDS)
             
             try:
                 voice_id = conversation_data.get("voice_id", "female")
@@ -849,19 +4209,22 @@ class UltraSensitiveVoiceServer:
                 
                 if was_interrupted:
                     conversation_data["was_interrupted"] = False
-                    logger.info(f"🔄 Processing interrupted conversation: {conversation_id}")
+                    logger.info("🔄 Processing interrupted conversation: %s", conversation_id)
                 
                 await websocket.send_json({"type": "processing_start"})
                 
                 # ULTRA-SENSITIVE transcription
-                transcript = await self.processor.transcribe_audio(audio_data)
+                if transcript is None:
+                    transcripts = await asyncio.gather(*(self.processor.transcribe_audio(utterance) for utterance in utterances))
+                    transcript = " ".join(text.strip() for text in transcripts if text and text.strip())
                 
                 if not transcript or len(transcript.strip()) < 1:
-                    logger.warning(f"❌ No speech detected: {conversation_id}")
+                    logger.warning("❌ No speech detected: %s", conversation_id)
+                    outcome = "no_speech"
                     await websocket.send_json({"type": "no_speech_detected"})
                     return
                 
-                logger.info(f"✅ TRANSCRIBED: '{transcript}'")
+                logger.log(CONTENT_LOG_LEVEL, "✅ TRANSCRIBED: '%s'", transcript)
                 
                 await websocket.send_json({
                     "type": "transcript",
@@ -869,12 +4232,20 @@ class UltraSensitiveVoiceServer:
                     "timestamp": datetime.utcnow().isoformat()
                 })
                 
+                if conversation_data.get("stream_responses", STREAM_RESPONSES):
+                    outcome = "failed"
+                    if await self.stream_response(conversation_id, transcript, was_interrupted, context, voice_id):
+                        conversation_data["message_count"] += 1
+                        outcome = "completed"
+                        logger.info("✅ Streamed response delivered for %s", conversation_id)
+                    return
+                
                 # Get AI response
                 ai_response = await self.processor.get_ai_response(
                     transcript, conversation_id, was_interrupted, context
                 )
                 
-                logger.info(f"🤖 AI RESPONSE: {ai_response}")
+                logger.log(CONTENT_LOG_LEVEL, "🤖 AI RESPONSE: %s", ai_response)
                 
                 await websocket.send_json({
                     "type": "ai_response",
@@ -883,18 +4254,22 @@ class UltraSensitiveVoiceServer:
                 })
                 
                 # Generate speech
-                audio_response = await self.processor.synthesize_speech(ai_response, voice_id)
+                audio_response = await self.processor.synthesize_speech(ai_response, voice_id, conversation_data["audio_format"])
                 
-                if audio_response and len(audio_response) > 1000:
-                    logger.info(f"🔊 Delivering audio: {len(audio_response)} bytes")
+                if audio_response and len(audio_response) > 500:
+                    logger.info("🔊 Delivering audio: %d bytes", len(audio_response))
                     
-                    await websocket.send_json({"type": "audio_start"})
-                    await websocket.send_bytes(audio_response)
-                    await websocket.send_json({"type": "audio_end"})
+                    started = time.perf_counter()
+                    await self.send_audio_start(conversation_data)
+                    await self.send_audio_segment(conversation_data, audio_response)
+                    await self.send_audio_end(conversation_data)
+                    record_stage("audio_send", started)
                     
                     conversation_data["message_count"] += 1
-                    logger.info(f"✅ Response delivered for {conversation_id}")
+                    outcome = "completed"
+                    logger.info("✅ Response delivered for %s", conversation_id)
                 else:
+                    outcome = "failed"
                     logger.error(f"❌ Audio generation failed: {conversation_id}")
                     await websocket.send_json({
                         "type": "error",
@@ -902,7 +4277,8 @@ class UltraSensitiveVoiceServer:
                     })
                         
             except Exception as e:
-                logger.error(f"❌ Processing error: {e}")
+                outcome = "failed"
+                logger.error("❌ Processing error: %s", e)
                 logger.error(traceback.format_exc())
                 try:
                     await websocket.send_json({
@@ -912,17 +4288,159 @@ class UltraSensitiveVoiceServer:
                 except:
                     pass
             finally:
+                if outcome == "completed":
+                    metrics.stage_seconds.observe(time.perf_counter() - turn_started, "turn")
+                metrics.turns.inc(1, outcome)
+                current_trace.reset(trace_token)
+                turn_deadline.reset(deadline_token)
+                await self.finish_trace(websocket, trace, send_timing=outcome != "cancelled")
                 conversation_data["is_processing"] = False
+                self.persist_in_background(conversation_id)
             
         except Exception as e:
-            logger.error(f"❌ Audio processing error: {e}")
+            logger.error("❌ Audio processing error: %s", e)
             if conversation_id in self.active_conversations:
                 self.active_conversations[conversation_id]["is_processing"] = False
 
+    async def stream_response(self, conversation_id: str, transcript: str, was_interrupted: bool, context: dict, voice_id: str) -> bool:
+        """Stream LLM sentences through TTS to the client as ordered audio segments"""
+        conversation_data = self.active_conversations[conversation_id]
+        websocket = conversation_data["websocket"]
+        segmenter = SentenceSegmenter()
+        pending = asyncio.Queue(maxsize=STREAM_TTS_LOOKAHEAD)
+        sentences = []
+        
+        async def enqueue(sentence: str):
+            sentences.append(sentence)
+            await websocket.send_json({
+                "type": "ai_response_delta",
+                "text": sentence,
+                "index": len(sentences) - 1,
+                "timestamp": datetime.utcnow().isoformat()
+            })
+            # Synthesis starts immediately; the queue bound limits how far TTS runs ahead of sending
+            await pending.put(asyncio.create_task(
+                self.processor.synthesize_speech(sentence, voice_id, conversation_data["audio_format"])
+            ))
+        
+        async def produce():
+            try:
+                async for delta in self.processor.stream_ai_response(transcript, conversation_id, was_interrupted, context):
+                    for sentence in segmenter.feed(delta):
+                        await enqueue(sentence)
+                remainder = segmenter.flush()
+                if remainder:
+                    await enqueue(remainder)
+            finally:
+                await pending.put(None)
+        
+        producer = asyncio.create_task(produce())
+        segments_sent = 0
+        try:
+            while True:
+                synthesis = await pending.get()
+                if synthesis is None:
+                    break
+                audio_segment = await synthesis
+                if not audio_segment:
+                    logger.warning("⚠️ Skipping empty audio segment for %s", conversation_id)
+                    continue
+                started = time.perf_counter()
+                if segments_sent == 0:
+                    await self.send_audio_start(conversation_data)
+                await self.send_audio_segment(conversation_data, audio_segment)
+                record_stage("audio_send", started)
+                segments_sent += 1
+            await producer
+        finally:
+            if not producer.done():
+                producer.cancel()
+            while not pending.empty():
+                synthesis = pending.get_nowait()
+                if synthesis is not None:
+                    synthesis.cancel()
+        
+        if segments_sent:
+            await self.send_audio_end(conversation_data)
+        
+        ai_response = " ".join(sentences)
+        logger.log(CONTENT_LOG_LEVEL, "🤖 AI RESPONSE (streamed in %d sentences, %d audio segments): %s", len(sentences), segments_sent, ai_response)
+        
+        await websocket.send_json({
+            "type": "ai_response",
+            "text": ai_response,
+            "streamed": True,
+            "timestamp": datetime.utcnow().isoformat()
+        })
+        
+        if not segments_sent:
+            logger.error(f"❌ Audio generation failed: {conversation_id}")
+            await websocket.send_json({
+                "type": "error",
+                "message": "Audio generation temporarily unavailable"
+            })
+        return segments_sent > 0
+
+    async def stream_audio(self, conversation_id: str, audio_data: bytes):
+        """Feed an audio frame into the conversation's streaming STT session"""
+        conversation_data = self.active_conversations[conversation_id]
+        websocket = conversation_data["websocket"]
+        stt_session = conversation_data.get("stt_session")
+        
+        if stt_session is None or not stt_session.is_open:
+            async def on_transcript(text: str, is_final: bool):
+                await websocket.send_json({
+                    "type": "transcript_interim",
+                    "text": text,
+                    "is_final": is_final,
+                    "timestamp": datetime.utcnow().isoformat()
+                })
+            
+            async def on_endpoint(utterance: str):
+                conversation_data["turn_queue"].put_transcript(utterance)
+            
+            input_audio = conversation_data["input_audio"]
+            audio_params = {"encoding": "linear16", "sample_rate": str(input_audio["sample_rate_hertz"]),
+                            "channels": "1"} if input_audio else None
+            stt_session = StreamingTranscriptionSession(self.processor, on_transcript, on_endpoint, audio_params)
+            try:
+                await stt_session.start()
+            except Exception as e:
+                metrics.upstream_errors.inc(1, "deepgram_stream")
+                logger.error(f"❌ Streaming STT unavailable, falling back to per-chunk transcription: {e}")
+                conversation_data["stt_streaming"] = False
+                self.receive_audio(conversation_id, audio_data)
+                return
+            conversation_data["stt_session"] = stt_session
+        
+        await stt_session.send_audio(audio_data)
+    
+    async def close_stt_session(self, conversation_id: str):
+        """Close the conversation's streaming STT session if one is open"""
+        conversation_data = self.active_conversations.get(conversation_id)
+        if conversation_data and conversation_data.get("stt_session"):
+            stt_session = conversation_data["stt_session"]
+            conversation_data["stt_session"] = None
+            await stt_session.close()
+    
     async def cleanup_conversation(self, conversation_id: str):
         """Clean up conversation resources"""
         if conversation_id in self.active_conversations:
             try:
+                await self.close_stt_session(conversation_id)
+                introduction_task = self.active_conversations[conversation_id].get("introduction_task")
+                if introduction_task and not introduction_task.done():
+                    introduction_task.cancel()
+                turn_queue = self.active_conversations[conversation_id]["turn_queue"]
+                await turn_queue.close()
+                self.closed_queue_totals["dropped"] += turn_queue.dropped
+                self.closed_queue_totals["merged"] += turn_queue.merged
+                assembler = self.active_conversations[conversation_id]["assembler"]
+                assembler.close()
+                for name, value in assembler.get_stats().items():
+                    self.closed_assembler_totals[name] += value
+                # Keep the persisted state so the client can resume on any worker
+                self.persist_in_background(conversation_id)
                 self.processor.clear_conversation_context(conversation_id)
                 del self.active_conversations[conversation_id]
                 logger.info(f"🧹 Conversation cleaned up: {conversation_id}")
@@ -935,22 +4453,38 @@ voice_server = UltraSensitiveVoiceServer()
 @app.websocket("/conversation")
 async def ultra_sensitive_conversation_endpoint(websocket: WebSocket):
     """Ultra-sensitive WebSocket endpoint for maximum speech detection"""
+    # Reconnecting clients pass ?conversation_id=...&resume_token=... (both from connection_established) to resume
+    resume_id = websocket.query_params.get("conversation_id")
+    resume_token = websocket.query_params.get("resume_token")
     conversation_id = str(uuid.uuid4())
     
+    rejection = voice_server.admission.admit()
+    if rejection:
+        await reject_conversation(websocket, rejection)
+        return
+    
     try:
         await websocket.accept()
+        resume_state = await voice_server.load_resumable_state(resume_id, resume_token)
+        if resume_state is not None and resume_id not in voice_server.active_conversations:
+            conversation_id = resume_id
+        else:
+            resume_state = None
         logger.info(f"🌐 Ultra-sensitive WebSocket connected: {conversation_id}")
         
         await voice_server.create_conversation(conversation_id, websocket)
+        resumed = resume_state is not None and voice_server.restore_conversation(conversation_id, resume_state)
         
         await websocket.send_json({
             "type": "connection_established",
             "conversation_id": conversation_id,
+            "resume_token": voice_server.active_conversations[conversation_id]["resume_token"],
+            "resumed": resumed,
             "message": "Connected to Ultra-Sensitive Voice AI - Maximum Speech Detection!",
             "quality_level": "ultra_sensitive"
         })
         
-        introduction_sent = False
+        introduction_sent = resumed
         
         while True:
             try:
@@ -961,25 +4495,29 @@ async def ultra_sensitive_conversation_endpoint(websocket: WebSocket):
                     
                 if "bytes" in message:
                     audio_data = message["bytes"]
-                    logger.info(f"🎤 Received audio: {len(audio_data)} bytes")
+                    logger.info("🎤 Received audio: %d bytes", len(audio_data), extra={"sample": "audio_frame"})
+                    conversation_data = voice_server.active_conversations.get(conversation_id)
+                    if conversation_data and conversation_data.get("stt_streaming"):
+                        await voice_server.stream_audio(conversation_id, audio_data)
                     # ULTRA-LOW threshold for maximum sensitivity
-                    if len(audio_data) > 200:  # Reduced from 300
-                        asyncio.create_task(voice_server.process_audio(conversation_id, audio_data))
-                    else:
-                        logger.info(f"⚠️ Audio too small, skipping: {len(audio_data)} bytes")
+                    elif conversation_data:
+                        voice_server.receive_audio(conversation_id, audio_data)
                         
                 elif "text" in message:
                     try:
                         data = json.loads(message["text"])
-                        logger.info(f"📨 Command: {data.get('type')}")
+                        logger.info("📨 Command: %s", data.get("type"))
                         
                         if data.get("type") == "ping":
                             await websocket.send_json({"type": "pong"})
                             
                         elif data.get("type") == "interrupt_ai":
+                            await voice_server.interrupt_turn(conversation_id)
+                        
+                        elif data.get("type") == "utterance_end":
+                            # Client marks the end of a recording: transcribe what has been assembled
                             if conversation_id in voice_server.active_conversations:
-                                voice_server.active_conversations[conversation_id]["was_interrupted"] = True
-                                logger.info(f"🛑 AI interrupted: {conversation_id}")
+                                voice_server.active_conversations[conversation_id]["assembler"].flush("marker")
                                 
                         elif data.get("type") == "set_voice":
                             voice_id = data.get("voice_id", "female")
@@ -997,24 +4535,51 @@ async def ultra_sensitive_conversation_endpoint(websocket: WebSocket):
                                     "cost": voice_config["cost"],
                                     "message": f"Voice changed to {voice_config['description']}"
                                 })
+                                if "audio_format" in data:
+                                    await voice_server.set_audio_format(conversation_id, data["audio_format"])
+                                if "audio_framing" in data:
+                                    await voice_server.set_audio_framing(conversation_id, bool(data["audio_framing"]))
+                                if "input_audio" in data:
+                                    await voice_server.close_stt_session(conversation_id)
+                                    await websocket.send_json(voice_server.configure_input_audio(conversation_id, data["input_audio"]))
+                                voice_server.persist_in_background(conversation_id)
                                 
                         elif data.get("type") == "set_context":
                             context = data.get("context", {})
                             logger.info(f"📝 Ultra-sensitive context set for {conversation_id}")
                             if conversation_id in voice_server.active_conversations:
-                                voice_server.active_conversations[conversation_id]["context"] = context
+                                voice_server.active_conversations[conversation_id]["context"] = \
+                                    voice_server.processor.share_unit_content(conversation_id, context)
+                                if "streaming" in data:
+                                    voice_server.active_conversations[conversation_id]["stream_responses"] = bool(data["streaming"])
+                                if "stt_streaming" in data:
+                                    voice_server.active_conversations[conversation_id]["stt_streaming"] = bool(data["stt_streaming"])
+                                    if not data["stt_streaming"]:
+                                        await voice_server.close_stt_session(conversation_id)
                                 voice_server.processor.clear_conversation_context(conversation_id)
                                 
                                 await websocket.send_json({
                                     "type": "context_set",
                                     "message": "Ultra-sensitive context configured successfully"
                                 })
+                                if "audio_format" in data:
+                                    await voice_server.set_audio_format(conversation_id, data["audio_format"])
+                                if "audio_framing" in data:
+                                    await voice_server.set_audio_framing(conversation_id, bool(data["audio_framing"]))
+                                if "input_audio" in data:
+                                    await voice_server.close_stt_session(conversation_id)
+                                    await websocket.send_json(voice_server.configure_input_audio(conversation_id, data["input_audio"]))
+                                voice_server.persist_in_background(conversation_id)
                                 
                         elif data.get("type") == "start_conversation":
                             if not introduction_sent:
                                 logger.info(f"🚀 Starting ultra-sensitive conversation: {conversation_id}")
                                 await asyncio.sleep(0.1)
-                                await voice_server.send_introduction(conversation_id)
+                                # Run as a task so interrupt_ai can be received (and cancel it) meanwhile
+                                async def introduce():
+                                    await voice_server.send_introduction(conversation_id)
+                                    voice_server.persist_in_background(conversation_id)
+                                voice_server.active_conversations[conversation_id]["introduction_task"] = asyncio.create_task(introduce())
                                 introduction_sent = True
                                 
                     except json.JSONDecodeError as e:
@@ -1044,11 +4609,43 @@ async def ultra_sensitive_conversation_endpoint(websocket: WebSocket):
         logger.error(traceback.format_exc())
     finally:
         await voice_server.cleanup_conversation(conversation_id)
+        voice_server.admission.release()
+
+async def reject_conversation(websocket: WebSocket, reason: str):
+    """Refuse a conversation quickly with 1013 (try again later) and a jittered retry hint"""
+    retry_after = voice_server.admission.retry_after()
+    logger.warning("🚦 Conversation rejected (%s), retry after %ss", reason, retry_after)
+    try:
+        await websocket.accept()
+        await websocket.send_json({"type": "server_busy", "reason": reason, "retry_after_ms": int(retry_after * 1000)})
+        await websocket.close(code=WS_CLOSE_TRY_AGAIN_LATER, reason=f"{reason}; retry after {retry_after}s")
+    except Exception as e:
+        logger.debug("Rejected socket closed early: %s", e)
+
+@app.on_event("startup")
+async def startup_event():
+    """Pre-warm canned audio and upstream connections in the background"""
+    if WARMUP_ON_STARTUP:
+        voice_server.start_warmup()
+    if METRICS_ENABLED:
+        metrics.start()
+    voice_server.processor.start_upstream_pools()
+    # uvicorn closes open WebSockets before shutdown handlers run, so a drain has to start at SIGTERM
+    voice_server.install_drain_signal_handler()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown"""
+    await metrics.stop()
     await voice_server.processor.close_session()
+    if voice_server.processor.tts_client:
+        voice_server.processor.tts_client.shutdown()
+    if voice_server.processor.disk_cache:
+        voice_server.processor.disk_cache.close()
+    await voice_server.flush_states(CONVERSATION_STATE_TIMEOUT_SECONDS)
+    await voice_server.state_backend.close()
+    if log_listener:
+        log_listener.stop()  # Flushes records still queued for the handler thread
 
 @app.get("/health")
 async def ultra_sensitive_health_check():
@@ -1056,18 +4653,46 @@ async def ultra_sensitive_health_check():
     stats = voice_server.processor.get_stats()
     tts_status = "ultra_sensitive" if voice_server.processor.tts_client else "error"
     
-    return {
-        "status": "ultra_sensitive" if tts_status == "ultra_sensitive" else "degraded",
+    capacity = voice_server.admission.get_stats()
+    if voice_server.admission.draining:
+        status = "draining"
+    elif not voice_server.is_ready:
+        status = "warming_up"
+    elif not capacity["accepting"]:
+        status = "saturated"
+    else:
+        status = "ultra_sensitive" if tts_status == "ultra_sensitive" else "degraded"
+    
+    health = {
+        "status": status,
+        "ready": voice_server.is_ready,
+        "drain": voice_server.drain_status,
+        "warmup": voice_server.processor.warmup_status,
         "active_conversations": len(voice_server.active_conversations),
+        "capacity": capacity,
+        "conversation_state": {**voice_server.state_backend.get_stats(), "pending_writes": len(voice_server.persist_tasks),
+                               "failed_writes": voice_server.persist_failures},
+        "turn_queues": voice_server.get_turn_queue_stats(),
+        "utterance_assembly": voice_server.get_assembler_stats(),
         "tts_status": tts_status,
+        "upstream_pools": voice_server.processor.get_upstream_stats(),
+        "tracing": {
+            "timing_messages": TRACE_TIMING_MESSAGES,
+            "trace_file": TRACE_FILE,
+            "exported_traces": trace_exporter.exported if trace_exporter else 0
+        },
         "optimization_stats": stats,
         "sensitivity_settings": {
             "model": "gpt-3.5-turbo" if USE_GPT_3_5 else "gpt-4",
             "max_context": MAX_CONTEXT_MESSAGES,
+            "context_token_budget": CONTEXT_HISTORY_TOKEN_BUDGET,
             "max_tokens": MAX_RESPONSE_TOKENS,
+            "streaming_responses": STREAM_RESPONSES,
+            "streaming_stt": STT_STREAMING,
             "voice_cache": USE_VOICE_CACHE,
             "tts_provider": "Google Cloud TTS (Cost-Optimized)",
             "audio_threshold": "200 bytes (ultra-low)",
+            "pcm_input": {"available": np is not None, **SpeechGate(16000).get_settings()},
             "confidence_threshold": "0.05 (ultra-sensitive)",
             "deepgram_params": "ultra-sensitive detection"
         },
@@ -1084,6 +4709,45 @@ async def ultra_sensitive_health_check():
         },
         "timestamp": datetime.utcnow().isoformat()
     }
+    if voice_server.admission.draining or not voice_server.is_ready:
+        # Load balancers route here only once warm, and stop on the first probe of a drain rather than after the process dies
+        return JSONResponse(health, status_code=503)
+    return health
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus text exposition of latency histograms, counters and gauges"""
+    if not METRICS_ENABLED:
+        return PlainTextResponse("metrics disabled\n", status_code=404)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+def admin_rejection(request: Request) -> Optional[JSONResponse]:
+    """Admin endpoints start paid work or stop the worker, so they stay closed without ADMIN_TOKEN"""
+    if not ADMIN_TOKEN:
+        return JSONResponse({"error": "admin endpoints disabled; set ADMIN_TOKEN"}, status_code=403)
+    if not hmac.compare_digest(request.headers.get("x-admin-token", "").encode(), ADMIN_TOKEN.encode()):
+        return JSONResponse({"error": "unauthorized"}, status_code=401)
+    return None
+
+@app.api_route("/admin/warmup", methods=["GET", "POST"])
+async def admin_warmup(request: Request):
+    """Inspect (GET) or trigger (POST) pre-synthesis of canned phrases"""
+    rejection = admin_rejection(request)
+    if rejection:
+        return rejection
+    if request.method == "POST":
+        return {"message": "Warm-up started", "warmup": voice_server.start_warmup()}
+    return {"warmup": voice_server.processor.warmup_status}
+
+@app.api_route("/admin/drain", methods=["GET", "POST"])
+async def admin_drain(request: Request):
+    """Inspect (GET) or start (POST) a graceful drain; the process exits once it completes"""
+    rejection = admin_rejection(request)
+    if rejection:
+        return rejection
+    if request.method == "POST":
+        return {"message": "Drain started", "drain": voice_server.start_drain("admin")}
+    return {"drain": voice_server.drain_status}
 
 @app.get("/")
 async def root():
@@ -1094,7 +4758,10 @@ async def root():
         "endpoints": {
             "websocket": "/conversation",
             "health": "/health",
-            "voices": "/voices"
+            "metrics": "/metrics",
+            "voices": "/voices",
+            "warmup": "/admin/warmup",
+            "drain": "/admin/drain"
         },
         "ultra_sensitive_features": [
             "Ultra-low audio threshold (200 bytes vs 300+)",
@@ -0,0 +1,14 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from _server import load_server  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def server():
+    """The voice server module, imported once with upstream credentials unset"""
+    return load_server(LOG_LEVEL="CRITICAL", METRICS_ENABLED="true")
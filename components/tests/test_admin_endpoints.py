@@ -0,0 +1,50 @@
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture
+def client(server):
+    return TestClient(server.app)
+
+
+def test_admin_endpoints_are_closed_without_a_token(server, client, monkeypatch):
+    monkeypatch.setattr(server, "ADMIN_TOKEN", None)
+    started = []
+    monkeypatch.setattr(server.voice_server, "start_warmup", lambda: started.append(True))
+    monkeypatch.setattr(server.voice_server, "start_drain", lambda trigger: started.append(trigger))
+
+    for path in ("/admin/warmup", "/admin/drain"):
+        assert client.get(path).status_code == 403
+        assert client.post(path).status_code == 403
+    assert started == []
+
+
+def test_admin_warmup_checks_the_token(server, client, monkeypatch):
+    monkeypatch.setattr(server, "ADMIN_TOKEN", "secret")
+
+    assert client.get("/admin/warmup").status_code == 401
+    assert client.get("/admin/warmup", headers={"x-admin-token": "wrong"}).status_code == 401
+    response = client.get("/admin/warmup", headers={"x-admin-token": "secret"})
+    assert response.status_code == 200 and "warmup" in response.json()
+
+
+def test_admin_drain_checks_the_token(server, client, monkeypatch):
+    monkeypatch.setattr(server, "ADMIN_TOKEN", "secret")
+    started = []
+    monkeypatch.setattr(server.voice_server, "start_drain", lambda trigger: started.append(trigger) or {})
+
+    assert client.get("/admin/drain").status_code == 401
+    assert client.post("/admin/drain", headers={"x-admin-token": "wrong"}).status_code == 401
+    assert started == []
+    assert client.post("/admin/drain", headers={"x-admin-token": "secret"}).status_code == 200
+    assert started == ["admin"]
+
+
+def test_health_is_unavailable_until_warm(server, client, monkeypatch):
+    monkeypatch.setattr(server.voice_server, "is_ready", False)
+    response = client.get("/health")
+    assert response.status_code == 503
+    assert response.json()["status"] == "warming_up"
+
+    monkeypatch.setattr(server.voice_server, "is_ready", True)
+    assert client.get("/health").status_code == 200
@@ -0,0 +1,86 @@
+import pytest
+
+
+class FakeLimiter:
+    def __init__(self, load: float = 0.0):
+        self.load = load
+
+    def get_stats(self) -> dict:
+        return {"load": self.load}
+
+
+class FakeEngine:
+    def __init__(self, in_flight: int = 0, queued: int = 0, max_concurrency: int = 4):
+        self.in_flight = in_flight
+        self.queued = queued
+        self.max_concurrency = max_concurrency
+
+
+def test_conversations_are_capped_and_slots_come_back_on_release(server):
+    admission = server.AdmissionController(2, {"openai": FakeLimiter()})
+
+    assert [admission.admit() for _ in range(3)] == [None, None, "max_conversations"]
+    admission.release()
+    assert admission.admit() is None
+    assert (admission.active, admission.admitted, admission.rejected) == (2, 3, {"max_conversations": 1})
+
+
+def test_a_saturated_upstream_sheds_new_conversations(server):
+    limiter = FakeLimiter(load=server.ADMISSION_SHED_LOAD)
+    admission = server.AdmissionController(10, {"openai": FakeLimiter(), "deepgram": limiter})
+
+    assert admission.admit() == "deepgram_saturated"
+    limiter.load = server.ADMISSION_SHED_LOAD - 0.1
+    assert admission.admit() is None
+
+
+def test_tts_load_counts_queued_and_abandoned_calls(server):
+    engine = FakeEngine(in_flight=4, queued=4, max_concurrency=4)
+    admission = server.AdmissionController(10, {}, tts_engine=engine)
+
+    assert admission.upstream_load() == {"tts": 2.0}
+    assert admission.admit() == "tts_saturated"
+    engine.queued = 0
+    assert admission.admit() is None
+
+
+def test_draining_wins_over_every_other_reason(server):
+    admission = server.AdmissionController(0, {"openai": FakeLimiter(load=10)})
+    admission.draining = True
+    assert admission.admit() == "draining"
+
+
+def test_stats_report_utilization_and_rejections(server):
+    admission = server.AdmissionController(4, {"openai": FakeLimiter(load=0.5)})
+    admission.admit()
+    admission.draining = True
+    admission.admit()
+
+    stats = admission.get_stats()
+    assert stats["accepting"] is False and stats["saturation_reason"] == "draining"
+    assert stats["conversation_utilization"] == 0.25
+    assert stats["upstream_load"] == {"openai": 0.5}
+    assert stats["rejected"] == {"draining": 1}
+
+
+def test_retry_after_is_jittered_within_one_period(server):
+    admission = server.AdmissionController(1, {})
+    hints = {admission.retry_after() for _ in range(50)}
+
+    assert all(server.ADMISSION_RETRY_AFTER_SECONDS <= hint <= 2 * server.ADMISSION_RETRY_AFTER_SECONDS for hint in hints)
+    assert len(hints) > 1
+
+
+def test_rejected_sockets_are_told_to_retry_later(server, monkeypatch):
+    from fastapi.testclient import TestClient
+    from starlette.websockets import WebSocketDisconnect
+
+    monkeypatch.setattr(server.voice_server.admission, "max_conversations", 0)
+    with TestClient(server.app).websocket_connect("/conversation") as websocket:
+        busy = websocket.receive_json()
+        with pytest.raises(WebSocketDisconnect) as closed:
+            websocket.receive_json()
+
+    assert busy["type"] == "server_busy" and busy["reason"] == "max_conversations"
+    assert busy["retry_after_ms"] >= server.ADMISSION_RETRY_AFTER_SECONDS * 1000
+    assert closed.value.code == server.WS_CLOSE_TRY_AGAIN_LATER
@@ -0,0 +1,53 @@
+import pytest
+
+
+def test_presets_resolve_by_name(server):
+    audio_format, adjusted = server.AudioFormat.negotiate("telephony")
+
+    assert audio_format == server.AudioFormat("LINEAR16", 8000, "telephony-class-application")
+    assert audio_format.mime_type == "audio/wav"
+    assert adjusted == []
+
+
+def test_partial_requests_fill_in_from_the_current_format(server):
+    current = server.AudioFormat.preset("low_bandwidth")
+    audio_format, adjusted = server.AudioFormat.negotiate({"sample_rate_hertz": 48000}, current)
+
+    assert audio_format == server.AudioFormat("OGG_OPUS", 48000, "handset-class-device")
+    assert adjusted == []
+
+
+def test_explicit_fields_override_the_requested_preset(server):
+    audio_format, adjusted = server.AudioFormat.negotiate({"preset": "low_bandwidth", "encoding": "mp3",
+                                                           "effects_profile": None})
+
+    assert audio_format == server.AudioFormat("MP3", 16000, None)
+    assert adjusted == []
+
+
+def test_unsupported_rates_snap_to_the_nearest_supported_one(server):
+    audio_format, adjusted = server.AudioFormat.negotiate({"encoding": "OGG_OPUS", "sample_rate_hertz": 44100})
+
+    assert audio_format.sample_rate_hertz == 48000
+    assert adjusted == ["OGG_OPUS does not support 44100 Hz, using 48000"]
+
+
+@pytest.mark.parametrize("requested, note", [
+    ("hifi", "unknown preset 'hifi'"),
+    ({"encoding": "FLAC"}, "unsupported encoding 'FLAC'"),
+    ({"sample_rate_hertz": "fast"}, "invalid sample_rate_hertz"),
+    ({"effects_profile": "stadium"}, "unknown effects_profile 'stadium'"),
+    (42, "unsupported audio_format 42"),
+])
+def test_invalid_requests_keep_the_current_format_and_say_why(server, requested, note):
+    current = server.AudioFormat.preset("telephony")
+    audio_format, adjusted = server.AudioFormat.negotiate(requested, current)
+
+    assert audio_format == current
+    assert adjusted == [note]
+
+
+def test_only_non_default_formats_change_cache_keys(server):
+    assert server.AudioFormat.negotiate({})[0].cache_suffix == ""
+    assert server.AudioFormat.preset("telephony").cache_suffix == ":LINEAR16:8000:telephony-class-application"
+    assert server.AudioFormat("MP3", 24000, None).cache_suffix == ":MP3:24000:none"
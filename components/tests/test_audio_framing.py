@@ -0,0 +1,66 @@
+import asyncio
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_json(self, message):
+        self.sent.append(message)
+
+    async def send_bytes(self, data):
+        self.sent.append(data)
+
+
+def parse(server, frame: bytes):
+    header = server.AUDIO_FRAME_HEADER
+    return header.unpack(frame[:header.size]), frame[header.size:]
+
+
+def test_header_layout_is_big_endian_version_flags_turn_seq(server):
+    assert server.AUDIO_FRAME_HEADER.size == 10
+    (frame,) = server.frame_audio(b"pcm", turn_id=0x01020304, first_seq=5)
+    assert frame == bytes([1, server.AUDIO_FRAME_LAST, 1, 2, 3, 4, 0, 0, 0, 5]) + b"pcm"
+
+
+def test_segment_is_split_with_consecutive_sequence_numbers(server):
+    audio = bytes(range(10))
+    frames = [parse(server, frame) for frame in server.frame_audio(audio, turn_id=7, first_seq=3, frame_bytes=4)]
+
+    assert [header for header, _ in frames] == [(1, 0, 7, 3), (1, 0, 7, 4), (1, server.AUDIO_FRAME_LAST, 7, 5)]
+    assert b"".join(payload for _, payload in frames) == audio
+
+
+def test_exact_multiple_marks_only_the_final_frame_last(server):
+    frames = [parse(server, frame) for frame in server.frame_audio(b"x" * 8, turn_id=1, first_seq=0, frame_bytes=4)]
+    assert [header[1] for header, _ in frames] == [0, server.AUDIO_FRAME_LAST]
+
+
+def test_empty_segment_still_sends_a_last_frame(server):
+    frames = [parse(server, frame) for frame in server.frame_audio(b"", turn_id=1, first_seq=9)]
+    assert frames == [((1, server.AUDIO_FRAME_LAST, 1, 9), b"")]
+
+
+def test_sequence_number_wraps_at_32_bits(server):
+    frames = [parse(server, frame) for frame in server.frame_audio(b"ab", turn_id=1, first_seq=0xFFFFFFFF, frame_bytes=1)]
+    assert [header[3] for header, _ in frames] == [0xFFFFFFFF, 0]
+
+
+def test_framed_segments_continue_the_turn_sequence(server):
+    async def scenario():
+        voice_server = server.UltraSensitiveVoiceServer()
+        websocket = FakeWebSocket()
+        await voice_server.create_conversation("c1", websocket)
+        conversation_data = voice_server.active_conversations["c1"]
+        await voice_server.set_audio_framing("c1", True)
+        await voice_server.send_audio_start(conversation_data)
+        websocket.sent.clear()
+
+        await voice_server.send_audio_segment(conversation_data, b"x" * (server.AUDIO_FRAME_BYTES + 2))
+        await voice_server.send_audio_segment(conversation_data, b"y" * 3)
+        return conversation_data["audio_turn"], websocket.sent
+
+    turn_id, sent = asyncio.run(scenario())
+    headers = [parse(server, frame)[0] for frame in sent]
+    last = server.AUDIO_FRAME_LAST
+    assert headers == [(1, 0, turn_id, 0), (1, last, turn_id, 1), (1, last, turn_id, 2)]
@@ -0,0 +1,82 @@
+import pytest
+
+
+@pytest.fixture
+def counter(server):
+    counter = server.TokenCounter("gpt-4")
+    counter.encoding = None  # ~4 characters per token, whether or not tiktoken is installed
+    return counter
+
+
+def make_context(server, counter, store=None, **kwargs):
+    return server.ConversationContext("You are a biology tutor.", counter, store or server.PromptStore(), **kwargs)
+
+
+def add_turns(context, turns: int, chars: int = 200):
+    for turn in range(turns):
+        context.append("user", f"Question {turn}: " + "why " * (chars // 4))
+        context.append("assistant", f"Answer {turn}. Cells divide by mitosis in most tissues. " + "so " * (chars // 3))
+
+
+def test_history_is_trimmed_to_the_token_budget(server, counter):
+    context = make_context(server, counter, budget=400, summary_max_tokens=100)
+    add_turns(context, 10)
+
+    assert context.history_tokens + context.summary_tokens <= 400
+    assert context.folded_messages > 0
+    assert len(context.messages) >= server.CONTEXT_MIN_RECENT_MESSAGES
+    assert context.history_tokens == sum(message.tokens for message in context.messages)
+    assert context.prompt_tokens() == (context.system_tokens + context.summary_tokens + context.history_tokens
+                                       + counter.count(context.SUMMARY_HEADER) + server.TokenCounter.MESSAGE_OVERHEAD
+                                       + server.TokenCounter.REPLY_PRIMING)
+
+
+def test_recent_messages_survive_even_over_budget(server, counter):
+    context = make_context(server, counter, budget=10)
+    add_turns(context, 4, chars=400)
+
+    assert len(context.messages) == server.CONTEXT_MIN_RECENT_MESSAGES
+    assert context.messages[-1].content.startswith("Answer 3.")
+
+
+def test_system_prompt_is_never_evicted(server, counter):
+    context = make_context(server, counter, budget=50, summary_max_tokens=20)
+    add_turns(context, 20)
+
+    messages = context.to_messages()
+    assert messages[0] == {"role": "system", "content": "You are a biology tutor."}
+    assert messages[1]["role"] == "system" and messages[1]["content"].startswith(context.SUMMARY_HEADER)
+    assert len(context) == len(messages)
+
+
+def test_folded_messages_become_summary_lines_capped_by_tokens(server, counter):
+    context = make_context(server, counter, budget=150, summary_max_tokens=40)
+    add_turns(context, 8)
+
+    lines = [line for line, _ in context.summary_lines]
+    assert all(line.startswith(("- Student: ", "- Tutor: ")) for line in lines)
+    # Tutor lines skip the short opener and keep the first sentence with substance
+    assert any(line == "- Tutor: Cells divide by mitosis in most tissues." for line in lines)
+    assert context.summary_tokens <= 40 or len(lines) == 1
+    assert context.summary_tokens == sum(tokens for _, tokens in context.summary_lines)
+    # The oldest lines were dropped to stay under the cap
+    assert len(lines) < context.folded_messages
+
+
+def test_state_round_trip_keeps_summary_and_history(server, counter):
+    store = server.PromptStore()
+    context = make_context(server, counter, store, budget=200, summary_max_tokens=100)
+    add_turns(context, 6)
+    state = context.to_state()
+    assert "system" not in state and state["system_key"] == context.system_key
+
+    restored = server.ConversationContext.from_state({**state, "system": store.get(state["system_key"])}, counter, store)
+
+    assert restored.to_messages() == context.to_messages()
+    assert restored.folded_messages == context.folded_messages
+    assert restored.prompt_tokens() == context.prompt_tokens()
+    assert store.entries[context.system_key][1] == 2  # Both share one stored prompt
+
+    context.close()
+    restored.close()
+    assert store.entries == {}
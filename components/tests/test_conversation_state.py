@@ -0,0 +1,175 @@
+import asyncio
+
+import pytest
+
+
+class FakeRedis:
+    """A RESP server whose AUTH reply is configurable"""
+
+    def __init__(self, auth_reply: bytes):
+        self.auth_reply = auth_reply
+        self.connections = 0
+        self.commands = []
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        while True:
+            header = await reader.readline()
+            if not header:
+                break
+            args = []
+            for _ in range(int(header[1:])):
+                length = int((await reader.readline())[1:])
+                args.append((await reader.readexactly(length + 2))[:-2].decode())
+            self.commands.append(args)
+            writer.write(self.auth_reply if args[0] == "AUTH" else b"$-1\r\n")
+            await writer.drain()
+        writer.close()
+
+
+def test_backends_implement_the_abstract_interface(server):
+    with pytest.raises(TypeError):
+        server.ConversationStateBackend()
+    server.InMemoryConversationStateBackend()
+
+
+def test_failed_auth_never_leaves_a_connection_behind(server):
+    async def scenario():
+        fake = FakeRedis(b"-WRONGPASS invalid password\r\n")
+        listener = await asyncio.start_server(fake.handle, "127.0.0.1", 0)
+        port = listener.sockets[0].getsockname()[1]
+        backend = server.RedisConversationStateBackend(f"redis://:secret@127.0.0.1:{port}/0")
+        try:
+            for _ in range(2):
+                with pytest.raises(RuntimeError, match="WRONGPASS"):
+                    await backend.load("conversation")
+                assert backend.writer is None and backend.reader is None
+            # Every command re-authenticates; none ran on an unauthenticated connection
+            assert [args[0] for args in fake.commands] == ["AUTH", "AUTH"]
+        finally:
+            await backend.close()
+            listener.close()
+
+    asyncio.run(scenario())
+
+
+def test_resume_requires_the_issued_token(server):
+    async def scenario():
+        voice_server = server.UltraSensitiveVoiceServer()
+        voice_server.state_backend = server.InMemoryConversationStateBackend()
+        await voice_server.state_backend.save("victim", {"resume_token": "issued", "message_count": 3})
+
+        assert await voice_server.load_resumable_state("victim", None) is None
+        assert await voice_server.load_resumable_state("victim", "guessed") is None
+        assert await voice_server.load_resumable_state("unknown", "issued") is None
+        assert (await voice_server.load_resumable_state("victim", "issued"))["message_count"] == 3
+
+    asyncio.run(scenario())
+
+
+def test_reconnect_resumes_only_with_the_token(server):
+    from fastapi.testclient import TestClient
+
+    client = TestClient(server.app)
+    with client.websocket_connect("/conversation") as ws:
+        first = ws.receive_json()
+    conversation_id, token = first["conversation_id"], first["resume_token"]
+
+    with client.websocket_connect(f"/conversation?conversation_id={conversation_id}&resume_token=wrong") as ws:
+        hijack = ws.receive_json()
+    assert hijack["conversation_id"] != conversation_id and not hijack["resumed"]
+
+    with client.websocket_connect(f"/conversation?conversation_id={conversation_id}&resume_token={token}") as ws:
+        resumed = ws.receive_json()
+    assert resumed["conversation_id"] == conversation_id and resumed["resumed"]
+    assert resumed["resume_token"] == token
+
+
+def test_prompts_are_persisted_once_per_digest_and_restored_on_resume(server):
+    async def scenario():
+        voice_server = server.UltraSensitiveVoiceServer()
+        backend = voice_server.state_backend = server.InMemoryConversationStateBackend()
+        processor = voice_server.processor
+        unit = {"subject": "Biology", "unitTitle": "Cells", "unitContent": "Cells are the unit of life. " * 50}
+        for conversation_id in ("c1", "c2"):
+            await voice_server.create_conversation(conversation_id, None)
+            context = processor.share_unit_content(conversation_id, dict(unit))
+            voice_server.active_conversations[conversation_id]["context"] = context
+            processor.get_introduction(conversation_id, context)
+            await voice_server.persist_conversation(conversation_id)
+
+        # Two prompt bodies (unit text and system prompt), whichever conversation saved them first
+        assert len(backend.prompts) == 2
+        raw, _ = backend.states["c1"]
+        assert unit["unitContent"] not in raw and "system_key" in raw
+
+        token = voice_server.active_conversations["c1"]["resume_token"]
+        for conversation_id in ("c1", "c2"):
+            voice_server.active_conversations.pop(conversation_id)
+            processor.clear_conversation_context(conversation_id)
+        assert processor.prompt_store.entries == {}
+
+        state = await voice_server.load_resumable_state("c1", token)
+        await voice_server.create_conversation("c1", None)
+        assert voice_server.restore_conversation("c1", state)
+        assert voice_server.active_conversations["c1"]["context"]["unitContent"] == unit["unitContent"]
+        system = processor.conversation_contexts["c1"].to_messages()[0]["content"]
+        assert unit["unitContent"].strip() in system
+
+    asyncio.run(scenario())
+
+
+def test_a_stalled_backend_times_out_and_drops_the_connection(server):
+    async def scenario():
+        async def never_reply(reader, writer):
+            await reader.read()
+
+        listener = await asyncio.start_server(never_reply, "127.0.0.1", 0)
+        port = listener.sockets[0].getsockname()[1]
+        backend = server.RedisConversationStateBackend(f"redis://127.0.0.1:{port}/0", timeout=0.05)
+        try:
+            with pytest.raises(asyncio.TimeoutError):
+                await backend.load("conversation")
+            assert backend.writer is None and backend.get_stats()["timeouts"] == 1
+        finally:
+            await backend.close()
+            listener.close()
+
+    asyncio.run(scenario())
+
+
+class StalledBackend:
+    """Stands in for a state backend whose writes hang until released"""
+
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.saved = []
+
+    async def save(self, conversation_id, state, ttl_seconds=None):
+        await self.release.wait()
+        self.saved.append((conversation_id, state["message_count"]))
+
+    async def save_prompt(self, digest, text, ttl_seconds):
+        pass
+
+
+def test_background_persists_never_block_and_collapse_to_the_newest(server):
+    async def scenario():
+        voice_server = server.UltraSensitiveVoiceServer()
+        backend = voice_server.state_backend = StalledBackend()
+        await voice_server.create_conversation("c1", None)
+        conversation_data = voice_server.active_conversations["c1"]
+
+        for count in range(1, 4):
+            conversation_data["message_count"] = count
+            voice_server.persist_in_background("c1")
+            await asyncio.sleep(0.01)
+        assert backend.saved == [] and len(voice_server.persist_tasks) == 1
+
+        backend.release.set()
+        await voice_server.flush_states(1)
+        # The first write was already in flight; the two queued behind it became one
+        assert backend.saved == [("c1", 1), ("c1", 3)]
+        assert voice_server.persist_tasks == {}
+
+    asyncio.run(scenario())
@@ -0,0 +1,93 @@
+import asyncio
+import os
+
+import pytest
+
+
+def segment_files(directory) -> set:
+    return {name for name in os.listdir(directory) if name.startswith("segment-")}
+
+
+def test_compaction_unmaps_removed_segments_in_every_process(server, tmp_path):
+    writer = server.DiskAudioCache(str(tmp_path), max_bytes=100)
+    reader = server.DiskAudioCache(str(tmp_path), max_bytes=100)  # Another worker on the same directory
+    try:
+        writer.put("first", b"a" * 40)
+        assert bytes(writer.get("first")) == b"a" * 40
+        assert bytes(reader.get("first")) == b"a" * 40
+        old_segments = set(reader.maps)
+
+        writer.put("second", b"b" * 40)
+        writer.put("third", b"c" * 40)  # Pushes the active segment past max_bytes
+
+        assert writer.compactions == 1
+        assert segment_files(tmp_path).isdisjoint(old_segments)
+        assert set(writer.maps) <= segment_files(tmp_path)
+
+        # The reader still maps the unlinked segment until it sees the new one
+        assert set(reader.maps) == old_segments
+        assert bytes(reader.get("third")) == b"c" * 40
+        assert set(reader.maps) == segment_files(tmp_path)
+    finally:
+        writer.close()
+        reader.close()
+
+
+def test_missing_keys_and_stats(server, tmp_path):
+    cache = server.DiskAudioCache(str(tmp_path), max_bytes=1000)
+    try:
+        assert cache.get("absent") is None
+        cache.put("present", b"audio")
+        assert bytes(cache.get("present")) == b"audio"
+        stats = cache.get_stats()
+        assert (stats["entries"], stats["hits"], stats["misses"], stats["writes"]) == (1, 1, 1, 1)
+    finally:
+        cache.close()
+
+
+def test_stats_never_query_the_index(server, tmp_path, monkeypatch):
+    cache = server.DiskAudioCache(str(tmp_path), max_bytes=1000)
+    try:
+        cache.put("present", b"audio")
+
+        def no_queries(*args):
+            raise AssertionError("get_stats queried SQLite")
+
+        monkeypatch.setattr(cache, "_query", no_queries)
+        stats = cache.get_stats()
+        assert (stats["entries"], stats["live_bytes"]) == (1, 5)
+    finally:
+        monkeypatch.undo()
+        cache.close()
+
+
+class RecordingWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_bytes(self, data):
+        self.sent.append((data, bytes(data)))
+
+
+def test_disk_hits_are_sent_as_the_mapped_view_and_released(server, tmp_path):
+    async def scenario():
+        cache = server.DiskAudioCache(str(tmp_path), max_bytes=1000)
+        voice_server = server.UltraSensitiveVoiceServer()
+        websocket = RecordingWebSocket()
+        await voice_server.create_conversation("c1", websocket)
+        try:
+            cache.put("greeting", b"mp3 audio")
+            view = cache.get("greeting")
+            await voice_server.send_audio_segment(voice_server.active_conversations["c1"], view)
+
+            (sent, payload), = websocket.sent
+            assert sent is view and payload == b"mp3 audio"
+            with pytest.raises(ValueError):
+                len(sent)  # Released
+            (mapping,) = cache.maps.values()
+            cache.compact()
+            assert mapping.closed  # Nothing pinned the unlinked segment
+        finally:
+            cache.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,107 @@
+import asyncio
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+        self.closed = None
+
+    async def send_json(self, message):
+        self.sent.append(message)
+
+    async def send_bytes(self, data):
+        self.sent.append(data)
+
+    async def close(self, code=1000, reason=""):
+        self.closed = code
+
+
+def slow_handler(seconds: float, finished: list):
+    async def handler(audio, transcript, queued_at):
+        await asyncio.sleep(seconds)
+        finished.append(transcript)
+
+    return handler
+
+
+def test_finish_on_an_idle_queue_returns_at_once(server):
+    async def scenario():
+        queue = server.TurnQueue(slow_handler(0, []))
+        assert await queue.finish(0)
+        assert not queue.accepting
+        queue.put_transcript("too late")
+        assert len(queue) == 0 and queue.dropped == 1
+
+    asyncio.run(scenario())
+
+
+def test_finish_waits_for_running_and_queued_turns(server):
+    finished = []
+
+    async def scenario():
+        queue = server.TurnQueue(slow_handler(0.05, finished))
+        queue.put_transcript("first")
+        await asyncio.sleep(0.01)  # "first" is running
+        queue.put_transcript("second")
+        assert await queue.finish(1)
+        assert not queue.busy and len(queue) == 0
+        await queue.close()
+
+    asyncio.run(scenario())
+    assert finished == ["first", "second"]
+
+
+def test_finish_reports_a_turn_that_outlasts_the_timeout(server):
+    finished = []
+
+    async def scenario():
+        queue = server.TurnQueue(slow_handler(10, finished))
+        queue.put_transcript("long")
+        await asyncio.sleep(0.01)
+        assert not await queue.finish(0.05)
+        assert queue.busy
+        queue.cancel_current()
+        await queue.close()
+
+    asyncio.run(scenario())
+    assert finished == []
+
+
+def drain_one(server, handler_seconds: float, deadline_seconds: float, monkeypatch):
+    monkeypatch.setattr(server, "BARGE_IN_TIMEOUT_SECONDS", 0.5)
+    finished = []
+
+    async def scenario():
+        voice_server = server.UltraSensitiveVoiceServer()
+        websocket = FakeWebSocket()
+        await voice_server.create_conversation("c1", websocket)
+        conversation_data = voice_server.active_conversations["c1"]
+        conversation_data["turn_queue"] = server.TurnQueue(slow_handler(handler_seconds, finished))
+        conversation_data["turn_queue"].put_transcript("question")
+        await asyncio.sleep(0.01)
+
+        outcome = await voice_server._drain_conversation("c1", server.time.perf_counter() + deadline_seconds)
+        saved = await voice_server.state_backend.load("c1")
+        return outcome, websocket, conversation_data, saved
+
+    return (*asyncio.run(scenario()), finished)
+
+
+def test_drain_lets_a_short_turn_finish(server, monkeypatch):
+    outcome, websocket, _, saved, finished = drain_one(server, 0.05, 1, monkeypatch)
+    assert outcome == "finished" and finished == ["question"]
+    assert websocket.sent[-1]["type"] == "reconnect" and websocket.closed == server.WS_CLOSE_SERVICE_RESTART
+    assert saved is not None
+
+
+def test_drain_cuts_off_a_turn_that_overruns_the_deadline(server, monkeypatch):
+    outcome, websocket, conversation_data, saved, finished = drain_one(server, 10, 0.05, monkeypatch)
+
+    assert outcome == "cut_off" and finished == []
+    assert conversation_data["was_interrupted"]
+    assert conversation_data["turn_queue"].cancelled == 1
+    reconnect = websocket.sent[-1]
+    assert reconnect["type"] == "reconnect" and reconnect["reason"] == "server_draining"
+    assert reconnect["conversation_id"] == "c1" and reconnect["retry_after_ms"] >= server.DRAIN_RECONNECT_DELAY_MS
+    assert websocket.closed == server.WS_CLOSE_SERVICE_RESTART
+    assert saved is not None
@@ -0,0 +1,45 @@
+import asyncio
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_json(self, message):
+        self.sent.append(message)
+
+    async def send_bytes(self, data):
+        self.sent.append(data)
+
+
+def test_slow_cancellation_keeps_the_conversation_busy(server, monkeypatch):
+    monkeypatch.setattr(server, "BARGE_IN_TIMEOUT_SECONDS", 0.05)
+
+    async def scenario():
+        voice_server = server.UltraSensitiveVoiceServer()
+        await voice_server.create_conversation("c1", FakeWebSocket())
+        conversation_data = voice_server.active_conversations["c1"]
+
+        async def stubborn_turn():
+            conversation_data["is_processing"] = True
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                await asyncio.sleep(0.2)  # Still unwinding (e.g. a send in progress)
+                raise
+            finally:
+                conversation_data["is_processing"] = False
+
+        turn = asyncio.create_task(stubborn_turn())
+        conversation_data["turn_queue"].current_turn = turn
+        await asyncio.sleep(0)
+        timeouts = sum(server.metrics.interrupt_timeouts.values.values())
+
+        await voice_server.interrupt_turn("c1")
+
+        assert conversation_data["is_processing"] and not turn.done()
+        assert sum(server.metrics.interrupt_timeouts.values.values()) == timeouts + 1
+        await asyncio.wait({turn})
+        assert not conversation_data["is_processing"]
+
+    asyncio.run(scenario())
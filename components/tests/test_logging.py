@@ -0,0 +1,33 @@
+import json
+import logging
+
+
+def test_sampling_applies_to_records_from_any_logger(server, monkeypatch, capsys):
+    monkeypatch.setattr(server, "LOG_MODE", "production")
+    monkeypatch.setattr(server, "LOG_SAMPLE_EVERY", 10)
+    root = logging.getLogger()
+    saved_handlers, saved_level = root.handlers[:], root.level
+    listener = server.configure_logging()
+    try:
+        root.setLevel(logging.INFO)
+        for name in ("voice_server", "some.library"):
+            for _ in range(30):
+                logging.getLogger(name).info("frame", extra={"sample": "frame"})
+        logging.getLogger("some.library").info("unsampled")
+    finally:
+        listener.stop()
+        root.handlers[:] = saved_handlers
+        root.setLevel(saved_level)
+
+    records = [json.loads(line) for line in capsys.readouterr().err.splitlines()]
+    assert [record["msg"] for record in records].count("frame") == 6  # 60 sampled records, 1 in 10 kept
+    assert {record["logger"] for record in records if record["msg"] == "frame"} == {"voice_server", "some.library"}
+    assert records[-1]["msg"] == "unsampled"
+
+
+def test_sampling_filter_counts_per_key(server):
+    sampling = server.SamplingFilter(3)
+    record = logging.LogRecord("x", logging.INFO, "", 0, "m", (), None)
+    record.sample = "a"
+    assert [sampling.filter(record) for _ in range(6)] == [True, False, False, True, False, False]
+    assert record.sample_rate == 3
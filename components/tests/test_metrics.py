@@ -0,0 +1,54 @@
+import asyncio
+
+
+def test_histogram_renders_cumulative_buckets_sum_and_count(server):
+    histogram = server.Histogram("latency_seconds", "Latency", "stage", buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, "tts")
+
+    assert histogram.render() == [
+        "# HELP latency_seconds Latency",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{stage="tts",le="0.1"} 2',
+        'latency_seconds_bucket{stage="tts",le="1.0"} 3',
+        'latency_seconds_bucket{stage="tts",le="+Inf"} 4',
+        'latency_seconds_sum{stage="tts"} 3.65',
+        'latency_seconds_count{stage="tts"} 4',
+    ]
+
+
+def test_counters_render_sorted_label_values_and_unlabelled_gauges(server):
+    counter = server.Counter("turns_total", "Turns", "outcome")
+    counter.inc(1, "failed")
+    counter.inc(2, "completed")
+    assert counter.render()[2:] == ['turns_total{outcome="completed"} 2', 'turns_total{outcome="failed"} 1']
+
+    plain = server.Counter("saved_seconds_total", "Saved")
+    plain.inc(0.5)
+    assert plain.render()[2:] == ["saved_seconds_total 0.5"]
+
+    assert server.Gauge("queue", "Queue", lambda: 7).render()[2:] == ["queue 7"]
+
+
+def test_every_metric_is_exposed(server):
+    voice_metrics = server.VoiceMetrics()
+    declared = [value for value in vars(voice_metrics).values()
+                if isinstance(value, (server.Counter, server.Histogram, server.Gauge))]
+
+    async def render():
+        return voice_metrics.render()
+
+    rendered = asyncio.run(render())
+    for metric in declared:
+        assert f"# TYPE {metric.name} " in rendered, f"{metric.name} is missing from VoiceMetrics.render"
+    assert rendered.endswith("\n")
+
+
+def test_metrics_endpoint_serves_prometheus_text(server):
+    from fastapi.testclient import TestClient
+
+    response = TestClient(server.app).get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "# TYPE voice_stage_duration_seconds histogram" in response.text
+    assert "# TYPE voice_active_conversations gauge" in response.text
@@ -0,0 +1,100 @@
+import pytest
+
+
+def make_cache(server, **kwargs):
+    return server.ResponseCache({"hello": "Hi! What shall we learn today?"}, **kwargs)
+
+
+def test_canned_and_exact_hits_are_shared_across_conversations(server):
+    cache = make_cache(server)
+    assert cache.lookup("unit", "Hello!!", "c1") == "Hi! What shall we learn today?"
+
+    cache.store("unit", "What is photosynthesis?", "Plants making sugar.", 1.0, "c1")
+    assert cache.lookup("unit", "um, what's photosynthesis", "c2") == "Plants making sugar."
+    assert cache.lookup("other unit", "what is photosynthesis", "c1") is None
+    assert (cache.stats["canned_hits"], cache.stats["exact_hits"]) == (1, 1)
+
+
+def test_rephrasing_matches_only_within_the_conversation_that_asked(server):
+    cache = make_cache(server)
+    cache.store("unit", "why is the sky blue during the day", "Rayleigh scattering.", 1.0, "c1")
+
+    assert cache.lookup("unit", "tell me why is the sky blue during the day", "c1") == "Rayleigh scattering."
+    assert cache.lookup("unit", "tell me why is the sky blue during the day", "c2") is None
+    assert cache.lookup("unit", "tell me why is the sky blue during the day") is None
+    assert cache.stats["fuzzy_hits"] == 1
+
+
+def test_negation_never_matches_the_positive_question(server):
+    cache = make_cache(server)
+    cache.store("unit", "why is the sky blue during the day", "Rayleigh scattering.", 1.0, "c1")
+
+    assert cache.lookup("unit", "why is the sky not blue during the day", "c1") is None
+    assert cache.lookup("unit", "why isn't the sky blue during the day", "c1") is None
+    assert cache.lookup("unit", "why wasn't the sky blue during the day", "c1") is None
+    assert cache.stats["fuzzy_hits"] == 0
+
+
+def test_swapped_word_order_does_not_match(server):
+    cache = make_cache(server)
+    cache.store("unit", "is jupiter bigger than saturn", "Yes, Jupiter is bigger.", 1.0, "c1")
+
+    assert cache.lookup("unit", "is saturn bigger than jupiter", "c1") is None
+    assert cache.lookup("unit", "is jupiter smaller than saturn", "c1") is None
+
+
+def test_different_numbers_do_not_match(server):
+    cache = make_cache(server)
+    cache.store("unit", "what is 12 times 4", "48", 1.0, "c1")
+    assert cache.lookup("unit", "what is 12 times 5", "c1") is None
+
+
+def test_follow_ups_are_neither_stored_nor_served(server):
+    cache = make_cache(server)
+    cache.store("unit", "can you explain that again", "Sure...", 1.0, "c1")
+    assert len(cache.entries) == 0
+    assert cache.lookup("unit", "can you explain that again", "c1") is None
+    assert cache.stats["uncacheable"] == 1
+
+
+@pytest.mark.parametrize("question", [
+    "what did you just say",
+    "can you repeat your answer",
+    "is my answer right",
+    "I don't understand the answer",
+    "give me an example",
+])
+def test_questions_about_the_conversation_are_not_shared(server, question):
+    cache = make_cache(server)
+    cache.store("unit", question, "Reply for the first student.", 1.0, "c1")
+    assert cache.lookup("unit", question, "c2") is None
+    assert cache.stats["exact_hits"] == 0
+
+
+def test_questions_about_a_speaker_only_hit_for_the_student_who_asked(server):
+    cache = make_cache(server)
+    cache.store("unit", "what should I revise for photosynthesis", "The light reactions.", 1.0, "c1")
+
+    assert cache.lookup("unit", "what should I revise for photosynthesis", "c2") is None
+    assert cache.lookup("unit", "what should I revise for photosynthesis", "c1") == "The light reactions."
+
+
+def test_meaning_words_stay_in_the_shared_key(server):
+    cache = make_cache(server)
+    cache.store("unit", "how much does a whale weigh", "Up to 150 tonnes.", 1.0, "c1")
+    cache.store("unit", "is there water on mars", "Yes, as ice.", 1.0, "c1")
+
+    assert cache.lookup("unit", "how does a whale weigh", "c2") is None
+    assert cache.lookup("unit", "is water on mars", "c2") is None
+    assert cache.lookup("unit", "uh how much does a whale weigh", "c2") == "Up to 150 tonnes."
+    assert cache.stats["exact_hits"] == 1
+
+
+def test_lru_eviction_drops_the_index_entries(server):
+    cache = make_cache(server, max_entries=1)
+    cache.store("unit", "what is a cell wall", "A rigid layer.", 1.0, "c1")
+    cache.store("unit", "what is a cell membrane", "A lipid bilayer.", 1.0, "c1")
+
+    assert list(cache.entries) == [("unit", "what is a cell membrane", None)]
+    assert cache.stats["evictions"] == 1
+    assert all(("unit", "what is a cell wall", None) not in keys for keys in cache.index["unit"].values())
@@ -0,0 +1,63 @@
+import asyncio
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_json(self, message):
+        self.sent.append(message)
+
+    async def send_bytes(self, data):
+        self.sent.append(bytes(data))
+
+
+def test_sentences_are_cut_at_boundaries_and_short_ones_merged(server):
+    segmenter = server.SentenceSegmenter(min_chars=20)
+    deltas = ["Great! ", "Cells are the basic unit", " of life. They ", "divide by mitosis", "."]
+
+    sentences = [sentence for delta in deltas for sentence in segmenter.feed(delta)]
+
+    # "Great!" alone is too short to be worth a TTS call, so it leads the next sentence
+    assert sentences == ["Great! Cells are the basic unit of life."]
+    assert segmenter.flush() == "They divide by mitosis."
+    assert segmenter.flush() == ""
+
+
+def test_boundary_needs_following_whitespace(server):
+    segmenter = server.SentenceSegmenter(min_chars=5)
+    assert segmenter.feed("It costs 3.50 dollars") == []
+    assert segmenter.feed(" today. Next") == ["It costs 3.50 dollars today."]
+
+
+def test_audio_is_sent_in_sentence_order_while_synthesis_overlaps(server):
+    async def scenario():
+        voice_server = server.UltraSensitiveVoiceServer()
+        websocket = FakeWebSocket()
+        await voice_server.create_conversation("c1", websocket)
+        processor = voice_server.processor
+        synthesizing = []
+
+        async def stream_ai_response(*args):
+            for delta in ["The first sentence is long. ", "The second one is longer still. ", "Last"]:
+                yield delta
+
+        async def synthesize_speech(text, voice_id, audio_format):
+            synthesizing.append(text)
+            # Earlier sentences finish last: order must come from the queue, not completion
+            await asyncio.sleep(0.03 * (3 - len(synthesizing)))
+            return text.encode()
+
+        processor.stream_ai_response = stream_ai_response
+        processor.synthesize_speech = synthesize_speech
+        assert await voice_server.stream_response("c1", "question", False, None, "female")
+        return websocket.sent, synthesizing
+
+    sent, synthesizing = asyncio.run(scenario())
+    deltas = [message["text"] for message in sent if isinstance(message, dict) and message["type"] == "ai_response_delta"]
+    audio = [message for message in sent if isinstance(message, bytes)]
+    assert deltas == ["The first sentence is long.", "The second one is longer still.", "Last"]
+    assert audio == [text.encode() for text in deltas]
+    assert synthesizing == deltas
+    kinds = [message["type"] for message in sent if isinstance(message, dict)]
+    assert kinds.index("audio_start") < kinds.index("audio_end")
@@ -0,0 +1,72 @@
+import pytest
+
+np = pytest.importorskip("numpy")  # Optional, like in the server
+
+RATE = 16000
+
+
+def pcm(samples) -> bytes:
+    return np.asarray(samples).astype("<i2").tobytes()
+
+
+def tone(seconds: float, amplitude: float = 3000, hertz: float = 200) -> np.ndarray:
+    t = np.arange(int(RATE * seconds)) / RATE
+    return amplitude * np.sin(2 * np.pi * hertz * t)
+
+
+def noise(seconds: float, rms: float) -> np.ndarray:
+    return np.random.default_rng(0).normal(0, rms, int(RATE * seconds)).clip(-32768, 32767)
+
+
+def silence(seconds: float) -> np.ndarray:
+    return np.zeros(int(RATE * seconds))
+
+
+def test_voice_is_speech_and_silence_is_not(server):
+    gate = server.SpeechGate(RATE)
+    assert gate.has_speech(pcm(tone(0.1)))
+    assert not gate.has_speech(pcm(silence(0.1)))
+    assert not gate.has_speech(pcm(tone(0.1, amplitude=50)))  # Room tone well under -45 dBFS
+
+
+def test_quiet_hiss_is_rejected_but_loud_sibilants_pass(server):
+    gate = server.SpeechGate(RATE)
+    assert not gate.has_speech(pcm(noise(0.1, rms=500)))    # About -36 dBFS, crossing rate of noise
+    assert gate.has_speech(pcm(noise(0.1, rms=5000)))       # About -16 dBFS, past the loud margin
+
+
+def test_mask_has_one_entry_per_whole_frame(server):
+    gate = server.SpeechGate(RATE)
+    frame = RATE * server.PCM_FRAME_MS // 1000
+    mask = gate.speech_mask(pcm(np.concatenate([silence(0.04), tone(0.02), tone(0.005)])))
+    assert len(mask) == 3 and gate.frame_samples == frame
+    assert mask.tolist() == [False, False, True]
+
+
+def test_trim_keeps_speech_plus_padding(server):
+    gate = server.SpeechGate(RATE, padding_ms=100)
+    audio = pcm(np.concatenate([silence(0.5), tone(0.3), silence(0.5)]))
+
+    trimmed = gate.trim(audio)
+
+    assert len(trimmed) == int(RATE * (0.3 + 2 * 0.1)) * 2
+    assert trimmed == audio[int(RATE * 0.4) * 2:int(RATE * 0.9) * 2]
+
+
+def test_trim_padding_stops_at_the_edges(server):
+    gate = server.SpeechGate(RATE, padding_ms=200)
+    audio = pcm(np.concatenate([tone(0.3), silence(0.05)]))
+    assert gate.trim(audio) == audio
+
+
+def test_too_little_speech_is_dropped(server):
+    gate = server.SpeechGate(RATE, min_speech_ms=200)
+    assert gate.trim(pcm(np.concatenate([silence(0.3), tone(0.1), silence(0.3)]))) is None
+    assert gate.trim(pcm(silence(1.0))) is None
+    assert gate.trim(b"") is None
+
+
+def test_settings_report_whole_frames(server):
+    settings = server.SpeechGate(8000, min_speech_ms=210, padding_ms=50).get_settings()
+    assert settings["sample_rate_hertz"] == 8000
+    assert (settings["min_speech_ms"], settings["padding_ms"]) == (200, 40)
@@ -0,0 +1,66 @@
+import xml.etree.ElementTree as ElementTree
+
+import pytest
+
+EMOTIONAL_STATES = {
+    "excited": {"pitch": "+4st", "rate": "1.05", "volume": "+3dB"},
+    "explanatory": {"pitch": "+1st", "rate": "0.88", "volume": "+2dB"},
+}
+
+
+@pytest.fixture
+def builder(server, monkeypatch):
+    monkeypatch.setattr(server, "ENABLE_ADVANCED_SSML", True)
+    monkeypatch.setattr(server, "USE_BREATHING_PAUSES", False)
+    monkeypatch.setattr(server, "USE_SPEECH_PATTERNS", True)
+    return server.SSMLBuilder(EMOTIONAL_STATES)
+
+
+def test_sentences_get_prosody_emphasis_and_breaks(builder):
+    ssml = builder.build("This is important. Cells divide! Remember mitosis?", "excited")
+
+    assert ssml == (
+        '<speak><prosody rate="1.05" pitch="+4st" volume="+3dB">'
+        '<prosody pitch="+1st">This is <emphasis level="strong">important</emphasis></prosody>'
+        '<break time="0.3s"/>'
+        '<prosody pitch="+0.5st">Cells divide</prosody>'
+        '<break time="0.3s"/>'
+        '<prosody rate="0.95"><emphasis level="moderate">Remember</emphasis> mitosis</prosody>'
+        '</prosody></speak>'
+    )
+
+
+def test_markup_stays_well_formed_around_special_characters(builder):
+    ssml = builder.build('Compare <a> & "b" when key < 5. Done here.')
+
+    root = ElementTree.fromstring(ssml)
+    text = "".join(root.itertext())
+    assert 'Compare <a> & "b" when key < 5' in text
+    assert root.find("prosody").get("rate") == "0.88"  # Unknown states fall back to explanatory
+
+
+def test_short_text_is_left_alone(builder):
+    assert builder.build("  Hi.  ") == "Hi."
+    assert builder.build("...") == "..."
+
+
+def test_emphasis_matches_whole_words_only(builder):
+    ssml = builder.build("The keyboard is key here")
+    assert ssml.count("<emphasis") == 1 and '<emphasis level="strong">key</emphasis>' in ssml
+
+
+def test_classify_follows_keyword_priority(builder):
+    assert builder.classify("Wow, great job!") == "excited"
+    assert builder.classify("Well done, let me explain") == "encouraging"
+    assert builder.classify("Let's explore the cell") == "enthusiastic"
+    assert builder.classify("Cells have membranes") == "explanatory"
+
+
+def test_builds_are_memoized_unless_pauses_are_randomized(server, builder, monkeypatch):
+    first = builder.build("Cells are the basic unit of life.")
+    assert builder.build("Cells are the basic unit of life.") is first
+    assert builder.get_stats()["hits"] == 1
+
+    monkeypatch.setattr(server, "USE_BREATHING_PAUSES", True)
+    builder.build("Cells are the basic unit of life.")
+    assert builder.get_stats()["hits"] == 1
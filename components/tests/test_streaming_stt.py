@@ -0,0 +1,111 @@
+import asyncio
+import json
+
+import aiohttp
+from aiohttp import web
+
+
+def results(transcript: str, is_final: bool = False, speech_final: bool = False) -> str:
+    return json.dumps({"type": "Results", "is_final": is_final, "speech_final": speech_final,
+                       "channel": {"alternatives": [{"transcript": transcript}]}})
+
+
+class FakeDeepgramLive:
+    """A live-transcription endpoint that answers each audio frame with a scripted batch of results"""
+
+    def __init__(self, script: list):
+        self.script = script
+        self.params = None
+        self.audio = []
+        self.control = []
+
+    async def handle(self, request):
+        self.params = dict(request.query)
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        async for message in ws:
+            if message.type == aiohttp.WSMsgType.BINARY:
+                self.audio.append(message.data)
+                for reply in self.script.pop(0) if self.script else []:
+                    await ws.send_str(reply)
+            elif message.type == aiohttp.WSMsgType.TEXT:
+                self.control.append(json.loads(message.data)["type"])
+                if self.control[-1] == "CloseStream":
+                    break
+        await ws.close()
+        return ws
+
+
+class FakeProcessor:
+    def __init__(self, session):
+        self.session = session
+
+    async def get_session(self, name):
+        return self.session
+
+
+def run_session(server, monkeypatch, script: list, frames: list, audio_params=None, idle: float = 0.05):
+    fake = FakeDeepgramLive(script)
+    transcripts, endpoints = [], []
+
+    async def on_transcript(text, is_final):
+        transcripts.append((text, is_final))
+
+    async def on_endpoint(utterance):
+        endpoints.append(utterance)
+
+    async def scenario():
+        app = web.Application()
+        app.router.add_get("/listen", fake.handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        monkeypatch.setattr(server, "DEEPGRAM_STREAM_URL", f"ws://127.0.0.1:{port}/listen")
+        async with aiohttp.ClientSession() as session:
+            stt = server.StreamingTranscriptionSession(FakeProcessor(session), on_transcript, on_endpoint, audio_params)
+            await stt.start()
+            for frame in frames:
+                await stt.send_audio(frame)
+            await asyncio.sleep(idle)
+            await stt.close()
+            stats = (stt.frames_sent, stt.bytes_sent, stt.is_open)
+        await runner.cleanup()
+        return stats
+
+    stats = asyncio.run(scenario())
+    return fake, transcripts, endpoints, stats
+
+
+def test_interim_and_final_results_build_one_utterance_per_endpoint(server, monkeypatch):
+    script = [
+        [results("what is"), results("what is a cell", is_final=True)],
+        [results("made"), results("made of", is_final=True, speech_final=True)],
+        [results("thanks", is_final=True), json.dumps({"type": "UtteranceEnd"})],
+    ]
+    fake, transcripts, endpoints, stats = run_session(server, monkeypatch, script, [b"a" * 10, b"b" * 20, b"c" * 30])
+
+    assert transcripts == [("what is", False), ("what is a cell", True),
+                           ("what is a cell made", False), ("what is a cell made of", True), ("thanks", True)]
+    assert endpoints == ["what is a cell made of", "thanks"]
+    assert fake.audio == [b"a" * 10, b"b" * 20, b"c" * 30]
+    assert stats == (3, 60, False)
+    assert fake.control == ["CloseStream"]
+
+
+def test_params_carry_endpointing_and_raw_pcm_encoding(server, monkeypatch):
+    pcm = {"encoding": "linear16", "sample_rate": "16000", "channels": "1"}
+    fake, _, endpoints, _ = run_session(server, monkeypatch, [], [b"\x00" * 320], audio_params=pcm)
+
+    assert fake.params["endpointing"] == "300" and fake.params["interim_results"] == "true"
+    assert {name: fake.params[name] for name in pcm} == pcm
+    assert endpoints == []
+
+
+def test_keepalive_is_sent_while_no_audio_arrives(server, monkeypatch):
+    monkeypatch.setattr(server, "STT_KEEPALIVE_SECONDS", 0.02)
+    fake, _, _, _ = run_session(server, monkeypatch, [], [], idle=0.1)
+
+    assert fake.control.count("KeepAlive") >= 2
+    assert fake.control[-1] == "CloseStream"
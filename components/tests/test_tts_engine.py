@@ -0,0 +1,55 @@
+import asyncio
+import threading
+
+
+class BlockingClient:
+    """Stands in for TextToSpeechClient; synthesize_speech blocks until released"""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.calls = []
+
+    def synthesize_speech(self, **kwargs):
+        self.calls.append(kwargs)
+        self.release.wait(5)
+        return "audio"
+
+
+def test_synthesize_uses_public_client_method(server):
+    client = BlockingClient()
+    client.release.set()
+    engine = server.TTSExecutionEngine(lambda: client, max_concurrency=1, pool_size=1)
+
+    assert asyncio.run(engine.synthesize("input", "voice", "config")) == "audio"
+    assert client.calls == [{"input": "input", "voice": "voice", "audio_config": "config",
+                             "timeout": server.TTS_TIMEOUT_SECONDS}]
+    assert engine.completed == 1 and engine.in_flight == 0
+    engine.shutdown()
+
+
+def test_cancelled_call_holds_its_slot_until_it_returns(server):
+    client = BlockingClient()
+    engine = server.TTSExecutionEngine(lambda: client, max_concurrency=1, pool_size=1)
+
+    async def scenario():
+        turn = asyncio.create_task(engine.synthesize("input", "voice", "config"))
+        while not client.calls:
+            await asyncio.sleep(0.01)
+        turn.cancel()
+        await asyncio.gather(turn, return_exceptions=True)
+        assert engine.cancelled == 1
+        assert engine.in_flight == 1 and engine._semaphore.locked()
+        # An abandoned call (a hedge loser, a barge-in) still counts against saturation
+        assert engine.abandoned == 1 and not engine.has_free_slot()
+        assert server.AdmissionController(10, {}, engine).upstream_load()["tts"] == 1.0
+
+        client.release.set()
+        for _ in range(100):
+            if not engine._semaphore.locked():
+                break
+            await asyncio.sleep(0.01)
+        assert engine.in_flight == 0 and not engine._semaphore.locked()
+        assert engine.abandoned == 0 and engine.has_free_slot()
+
+    asyncio.run(scenario())
+    engine.shutdown()
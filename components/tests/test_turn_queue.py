@@ -0,0 +1,92 @@
+import asyncio
+
+WEBM_HEADER = b"\x1a\x45\xdf\xa3" + b"\x00" * 60
+CLUSTER = b"\x1f\x43\xb6\x75"
+
+
+def recording_handler(turns: list, seconds: float = 0.0):
+    async def handler(utterances, transcript, queued_at):
+        turns.append((utterances, transcript))
+        await asyncio.sleep(seconds)
+
+    return handler
+
+
+def test_input_arriving_during_a_turn_is_queued_not_dropped(server):
+    turns = []
+
+    async def scenario():
+        queue = server.TurnQueue(recording_handler(turns, seconds=0.05))
+        queue.put_audio(WEBM_HEADER + CLUSTER + b"first")
+        await asyncio.sleep(0.01)  # The first turn is running
+        assert queue.busy
+        assert queue.put_audio(WEBM_HEADER + CLUSTER + b"second")
+        assert await queue.finish(1)
+        await queue.close()
+        return queue
+
+    queue = asyncio.run(scenario())
+    assert [utterances for utterances, _ in turns] == [[WEBM_HEADER + CLUSTER + b"first"],
+                                                       [WEBM_HEADER + CLUSTER + b"second"]]
+    assert queue.dropped == 0 and queue.turns == 2
+
+
+def test_backlog_is_coalesced_into_one_turn(server):
+    turns = []
+    utterances = [WEBM_HEADER + CLUSTER + bytes([index]) * 300 for index in range(3)]
+
+    async def scenario():
+        queue = server.TurnQueue(recording_handler(turns, seconds=0.05))
+        queue.put_transcript("busy")
+        await asyncio.sleep(0.01)
+        for utterance in utterances:
+            queue.put_audio(utterance)
+        queue.put_transcript("and also")
+        assert await queue.finish(1)
+        await queue.close()
+        return queue
+
+    queue = asyncio.run(scenario())
+    assert len(turns) == 2
+    # Separate recordings stay separate STT payloads within the one turn
+    assert turns[1] == (utterances, "and also")
+    assert queue.merged == 2
+
+
+def test_a_full_queue_drops_by_policy(server):
+    async def scenario(policy):
+        queue = server.TurnQueue(recording_handler([], seconds=10), max_frames=2, policy=policy)
+        queue.put_transcript("busy")
+        await asyncio.sleep(0.01)
+        accepted = [queue.put_audio(bytes([index])) for index in range(3)]
+        frames = list(queue.frames)
+        queue.cancel_current()
+        await queue.close()
+        return accepted, frames, queue.dropped
+
+    assert asyncio.run(scenario("drop_oldest")) == ([True, True, True], [b"\x01", b"\x02"], 1)
+    assert asyncio.run(scenario("drop_newest")) == ([True, True, False], [b"\x00", b"\x01"], 1)
+
+
+def test_finish_turns_buffered_audio_into_a_last_turn_then_refuses_more(server):
+    turns = []
+
+    async def scenario():
+        queue = server.TurnQueue(recording_handler(turns))
+        queue.put_audio(WEBM_HEADER + CLUSTER + b"last words")
+        assert await queue.finish(1)
+        assert not queue.put_audio(WEBM_HEADER + CLUSTER + b"too late")
+        await queue.close()
+        return queue
+
+    queue = asyncio.run(scenario())
+    assert turns == [([WEBM_HEADER + CLUSTER + b"last words"], None)]
+    assert queue.dropped == 1
+
+
+def test_chunks_of_one_recording_join_and_separate_recordings_do_not(server):
+    first = [WEBM_HEADER + CLUSTER + b"a" * 10, b"b" * 10]
+    second = [WEBM_HEADER + CLUSTER + b"c" * 10, CLUSTER + b"d" * 10]
+
+    assert server.merge_utterances(first + second) == [b"".join(first), b"".join(second)]
+    assert server.merge_utterances([]) == []
@@ -0,0 +1,87 @@
+import asyncio
+import json
+import logging
+
+
+def test_summary_sums_repeated_stages(server):
+    trace = server.TurnTrace("c1", started=100.0)
+    trace.add_span("stt", 100.0, 100.2)
+    trace.add_span("tts", 100.3, 100.4)
+    trace.add_span("tts", 100.5, 100.75)
+    trace.ended = 101.0
+    trace.prompt_tokens = 42
+
+    summary = trace.summary()
+    assert summary["type"] == "turn_timing" and summary["trace_id"] == trace.trace_id
+    assert summary["total_ms"] == 1000.0
+    assert summary["stages"] == {"stt": 200.0, "tts": 350.0}
+    assert summary["prompt_tokens"] == 42
+
+
+def test_chrome_events_share_one_thread_and_wall_clock(server):
+    trace = server.TurnTrace("c1", kind="introduction", started=10.0)
+    trace.wall_started = 1000.0
+    trace.add_span("tts", 10.5, 10.75)
+    trace.ended = 11.0
+
+    turn, tts = trace.to_chrome_events(pid=7)
+    assert turn["name"] == "introduction" and turn["ph"] == "X" and turn["pid"] == 7
+    assert (turn["ts"], turn["dur"]) == (1000_000_000, 1_000_000)
+    assert (tts["ts"], tts["dur"]) == (1000_500_000, 250_000)
+    assert turn["tid"] == tts["tid"] == server.TurnTrace("c1").to_chrome_events(pid=7)[0]["tid"]
+    assert tts["args"] == {"trace_id": trace.trace_id, "conversation_id": "c1"}
+
+
+def test_stages_land_on_the_trace_of_the_task_that_spawned_them(server):
+    async def scenario():
+        trace = server.TurnTrace("c1")
+        token = server.current_trace.set(trace)
+        try:
+            async def synthesize():
+                server.record_stage("tts", server.time.perf_counter())
+
+            await asyncio.gather(asyncio.create_task(synthesize()), asyncio.create_task(synthesize()))
+            server.record_stage("llm", server.time.perf_counter())
+        finally:
+            server.current_trace.reset(token)
+        # Outside a turn, stages only reach the metrics
+        server.record_stage("audio_send", server.time.perf_counter())
+        return trace
+
+    trace = asyncio.run(scenario())
+    assert [name for name, _, _ in trace.spans] == ["tts", "tts", "llm"]
+
+
+def test_log_records_are_tagged_with_the_current_trace(server):
+    record = logging.LogRecord("voice", logging.INFO, __file__, 1, "hello", None, None)
+    trace = server.TurnTrace("c1")
+    token = server.current_trace.set(trace)
+    try:
+        assert server.TraceContextFilter().filter(record)
+    finally:
+        server.current_trace.reset(token)
+
+    assert (record.trace_id, record.conversation_id) == (trace.trace_id, "c1")
+
+
+def test_exported_file_loads_as_a_chrome_trace(server, tmp_path):
+    path = tmp_path / "trace.json"
+    exporter = server.TraceExporter(str(path))
+
+    async def scenario():
+        for conversation_id in ("c1", "c2"):
+            trace = server.TurnTrace(conversation_id)
+            trace.add_span("stt", trace.started, trace.started + 0.1)
+            trace.finish()
+            exporter.export(trace)
+        # Writes run in the default executor; wait for them before reading
+        while exporter.exported < 2:
+            await asyncio.sleep(0.01)
+
+    asyncio.run(scenario())
+    text = path.read_text()
+    assert text.startswith("[\n")
+    # The closing bracket is optional in the format; add it to parse strictly
+    events = json.loads(text.rstrip().rstrip(",") + "]")
+    assert [event["name"] for event in events] == ["turn", "stt", "turn", "stt"]
+    assert exporter.exported == 2
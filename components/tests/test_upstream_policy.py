@@ -0,0 +1,155 @@
+import asyncio
+import time
+
+import aiohttp
+import pytest
+
+
+def test_parse_retry_after(server):
+    assert server.parse_retry_after("1.5") == 1.5
+    assert server.parse_retry_after("-3") == 0.0
+    assert server.parse_retry_after(None) is None
+    assert server.parse_retry_after("Wed, 21 Oct 2026 07:28:00 GMT") is None
+
+
+def test_retryable_http_errors(server):
+    assert server.is_retryable_http_error(server.RetryableUpstreamError("openai", 503))
+    assert server.is_retryable_http_error(aiohttp.ClientConnectionError())
+    assert server.is_retryable_http_error(asyncio.TimeoutError())
+    assert not server.is_retryable_http_error(ValueError("bad request"))
+
+
+def test_bucket_allows_a_burst_then_paces_callers(server):
+    bucket = server.TokenBucket("test", requests_per_minute=600, burst_seconds=0.2)  # 10/s, 2 token burst
+
+    async def scenario():
+        started = time.monotonic()
+        for _ in range(3):
+            await bucket.acquire()
+        return time.monotonic() - started
+
+    elapsed = asyncio.run(scenario())
+    assert 0.08 <= elapsed < 0.5
+    assert bucket.waits == 1
+
+
+def test_bucket_sheds_when_the_wait_would_overrun_the_deadline(server):
+    bucket = server.TokenBucket("test", requests_per_minute=60, burst_seconds=1)
+
+    async def scenario():
+        await bucket.acquire()
+        with pytest.raises(server.UpstreamSaturatedError):
+            await bucket.acquire(deadline=time.perf_counter() + 0.1)
+
+    asyncio.run(scenario())
+    assert bucket.tokens == pytest.approx(0, abs=0.01)  # The shed caller gave its reservation back
+    assert bucket.waits == 0
+
+
+def test_bucket_pause_holds_every_caller(server):
+    bucket = server.TokenBucket("test", requests_per_minute=600)
+    bucket.pause(2)
+    assert bucket.tokens <= -2 * bucket.rate + 0.1
+
+
+def make_policy(server, monkeypatch, **kwargs):
+    monkeypatch.setattr(server, "RETRY_BASE_DELAY_SECONDS", 0.001)
+    bucket = server.TokenBucket("test", requests_per_minute=60000)
+    return server.UpstreamCallPolicy("test", bucket, server.is_retryable_http_error, **kwargs)
+
+
+def flaky(failures: list):
+    calls = []
+
+    async def attempt():
+        calls.append(time.perf_counter())
+        if failures:
+            raise failures.pop(0)
+        return "ok"
+
+    return attempt, calls
+
+
+def test_policy_retries_retryable_errors(server, monkeypatch):
+    policy = make_policy(server, monkeypatch, max_attempts=3)
+    attempt, calls = flaky([server.RetryableUpstreamError("test", 503), aiohttp.ClientConnectionError()])
+
+    assert asyncio.run(policy.call(attempt)) == "ok"
+    assert len(calls) == 3
+    assert (policy.stats["retries"], policy.stats["gave_up"]) == (2, 0)
+
+
+def test_policy_raises_other_errors_at_once(server, monkeypatch):
+    policy = make_policy(server, monkeypatch)
+    attempt, calls = flaky([ValueError("bad request")])
+
+    with pytest.raises(ValueError):
+        asyncio.run(policy.call(attempt))
+    assert len(calls) == 1 and policy.stats["retries"] == 0
+
+
+def test_policy_gives_up_after_max_attempts(server, monkeypatch):
+    policy = make_policy(server, monkeypatch, max_attempts=2)
+    attempt, calls = flaky([server.RetryableUpstreamError("test", 500)] * 3)
+
+    with pytest.raises(server.RetryableUpstreamError):
+        asyncio.run(policy.call(attempt))
+    assert len(calls) == 2 and policy.stats["gave_up"] == 1
+
+
+def test_policy_honors_retry_after_and_pauses_the_bucket(server, monkeypatch):
+    policy = make_policy(server, monkeypatch)
+    attempt, calls = flaky([server.RetryableUpstreamError("test", 429, retry_after=0.1)])
+
+    assert asyncio.run(policy.call(attempt)) == "ok"
+    assert calls[1] - calls[0] >= 0.1
+    assert policy.bucket.tokens < policy.bucket.capacity - 1
+
+
+def test_policy_does_not_retry_past_the_turn_deadline(server, monkeypatch):
+    policy = make_policy(server, monkeypatch)
+    attempt, calls = flaky([server.RetryableUpstreamError("test", 429, retry_after=1.0)])
+
+    async def scenario():
+        server.turn_deadline.set(time.perf_counter() + 0.5)
+        await policy.call(attempt)
+
+    with pytest.raises(server.RetryableUpstreamError):
+        asyncio.run(scenario())
+    assert len(calls) == 1 and policy.stats["gave_up"] == 1
+
+
+def test_hedge_fires_past_p95_and_first_success_wins(server, monkeypatch):
+    policy = make_policy(server, monkeypatch, hedge=True)
+    for _ in range(server.HEDGE_MIN_SAMPLES):
+        policy.latency.add(0.02)
+    delays = [1.0, 0.01]
+    cancelled = []
+
+    async def attempt():
+        try:
+            await asyncio.sleep(delays.pop(0))
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+        return "hedge"
+
+    assert asyncio.run(policy.call(attempt)) == "hedge"
+    assert (policy.stats["hedges_fired"], policy.stats["hedges_won"]) == (1, 1)
+    assert cancelled == [True]
+
+
+def test_hedge_is_skipped_without_a_free_slot(server, monkeypatch):
+    policy = make_policy(server, monkeypatch, hedge=True, has_capacity=lambda: False)
+    for _ in range(server.HEDGE_MIN_SAMPLES):
+        policy.latency.add(0.01)
+    calls = []
+
+    async def attempt():
+        calls.append(True)
+        await asyncio.sleep(0.05)
+        return "primary"
+
+    assert asyncio.run(policy.call(attempt)) == "primary"
+    assert len(calls) == 1
+    assert (policy.stats["hedges_fired"], policy.stats["hedges_skipped"]) == (0, 1)
@@ -0,0 +1,54 @@
+import asyncio
+
+import aiohttp
+from aiohttp import web
+
+
+def test_pool_counts_connections_in_use_and_idle(server):
+    async def scenario():
+        release_stream = asyncio.Event()
+
+        async def quick(request):
+            return web.Response(text="ok")
+
+        async def stream(request):
+            response = web.StreamResponse()
+            await response.prepare(request)
+            await response.write(b"first")
+            await release_stream.wait()
+            await response.write_eof()
+            return response
+
+        app = web.Application()
+        app.router.add_get("/quick", quick)
+        app.router.add_get("/stream", stream)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+
+        pool = server.UpstreamPool("test", f"http://127.0.0.1:{port}/", aiohttp.ClientTimeout(total=5), prewarm=0)
+        session = await pool.get_session()
+        try:
+            for _ in range(2):
+                async with session.get(f"http://127.0.0.1:{port}/quick") as response:
+                    await response.read()
+            stats = pool.get_stats()
+            assert (stats["in_use"], stats["idle"]) == (0, 1)
+            assert (stats["connections_created"], stats["connections_reused"]) == (1, 1)
+
+            # A streamed body holds its connection until it has been read to the end
+            async with session.get(f"http://127.0.0.1:{port}/stream") as response:
+                await response.content.readexactly(5)
+                stats = pool.get_stats()
+                assert (stats["in_use"], stats["idle"]) == (1, 0)
+                release_stream.set()
+                await response.read()
+            stats = pool.get_stats()
+            assert (stats["in_use"], stats["idle"]) == (0, 1)
+        finally:
+            await pool.close()
+            await runner.cleanup()
+
+    asyncio.run(scenario())
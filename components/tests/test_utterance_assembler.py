@@ -0,0 +1,52 @@
+import asyncio
+
+WEBM_HEADER = b"\x1a\x45\xdf\xa3" + b"\x00" * 60
+CLUSTER = b"\x1f\x43\xb6\x75"
+
+
+def assemble(server, chunks, gate=None, pause: float = 0.0) -> list:
+    utterances = []
+
+    async def scenario():
+        assembler = server.UtteranceAssembler(utterances.append, gate=gate)
+        for chunk in chunks:
+            assembler.add_chunk(chunk)
+            await asyncio.sleep(pause)
+        assembler.flush("marker")
+        assembler.close()
+
+    asyncio.run(scenario())
+    return utterances
+
+
+def test_webm_chunks_are_never_trimmed(server):
+    # Quiet (small) chunks that do not start on a cluster boundary, as MediaRecorder emits them
+    chunks = [WEBM_HEADER + CLUSTER + b"a" * 300, b"b" * 40, b"c" * 40, b"d" * 900]
+    assert assemble(server, chunks) == [b"".join(chunks)]
+
+
+def test_slow_arrival_is_not_mistaken_for_silence(server, monkeypatch):
+    monkeypatch.setattr(server, "UTTERANCE_SILENCE_MS", 10)
+    monkeypatch.setattr(server, "UTTERANCE_GAP_MS", 1000)
+    chunks = [WEBM_HEADER + CLUSTER + b"a" * 300, b"b" * 300, b"c" * 300]
+    # Network jitter: chunks arrive 50 ms apart with few bytes per second
+    assert assemble(server, chunks, pause=0.05) == [b"".join(chunks)]
+
+
+def test_too_small_webm_utterances_are_discarded(server):
+    assert assemble(server, [WEBM_HEADER + CLUSTER + b"a" * 10]) == []
+
+
+def test_forced_flush_cuts_at_the_last_cluster_and_carries_the_rest(server, monkeypatch):
+    monkeypatch.setattr(server, "UTTERANCE_MAX_BYTES", 1000)
+    first = WEBM_HEADER + CLUSTER + b"a" * 300
+    # The size cap is hit mid-way through the second cluster
+    chunks = [first, b"b" * 300, CLUSTER + b"c" * 200, b"d" * 200, b"e" * 300, CLUSTER + b"f" * 300]
+
+    utterances = assemble(server, chunks)
+
+    assert utterances == [first + b"b" * 300,
+                          WEBM_HEADER + CLUSTER + b"c" * 200 + b"d" * 200 + b"e" * 300,
+                          WEBM_HEADER + CLUSTER + b"f" * 300]
+    for utterance in utterances:
+        assert utterance[len(WEBM_HEADER):].startswith(CLUSTER)
@@ -0,0 +1,41 @@
+def test_lru_eviction_respects_byte_budget(server):
+    cache = server.VoiceCache(max_bytes=30, ttl_seconds=60)
+    cache.put("a", "v1", b"x" * 10)
+    cache.put("b", "v1", b"x" * 10)
+    cache.put("c", "v2", b"x" * 10)
+    assert cache.get("a", "v1") == b"x" * 10  # "a" becomes most recently used
+
+    cache.put("d", "v2", b"x" * 10)
+
+    assert cache.get("b", "v1") is None
+    assert set(cache.entries) == {"a", "c", "d"}
+    assert cache.total_bytes == 30
+    assert cache.voice_stats["v1"]["evictions"] == 1
+
+
+def test_replacing_a_key_keeps_the_byte_count_exact(server):
+    cache = server.VoiceCache(max_bytes=100, ttl_seconds=60)
+    cache.put("a", "v1", b"x" * 40)
+    cache.put("a", "v1", b"x" * 10)
+    assert len(cache) == 1 and cache.total_bytes == 10
+
+
+def test_oversized_audio_is_not_cached(server):
+    cache = server.VoiceCache(max_bytes=10, ttl_seconds=60)
+    cache.put("big", "v1", b"x" * 11)
+    assert len(cache) == 0 and cache.total_bytes == 0
+
+
+def test_expired_entries_miss_and_are_removed(server, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(server.time, "monotonic", lambda: now[0])
+    cache = server.VoiceCache(max_bytes=100, ttl_seconds=5)
+    cache.put("a", "v1", b"audio")
+
+    now[0] += 4.9
+    assert cache.get("a", "v1") == b"audio"
+    now[0] += 0.2
+    assert cache.get("a", "v1") is None
+
+    assert len(cache) == 0 and cache.total_bytes == 0
+    assert cache.voice_stats["v1"] == {"hits": 1, "misses": 1, "evictions": 0, "expirations": 1}
@@ -0,0 +1,121 @@
+import { useCallback, useEffect, useRef } from "react";
+
+// Framed audio protocol, enabled by sending "audio_framing": true with set_voice or set_context.
+// Every binary message is a 10-byte big-endian header followed by up to frame_bytes of audio:
+//   uint8 version | uint8 flags | uint32 turn id | uint32 sequence number
+// Sequence numbers restart at 0 with each audio_start (whose turn_id matches the frames);
+// AUDIO_FRAME_LAST marks the final frame of one synthesized segment (a complete audio file).
+export const AUDIO_FRAME_VERSION = 1;
+export const AUDIO_FRAME_HEADER_BYTES = 10;
+export const AUDIO_FRAME_LAST = 0x01;
+
+export interface AudioFrame {
+  turnId: number;
+  seq: number;
+  last: boolean;
+  payload: Uint8Array;
+}
+
+export interface AudioFrameHandlers {
+  // A complete segment, ready for an <audio> element
+  onSegment: (turnId: number, segment: Blob) => void;
+  // Each payload as it arrives, for progressive playback (e.g. a MediaSource SourceBuffer)
+  onChunk?: (turnId: number, chunk: Uint8Array, last: boolean) => void;
+}
+
+export const parseAudioFrame = (buffer: ArrayBuffer): AudioFrame | null => {
+  if (buffer.byteLength < AUDIO_FRAME_HEADER_BYTES) return null;
+  const view = new DataView(buffer);
+  if (view.getUint8(0) !== AUDIO_FRAME_VERSION) return null;
+  return {
+    turnId: view.getUint32(2),
+    seq: view.getUint32(6),
+    last: (view.getUint8(1) & AUDIO_FRAME_LAST) !== 0,
+    payload: new Uint8Array(buffer, AUDIO_FRAME_HEADER_BYTES),
+  };
+};
+
+export class AudioFrameDecoder {
+  mimeType = "audio/mpeg";
+  dropped = 0;
+
+  private turnId = 0;
+  private nextSeq = 0;
+  private parts: Uint8Array[] = [];
+  private broken = false;
+
+  constructor(private handlers: AudioFrameHandlers) {}
+
+  // Call on audio_start so frames from an older (interrupted) turn are ignored
+  beginTurn(turnId: number, mimeType?: string) {
+    this.turnId = turnId;
+    this.nextSeq = 0;
+    this.parts = [];
+    this.broken = false;
+    if (mimeType) this.mimeType = mimeType;
+  }
+
+  // Call on an interrupted audio_end: the partial segment is never played
+  reset() {
+    this.parts = [];
+    this.broken = false;
+  }
+
+  push(buffer: ArrayBuffer) {
+    const frame = parseAudioFrame(buffer);
+    if (!frame || frame.turnId !== this.turnId) {
+      this.dropped++;
+      return;
+    }
+    // A gap makes the rest of this segment undecodable; resume at the next one
+    if (frame.seq !== this.nextSeq) this.broken = true;
+    this.nextSeq = frame.seq + 1;
+
+    if (!this.broken) {
+      this.parts.push(frame.payload);
+      this.handlers.onChunk?.(frame.turnId, frame.payload, frame.last);
+    } else {
+      this.dropped++;
+    }
+
+    if (frame.last) {
+      if (!this.broken && this.parts.length) {
+        this.handlers.onSegment(
+          frame.turnId,
+          new Blob(this.parts, { type: this.mimeType })
+        );
+      }
+      this.parts = [];
+      this.broken = false;
+    }
+  }
+}
+
+// One decoder per WebSocket; set socket.binaryType = "arraybuffer" and feed binary messages to push()
+export const useAudioFrameDecoder = (handlers: AudioFrameHandlers) => {
+  const handlersRef = useRef(handlers);
+  const decoderRef = useRef<AudioFrameDecoder | null>(null);
+
+  useEffect(() => {
+    handlersRef.current = handlers;
+  }, [handlers]);
+
+  const getDecoder = useCallback(() => {
+    if (!decoderRef.current) {
+      decoderRef.current = new AudioFrameDecoder({
+        onSegment: (turnId, segment) =>
+          handlersRef.current.onSegment(turnId, segment),
+        onChunk: (turnId, chunk, last) =>
+          handlersRef.current.onChunk?.(turnId, chunk, last),
+      });
+    }
+    return decoderRef.current;
+  }, []);
+
+  // A new connection may restart turn ids, so start from a fresh decoder
+  const resetDecoder = useCallback(() => {
+    decoderRef.current = null;
+  }, []);
+
+  return { getDecoder, resetDecoder };
+};